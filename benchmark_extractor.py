@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do extrator do Google Sheets
+Mede process_csv e o caminho completo de extract_financial_data (exportação HTTP)
+com planilhas sintéticas no formato do "RELATÓRIO CYLLA"
+
+Uso:
+    python benchmark_extractor.py                  # tamanhos padrão, compara com a linha de base
+    python benchmark_extractor.py --full           # inclui a planilha de 1 milhão de linhas
+    python benchmark_extractor.py --save-baseline  # grava os resultados como nova linha de base
+
+A linha de base versionada (benchmark_baseline.json) foi gerada com os tamanhos padrão; os tempos
+dependem da máquina, então rode --save-baseline uma vez na máquina onde as comparações vão
+acontecer. Sem o arquivo, a primeira execução grava a linha de base em vez de comparar.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Caches do extrator em um diretório temporário (precisa ser definido antes do import)
+BENCH_CACHE_DIR = tempfile.mkdtemp(prefix='sheets_bench_')
+os.environ['GOOGLE_SHEETS_CACHE_DIR'] = BENCH_CACHE_DIR
+
+import google_sheets_extractor as extractor
+from fake_sheets_server import FakeSheetsServer
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_SIZES = [50, 1000, 100000]
+FULL_SIZES = DEFAULT_SIZES + [1000000]
+REGRESSION_THRESHOLD = 1.25  # p50 25% acima da linha de base é regressão
+
+MESES = ["JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO",
+         "JULHO", "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"]
+
+def generate_sheet(rows, delimiter=',', month_every=4, summary_row=32):
+    """CSV sintético com o formato do relatório
+    - cabeçalho na linha 1 e blocos de mês a cada month_every linhas (mês na coluna A)
+    - resumo "VIVA RIO EM ABERTO" + SETEMBRO/OUTUBRO/NOVEMBRO/Total a partir de summary_row
+      (0-based; fora de 32 força a busca genérica)
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=delimiter, lineterminator='\r\n')
+    writer.writerow(["MÊS", "UPA", "VALOR NF.", "VALOR RECEBIDO", "DATA", "", "", "SITUAÇÃO"])
+    resumo = {
+        summary_row: ["VIVA RIO EM ABERTO", "", "", "", "", "", "", ""],
+        summary_row + 1: ["SETEMBRO", "-R$ 10.000,00", "", "", "", "", "", ""],
+        summary_row + 2: ["OUTUBRO", "R$ 5.000,00", "", "", "", "", "", ""],
+        summary_row + 3: ["NOVEMBRO", "(R$ 1.200,50)", "", "", "", "", "", ""],
+        summary_row + 4: ["Total", "-R$ 6.200,50", "", "", "", "", "", ""],
+    }
+    for i in range(1, rows):
+        if i in resumo:
+            writer.writerow(resumo[i])
+            continue
+        bloco, posicao = divmod(i - 1, month_every)
+        mes = MESES[bloco % 12] if posicao == 1 else ""
+        writer.writerow([
+            mes,
+            f"UPA {posicao}",
+            f"R$ {1 + i % 9}.{i % 1000:03d},{i % 100:02d}",
+            f"R$ {i % 5000},00",
+            f"{1 + i % 28:02d}/{1 + bloco % 12:02d}/2025",
+            "",
+            "",
+            "PAGO" if i % 3 else "PENDENTE",
+        ])
+    return buf.getvalue()
+
+def build_cases(sizes):
+    """Casos de process_csv: (nome, linhas, conteúdo CSV)"""
+    casos = []
+    for n in sizes:
+        casos.append((f"cylla_{n}", n, generate_sheet(n)))
+        casos.append((f"cylla_{n}_semicolon", n, generate_sheet(n, delimiter=';')))
+        casos.append((f"cylla_{n}_tab", n, generate_sheet(n, delimiter='\t')))
+        casos.append((f"months_dense_{n}", n, generate_sheet(n, month_every=2)))
+        casos.append((f"generic_{n}", n, generate_sheet(n, summary_row=max(1, n // 2 - 3))))
+    return casos
+
+def percentile(valores, p):
+    """Percentil p (0-100) por interpolação linear"""
+    ordenados = sorted(valores)
+    if len(ordenados) == 1:
+        return ordenados[0]
+    k = (len(ordenados) - 1) * p / 100
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+@contextlib.contextmanager
+def quiet_stderr():
+    """Descartar os logs do extrator durante as medições"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+        yield
+
+def measure(func, rows, repeats):
+    """Executar func repetidamente: latência p50/p95, linhas/s e pico de memória"""
+    latencias = []
+    with quiet_stderr():
+        func()  # Aquecimento (regex compiladas, planos de layout, conexões)
+        for _ in range(repeats):
+            inicio = time.perf_counter()
+            func()
+            latencias.append(time.perf_counter() - inicio)
+
+        # Pico de memória numa execução separada (tracemalloc deixa a execução mais lenta)
+        tracemalloc.start()
+        func()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    p50 = statistics.median(latencias)
+    return {
+        "rows": rows,
+        "p50_ms": round(p50 * 1000, 3),
+        "p95_ms": round(percentile(latencias, 95) * 1000, 3),
+        "rows_per_s": round(rows / p50) if p50 > 0 else None,
+        "peak_mb": round(pico / (1024 * 1024), 2),
+    }
+
+def repeats_for(rows):
+    """Menos repetições para as planilhas grandes"""
+    if rows >= 1000000:
+        return 3
+    if rows >= 100000:
+        return 5
+    return 30
+
+@contextlib.contextmanager
+def local_sheets_server(csv_content):
+    """Servidor local (fake_sheets_server) com o CSV no gid 0; o extrator aponta para ele"""
+    original = extractor.SHEETS_BASE_URL
+    with FakeSheetsServer(sheets={"0": csv_content}) as base_url:
+        extractor.SHEETS_BASE_URL = base_url
+        try:
+            yield base_url
+        finally:
+            extractor.SHEETS_BASE_URL = original
+
+def clear_extractor_cache():
+    """Apagar o cache do último resultado (força o processamento completo)"""
+    with contextlib.suppress(OSError):
+        os.remove(extractor.LAST_RESULT_FILE)
+
+def run_pipeline(rows, csv_content):
+    """Casos de ponta a ponta: exportação HTTP local + processamento (com e sem alteração)"""
+    resultados = {}
+    with local_sheets_server(csv_content):
+        def extrair():
+            result = extractor.extract_financial_data(None, color_check="never", gid="0")
+            if not result["success"]:
+                raise RuntimeError(result["error"])
+            return result
+
+        def extrair_frio():
+            clear_extractor_cache()
+            extrair()
+
+        resultados[f"pipeline_{rows}"] = measure(extrair_frio, rows, repeats_for(rows))
+        # Mesmo conteúdo da execução anterior: só download e hash
+        resultados[f"pipeline_{rows}_unchanged"] = measure(extrair, rows, repeats_for(rows))
+    return resultados
+
+def compare(resultados, baseline, saida=None):
+    """Imprimir a comparação com a linha de base em saida (padrão: stdout); retorna o número de regressões"""
+    regressoes = 0
+    print(f"\n{'caso':32} {'p50 ms':>10} {'p95 ms':>10} {'linhas/s':>12} {'pico MB':>9} {'vs base':>9}", file=saida)
+    for nome, r in resultados.items():
+        base = baseline.get(nome)
+        comparacao = ""
+        if base and base.get("p50_ms"):
+            razao = r["p50_ms"] / base["p50_ms"]
+            comparacao = f"{razao:.2f}x"
+            if razao > REGRESSION_THRESHOLD:
+                comparacao += " !"
+                regressoes += 1
+        print(f"{nome:32} {r['p50_ms']:>10} {r['p95_ms']:>10} {r['rows_per_s'] or '-':>12} {r['peak_mb']:>9} {comparacao:>9}", file=saida)
+    return regressoes
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Benchmark do extrator do Google Sheets")
+    parser.add_argument("--full", action="store_true", help="incluir a planilha de 1 milhão de linhas")
+    parser.add_argument("--sizes", type=int, nargs="+", help="tamanhos (linhas) das planilhas sintéticas")
+    parser.add_argument("--only", help="rodar só os casos cujo nome contém este texto")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="arquivo JSON da linha de base")
+    parser.add_argument("--save-baseline", action="store_true", help="gravar os resultados como linha de base")
+    parser.add_argument("--json", action="store_true", help="imprimir os resultados em JSON")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    args = parse_args()
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    resultados = {}
+
+    try:
+        for nome, rows, conteudo in build_cases(sizes):
+            if args.only and args.only not in nome:
+                continue
+            print(f"[BENCHMARK] process_csv: {nome}...", file=sys.stderr)
+            resultados[nome] = measure(lambda: extractor.process_csv(conteudo), rows, repeats_for(rows))
+
+        for rows in sizes:
+            if args.only and args.only not in f"pipeline_{rows}":
+                continue
+            print(f"[BENCHMARK] pipeline: {rows} linhas...", file=sys.stderr)
+            resultados.update(run_pipeline(rows, generate_sheet(rows)))
+    finally:
+        shutil.rmtree(BENCH_CACHE_DIR, ignore_errors=True)
+
+    baseline = {}
+    primeira = not os.path.exists(args.baseline)
+    if not primeira:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get("results", {})
+
+    # Com --json a tabela vai para stderr e o stdout fica só com o JSON
+    regressoes = compare(resultados, baseline, sys.stderr if args.json else None)
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+
+    if args.save_baseline or primeira:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": sys.version.split()[0],
+                "results": resultados
+            }, f, indent=2)
+        motivo = "" if args.save_baseline else " (não havia linha de base; as próximas execuções comparam com ela)"
+        print(f"\n[BENCHMARK] Linha de base gravada em {args.baseline}{motivo}", file=sys.stderr)
+    elif regressoes:
+        print(f"\n[BENCHMARK] ⚠️ {regressoes} caso(s) acima de {REGRESSION_THRESHOLD:.2f}x a linha de base", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
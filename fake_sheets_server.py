@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita as URLs de exportação do Google Sheets
+Serve /spreadsheets/d/<id>/export e /spreadsheets/d/<id>/gviz/tq a partir de CSVs (e XLSX)
+de fixture, com latência e falhas injetadas por GID — para testes de carga e benchmarks
+do extrator sem rede.
+
+Fixtures: <dir>/<spreadsheet_id>/<gid>.csv ou <dir>/<gid>.csv (vale para qualquer planilha);
+export?format=xlsx procura <gid>.xlsx. Export sem gid serve o gid 0.
+
+Falhas e latência são configuradas por chave: "<gid>", "export:<gid>", "gviz:<gid>" ou "*"
+(a mais específica vence). Tipos de falha:
+    html          200 com uma página de login HTML no lugar do CSV
+    timeout[:s]   segura a conexão por s segundos (padrão 60) sem responder
+    <código>      responde com o status HTTP (ex: 500, 503, 404)
+
+Uso:
+    python fake_sheets_server.py --fixtures fixtures/ --port 8765 \\
+        --latency 0=0.3 --fault 1=html --fault gviz:2=timeout:10 --fault 3=503
+    GOOGLE_SHEETS_BASE_URL=http://127.0.0.1:8765 python google_sheets_extractor.py
+
+Como o Google, as respostas são comprimidas com gzip quando o cliente envia
+Accept-Encoding: gzip (desativável com --no-gzip).
+
+GET /__stats retorna o número de requisições por endpoint, gid e resultado (e os bytes enviados).
+"""
+
+import argparse
+import collections
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import re
+import sys
+import threading
+import urllib.parse
+
+PATH_RE = re.compile(r'^/spreadsheets/d/([^/]+)/(export|gviz/tq)$')
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+LOGIN_HTML = (b"<!DOCTYPE html><html><head><title>Google Sheets - fazer login</title></head>"
+              b"<body><form action=\"https://accounts.google.com/ServiceLogin\"></form></body></html>")
+
+class FakeSheetsHandler(http.server.BaseHTTPRequestHandler):
+    """Responder às URLs de exportação conforme a configuração do FakeSheetsServer"""
+
+    protocol_version = "HTTP/1.1"
+    # Cabeçalhos e corpo saem em escritas separadas: sem TCP_NODELAY, conexões keep-alive
+    # esperariam o ACK atrasado do cliente (~40 ms) a cada resposta
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        fake = self.server.fake
+        parsed = urllib.parse.urlparse(self.path)
+
+        if parsed.path == "/__stats":
+            self.send_body(200, json.dumps(fake.stats()).encode('utf-8'), "application/json")
+            return
+
+        match = PATH_RE.match(parsed.path)
+        if not match:
+            fake.record("?", None, 404)
+            self.send_body(404, b"not found", "text/plain")
+            return
+
+        spreadsheet_id = match.group(1)
+        endpoint = "export" if match.group(2) == "export" else "gviz"
+        query = urllib.parse.parse_qs(parsed.query)
+        gid = query.get('gid', ['0'])[0]
+        formato = query.get('format', ['csv'])[0] if endpoint == "export" else "csv"
+
+        atraso = fake.lookup(fake.latency, endpoint, gid)
+        if atraso and fake.stopping.wait(atraso):
+            return
+
+        falha = fake.lookup(fake.faults, endpoint, gid)
+        if falha:
+            self.inject_fault(fake, endpoint, gid, falha)
+            return
+
+        body = fake.load(spreadsheet_id, gid, formato)
+        if body is None:
+            fake.record(endpoint, gid, 404)
+            self.send_body(404, b"not found", "text/plain")
+            return
+
+        # Validadores como os do Google: o extrator pede de forma condicional e aceita 304
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            fake.record(endpoint, gid, 304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        fake.record(endpoint, gid, 200)
+        self.send_body(200, body, CONTENT_TYPES.get(formato, "application/octet-stream"), etag)
+
+    def inject_fault(self, fake, endpoint, gid, falha):
+        tipo, _, parametro = falha.partition(':')
+        if tipo == "html":
+            fake.record(endpoint, gid, "html")
+            self.send_body(200, LOGIN_HTML, "text/html; charset=utf-8")
+        elif tipo == "timeout":
+            fake.record(endpoint, gid, "timeout")
+            # Segura a conexão sem responder (encerra antes se o servidor for parado)
+            fake.stopping.wait(float(parametro or 60))
+            self.close_connection = True
+        else:
+            status = int(tipo)
+            fake.record(endpoint, gid, status)
+            self.send_body(status, f"erro {status}".encode('utf-8'), "text/plain")
+
+    def send_body(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if (self.server.fake.compress and content_type.startswith("text/")
+                and 'gzip' in (self.headers.get('Accept-Encoding') or '')):
+            body = gzip.compress(body, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.fake.record_bytes(len(body))
+
+    def log_message(self, format, *args):
+        if self.server.fake.verbose:
+            print(f"[FAKE SHEETS] {self.address_string()} {format % args}", file=sys.stderr)
+
+class FakeSheetsServer:
+    """Servidor HTTP local com as URLs de exportação do Google Sheets
+
+    fixtures_dir: diretório com os CSVs/XLSX de fixture (ver docstring do módulo)
+    sheets: {gid: conteúdo (str ou bytes)} em memória, usado antes das fixtures
+    latency: {chave: segundos}; faults: {chave: "html" | "timeout[:s]" | "<status>"}
+    compress: gzip nas respostas de texto quando o cliente aceita
+
+    Uso: with FakeSheetsServer(sheets={"0": csv}) as base_url: ...
+    """
+
+    def __init__(self, fixtures_dir=None, sheets=None, latency=None, faults=None,
+                 host='127.0.0.1', port=0, verbose=False, compress=True):
+        self.fixtures_dir = fixtures_dir
+        self.sheets = {str(gid): conteudo.encode('utf-8') if isinstance(conteudo, str) else conteudo
+                       for gid, conteudo in (sheets or {}).items()}
+        self.latency = {str(k): float(v) for k, v in (latency or {}).items()}
+        self.faults = {str(k): str(v) for k, v in (faults or {}).items()}
+        self.verbose = verbose
+        self.compress = compress
+        self.stopping = threading.Event()
+        self.contagem = collections.Counter()
+        self.lock = threading.Lock()
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), FakeSheetsHandler)
+        self.httpd.fake = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Atender em uma thread; retorna a URL base (para GOOGLE_SHEETS_BASE_URL)"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        """Parar o servidor (libera conexões presas em timeout ou latência)"""
+        self.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def lookup(config, endpoint, gid):
+        """Valor mais específico para a requisição: "<endpoint>:<gid>", "<gid>" ou "*" """
+        for chave in (f"{endpoint}:{gid}", gid, "*"):
+            if chave in config:
+                return config[chave]
+        return None
+
+    def load(self, spreadsheet_id, gid, formato):
+        """Conteúdo da aba (bytes) ou None se não houver fixture"""
+        if formato == "csv" and gid in self.sheets:
+            return self.sheets[gid]
+        if not self.fixtures_dir:
+            return None
+        for caminho in (os.path.join(self.fixtures_dir, spreadsheet_id, f"{gid}.{formato}"),
+                        os.path.join(self.fixtures_dir, f"{gid}.{formato}")):
+            if os.path.isfile(caminho):
+                with open(caminho, 'rb') as f:
+                    return f.read()
+        return None
+
+    def record(self, endpoint, gid, resultado):
+        with self.lock:
+            self.contagem[f"{endpoint}:{gid}:{resultado}"] += 1
+
+    def record_bytes(self, n):
+        with self.lock:
+            self.contagem["bytes_sent"] += n
+
+    def stats(self):
+        """Número de requisições por "<endpoint>:<gid>:<resultado>" e total de "bytes_sent" """
+        with self.lock:
+            return dict(self.contagem)
+
+    def reset_stats(self):
+        with self.lock:
+            self.contagem.clear()
+
+def parse_pairs(pares, opcao):
+    """Converter ["chave=valor", ...] em dicionário"""
+    resultado = {}
+    for par in pares or []:
+        chave, sep, valor = par.partition('=')
+        if not sep:
+            raise SystemExit(f"{opcao}: esperado CHAVE=VALOR, recebido '{par}'")
+        resultado[chave] = valor
+    return resultado
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Servidor local das URLs de exportação do Google Sheets")
+    parser.add_argument("--fixtures", metavar="DIR", help="diretório com <gid>.csv ou <id>/<gid>.csv")
+    parser.add_argument("--sheet", action="append", metavar="GID=ARQUIVO", help="CSV servido para o GID")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", metavar="CHAVE=SEGUNDOS",
+                        help="atraso antes de responder (chave: gid, export:gid, gviz:gid ou *)")
+    parser.add_argument("--fault", action="append", metavar="CHAVE=FALHA",
+                        help="falha injetada: html, timeout[:s] ou um status HTTP (ex: 503)")
+    parser.add_argument("--no-gzip", action="store_true", help="não comprimir as respostas")
+    parser.add_argument("--verbose", action="store_true", help="registrar cada requisição no stderr")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    args = parse_args()
+    sheets = {}
+    for gid, caminho in parse_pairs(args.sheet, "--sheet").items():
+        with open(caminho, 'rb') as f:
+            sheets[gid] = f.read()
+
+    fake = FakeSheetsServer(
+        fixtures_dir=args.fixtures,
+        sheets=sheets,
+        latency=parse_pairs(args.latency, "--latency"),
+        faults=parse_pairs(args.fault, "--fault"),
+        host=args.host,
+        port=args.port,
+        verbose=args.verbose,
+        compress=not args.no_gzip
+    )
+    print(f"[FAKE SHEETS] Servindo em {fake.base_url} (GOOGLE_SHEETS_BASE_URL={fake.base_url})", file=sys.stderr)
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
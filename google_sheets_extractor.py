@@ -6,6 +6,10 @@ Foco: Extrair dados financeiros da planilha
 Usa Selenium para acessar a planilha pública
 """
 
+import argparse
+import array
+import base64
+import binascii
 import json
 import sys
 import time
@@ -14,6 +18,21 @@ import io
 import os
 import urllib.request
 import urllib.parse
+import urllib.error
+import http.client
+import ssl
+import select
+import hashlib
+import queue
+import threading
+import collections
+import itertools
+import contextlib
+import shutil
+import tempfile
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -24,19 +43,190 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 import re
 
-def setup_driver():
-    """Configurar o driver do Chrome"""
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
+from snapshot_store import month_lines, save_snapshot
+
+# Endereço do Google Sheets; apontar para outro servidor (ex: fake_sheets_server.py) permite
+# testes de carga e benchmarks sem rede
+SHEETS_BASE_URL = os.getenv('GOOGLE_SHEETS_BASE_URL', 'https://docs.google.com').rstrip('/')
+SPREADSHEET_ID = os.getenv('GOOGLE_SHEETS_SPREADSHEET_ID', "10vaVp0DcgOfjWW3_vat7M8mRVvMiBdtU9kAlDmjEioc")
+SPREADSHEET_URL = f"{SHEETS_BASE_URL}/spreadsheets/d/{SPREADSHEET_ID}/edit?usp=sharing"
+SHEET_TAB_NAME = "RELATÓRIO CYLLA"
+
+# Layout padrão das planilhas (ver LAYOUTS)
+DEFAULT_LAYOUT = "relatorio_cylla"
+
+# Prazo total (s) da corrida entre as URLs de exportação CSV
+EXPORT_DEADLINE = float(os.getenv('GOOGLE_SHEETS_EXPORT_DEADLINE', '20'))
+
+# Ordem adaptativa das URLs de exportação (ver order_export_urls): histórico por variante
+# (export/gviz e GID) com contagens que decaem pela metade a cada EXPORT_STATS_HALF_LIFE segundos
+ADAPTIVE_EXPORT = os.getenv('GOOGLE_SHEETS_ADAPTIVE_EXPORT', 'true').lower() not in ('0', 'false')
+EXPORT_STATS_HALF_LIFE = 24 * 3600
+EXPORT_DEFAULT_LATENCY = 1.0     # Latência (s) assumida para variantes sem histórico
+# Disjuntor: após CIRCUIT_FAILURES falhas seguidas a variante é pulada por CIRCUIT_BASE_SECONDS,
+# dobrando a cada nova falha até CIRCUIT_MAX_SECONDS
+CIRCUIT_FAILURES = 3
+CIRCUIT_BASE_SECONDS = 300
+CIRCUIT_MAX_SECONDS = 6 * 3600
+# Vantagem (s) dada à variante mais confiável antes de disparar as demais na corrida
+HEDGE_MIN_SECONDS = 0.5
+HEDGE_MAX_SECONDS = 3.0
+
+# Conexões HTTP keep-alive reaproveitadas entre as requisições (ver HttpPool); false volta ao urllib
+HTTP_POOL_ENABLED = os.getenv('GOOGLE_SHEETS_HTTP_POOL', 'true').lower() not in ('0', 'false')
+HTTP_POOL_MAX_IDLE = 8          # Conexões ociosas guardadas por host
+HTTP_POOL_IDLE_SECONDS = 60     # Conexões ociosas há mais tempo são descartadas (o servidor já pode tê-las fechado)
+HTTP_CHUNK_BYTES = 64 * 1024
+# Tamanho máximo de uma resposta (já descomprimida); acima disso a leitura é interrompida
+MAX_RESPONSE_BYTES = int(float(os.getenv('GOOGLE_SHEETS_MAX_RESPONSE_MB', '100')) * 1024 * 1024)
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Verificação de valores negativos pela cor: "auto" (Chrome já aberto), "always", "never"
+# ou "xlsx" (export XLSX via HTTP, sem navegador)
+COLOR_CHECK = os.getenv('GOOGLE_SHEETS_COLOR_CHECK', 'auto').lower()
+
+# Processar a exportação CSV em streaming quando o GID da aba já é conhecido
+# (memória constante, mesmo para abas muito grandes)
+STREAM_CSV = os.getenv('GOOGLE_SHEETS_STREAM', '').lower() in ('1', 'true')
+
+# Diretório dos caches em disco do extrator (GID das abas, etc.)
+CACHE_DIR = os.getenv('GOOGLE_SHEETS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sheets_cache'))
+GID_CACHE_FILE = os.path.join(CACHE_DIR, 'gid_cache.json')
+EXPORT_STATS_FILE = os.path.join(CACHE_DIR, 'export_stats.json')
+LAST_RESULT_FILE = os.path.join(CACHE_DIR, 'last_result.json')
+# Erros de tentativa que indicam que o GID em cache não é mais a aba (timeouts e 5xx não contam)
+GID_INVALID_ERRORS = frozenset(("html", "wrong_tab", "400", "404"))
+DRIVER_CACHE_FILE = os.path.join(CACHE_DIR, 'driver_paths.json')
+
+# Perfil rápido do Chrome: pageLoadStrategy=eager, bloqueio de imagens, fontes, mídia e
+# terceiros, e um user-data-dir reaproveitado (assets do Sheets vêm do cache em disco)
+FAST_BROWSER = os.getenv('GOOGLE_SHEETS_FAST_BROWSER', 'true').lower() not in ('0', 'false')
+CHROME_PROFILE_DIR = os.getenv('GOOGLE_SHEETS_CHROME_PROFILE', os.path.join(CACHE_DIR, 'chrome-profile'))
+
+# Prazos máximos (s) das esperas por sinais reais da página; carregamentos rápidos terminam antes
+PAGE_READY_TIMEOUT = float(os.getenv('GOOGLE_SHEETS_PAGE_TIMEOUT', '20'))   # grade ou erro de permissão
+TAB_ACTIVE_TIMEOUT = float(os.getenv('GOOGLE_SHEETS_TAB_TIMEOUT', '5'))     # aba com aria-selected
+GRID_STABLE_TIMEOUT = float(os.getenv('GOOGLE_SHEETS_GRID_TIMEOUT', '10'))  # células pararem de mudar
+GRID_QUIET_MS = 500  # Tempo sem mudanças na grade para considerá-la pronta
+
+# Leitura da grade pelo DOM: prazo total (s), espera após cada rolagem (ms) e máximo de trechos
+DOM_SCAN_TIMEOUT = float(os.getenv('GOOGLE_SHEETS_DOM_TIMEOUT', '30'))
+DOM_SCROLL_SETTLE_MS = 150
+DOM_MAX_CHUNKS = 500
+
+# Diff por linha entre extrações: planilhas com mais linhas que isso são sempre processadas inteiras
+DIFF_MAX_ROWS = int(os.getenv('GOOGLE_SHEETS_DIFF_MAX_ROWS', '200000'))
+
+# Histórico das extrações em SQLite (ver snapshot_store.py): caminho do banco; vazio desativa
+SNAPSHOT_DB = os.getenv('GOOGLE_SHEETS_SNAPSHOT_DB')
+
+# Perfil de execução (cProfile + tracemalloc): caminho do arquivo .prof a gravar
+PROFILE_FILE = os.getenv('GOOGLE_SHEETS_PROFILE')
+
+# URLs bloqueadas no perfil rápido (Network.setBlockedURLs aceita curingas)
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*fonts.gstatic.com*", "*fonts.googleapis.com*",
+    "*googleusercontent.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*play.google.com/log*", "*/gen_204*",
+]
+
+# Os caches em disco são lidos e regravados inteiros; no modo lote várias planilhas
+# são extraídas ao mesmo tempo
+CACHE_LOCK = threading.Lock()
+
+class Timings:
+    """Tempos (monotônicos) das fases de uma extração, devolvidos em result["timings"]"""
+    
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.fases = {}        # fase -> segundos (somados se a fase se repetir)
+        self.exportacoes = []  # tentativas de URL de exportação
+        self.notas = {}        # ex: método de extração do DOM usado
+        self.lock = threading.Lock()
+    
+    def add(self, fase, segundos):
+        with self.lock:
+            self.fases[fase] = round(self.fases.get(fase, 0) + segundos, 3)
+    
+    def export_attempt(self, url, status, tamanho, segundos):
+        with self.lock:
+            self.exportacoes.append({
+                "url": url,
+                "status": status,
+                "bytes": tamanho,
+                "seconds": round(segundos, 3)
+            })
     
+    def note(self, chave, valor):
+        with self.lock:
+            self.notas[chave] = valor
+    
+    def as_dict(self):
+        with self.lock:
+            return {
+                "total": round(time.monotonic() - self.inicio, 3),
+                "phases": dict(self.fases),
+                "exports": list(self.exportacoes),
+                **self.notas
+            }
+
+# Tempos da extração em andamento, por thread (o modo lote extrai várias planilhas ao mesmo tempo)
+TIMINGS_ATUAL = threading.local()
+
+def current_timings():
+    """Timings da extração em andamento nesta thread (None fora de uma extração)"""
+    return getattr(TIMINGS_ATUAL, 'timings', None)
+
+@contextlib.contextmanager
+def timed(fase):
+    """Medir um trecho como a fase `fase` da extração em andamento
+    Emite os eventos "phase" de início e fim (ver emit_event)
+    """
+    timings = current_timings()
+    inicio = time.monotonic()
+    emit_event("phase", phase=fase, status="start")
+    try:
+        yield
+    finally:
+        segundos = time.monotonic() - inicio
+        if timings:
+            timings.add(fase, segundos)
+        emit_event("phase", phase=fase, status="end", seconds=round(segundos, 3))
+
+def note_timing(chave, valor):
+    """Registrar uma informação (ex: dom_method) junto dos tempos da extração em andamento"""
+    timings = current_timings()
+    if timings:
+        timings.note(chave, valor)
+
+# Destino dos eventos de progresso da extração em andamento, por thread (ver event_sink)
+EVENTOS_ATUAL = threading.local()
+
+def emit_event(evento, **campos):
+    """Enviar um evento de progresso ("phase", "month_block", "summary") da extração em andamento
+    "reset" avisa que os blocos e o resumo já enviados devem ser descartados (a leitura falhou no meio)
+    Sem destino instalado nesta thread o evento é descartado
+    """
+    emitter = getattr(EVENTOS_ATUAL, 'emitter', None)
+    if emitter:
+        emitter({"event": evento, **campos})
+
+@contextlib.contextmanager
+def event_sink(emitter):
+    """Enviar os eventos das extrações desta thread para emitter(evento) durante o bloco"""
+    anterior = getattr(EVENTOS_ATUAL, 'emitter', None)
+    EVENTOS_ATUAL.emitter = emitter
+    try:
+        yield
+    finally:
+        EVENTOS_ATUAL.emitter = anterior
+
+def find_chrome_binary():
+    """Procurar o executável do Chrome no PATH e nos locais comuns do Windows"""
     # Tentar encontrar o Chrome em locais comuns no Windows
     chrome_paths = [
         r"C:\Program Files\Google\Chrome\Application\chrome.exe",
@@ -45,8 +235,6 @@ def setup_driver():
         r"C:\Users\{}\AppData\Local\Google\Chrome\Application\chrome.exe".format(os.getenv('USERPROFILE', '').split('\\')[-1] if os.getenv('USERPROFILE') else ''),
     ]
     
-    # Também tentar buscar no registro do Windows ou variáveis de ambiente
-    import shutil
     chrome_binary = shutil.which("chrome") or shutil.which("google-chrome") or shutil.which("chromium")
     
     if not chrome_binary:
@@ -55,90 +243,260 @@ def setup_driver():
                 chrome_binary = path
                 break
     
+    return chrome_binary
+
+def resolve_browser_paths(refresh=False):
+    """Caminhos do Chrome e do chromedriver: {"chrome_binary", "chromedriver"}
+    Resolvidos uma vez (busca nos locais padrão e ChromeDriverManager().install(), que
+    consulta versões e pode baixar o driver) e guardados em DRIVER_CACHE_FILE.
+    refresh: ignorar o cache (ex: o Chrome foi atualizado e o driver não serve mais)
+    """
+    cache = {} if refresh else load_json_cache(DRIVER_CACHE_FILE)
+    paths = {
+        chave: caminho for chave, caminho in cache.items()
+        if chave in ("chrome_binary", "chromedriver") and caminho and os.path.exists(caminho)
+    }
+    
+    if "chrome_binary" not in paths:
+        chrome_binary = find_chrome_binary()
+        if chrome_binary:
+            paths["chrome_binary"] = chrome_binary
+    
+    if "chromedriver" not in paths:
+        try:
+            # Usar webdriver-manager para gerenciar automaticamente o ChromeDriver
+            paths["chromedriver"] = ChromeDriverManager().install()
+        except Exception as e:
+            print(f"[GOOGLE SHEETS] ⚠️ webdriver-manager falhou: {e}", file=sys.stderr)
+    
+    if paths != cache:
+        save_json_cache(DRIVER_CACHE_FILE, paths)
+    return paths
+
+def build_chrome_options(chrome_binary=None, fast=False, profile_dir=None):
+    """Opções do Chrome headless (perfil rápido: carregamento eager, sem imagens, perfil em disco)"""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    
     if chrome_binary:
         chrome_options.binary_location = chrome_binary
-        print(f"[GOOGLE SHEETS] Chrome encontrado em: {chrome_binary}", file=sys.stderr)
-    else:
-        print("[GOOGLE SHEETS] ⚠️ Chrome não encontrado nos locais padrão. Tentando sem especificar caminho...", file=sys.stderr)
     
-    try:
-        # Usar webdriver-manager para gerenciar automaticamente o ChromeDriver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # Executar script para ocultar webdriver
-        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-            'source': '''
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                })
-            '''
+    if fast:
+        # Não esperar imagens e subrecursos: o conteúdo da planilha vem do JS da página
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2
         })
-        
-        return driver
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--mute-audio')
+    if profile_dir:
+        chrome_options.add_argument(f'--user-data-dir={profile_dir}')
+    
+    return chrome_options
+
+def prepare_driver(driver, fast=False):
+    """Comandos CDP aplicados a cada navegador novo (ocultar webdriver e, no perfil rápido, bloquear recursos)"""
+    # Executar script para ocultar webdriver
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+        'source': '''
+            Object.defineProperty(navigator, 'webdriver', {
+                get: () => undefined
+            })
+        '''
+    })
+    
+    if fast:
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            print(f"[GOOGLE SHEETS] ⚠️ Não foi possível bloquear recursos via CDP: {e}", file=sys.stderr)
+
+def start_chrome(paths, fast, profile_dir):
+    """Iniciar o Chrome com os caminhos resolvidos; None se falhar"""
+    chrome_options = build_chrome_options(paths.get("chrome_binary"), fast, profile_dir)
+    try:
+        if paths.get("chromedriver"):
+            return webdriver.Chrome(service=Service(paths["chromedriver"]), options=chrome_options)
+        return webdriver.Chrome(options=chrome_options)
     except Exception as e:
         print(f"Erro ao configurar driver: {e}", file=sys.stderr)
+        return None
+
+def setup_driver(fast=None):
+    """Configurar o driver do Chrome
+    fast: usar o perfil rápido (padrão: FAST_BROWSER)
+    O tempo de inicialização fica em driver.setup_seconds
+    """
+    if fast is None:
+        fast = FAST_BROWSER
+    inicio = time.monotonic()
+    
+    paths = resolve_browser_paths()
+    if paths.get("chrome_binary"):
+        print(f"[GOOGLE SHEETS] Chrome encontrado em: {paths['chrome_binary']}", file=sys.stderr)
+    else:
+        print("[GOOGLE SHEETS] ⚠️ Chrome não encontrado nos locais padrão. Tentando sem especificar caminho...", file=sys.stderr)
+    
+    profile_dir = CHROME_PROFILE_DIR if fast else None
+    driver = start_chrome(paths, fast, profile_dir)
+    if driver is None and paths.get("chromedriver"):
+        # O driver em cache pode não servir mais (Chrome atualizado): resolver de novo
+        paths = resolve_browser_paths(refresh=True)
+        driver = start_chrome(paths, fast, profile_dir)
+    if driver is None and profile_dir:
+        # O user-data-dir pode estar em uso por outro Chrome (processo --serve e script avulso)
+        driver = start_chrome(paths, fast, None)
+    
+    if driver is None:
         # Tentar sem webdriver-manager como fallback
         try:
-            driver = webdriver.Chrome(options=chrome_options)
-            return driver
+            driver = webdriver.Chrome(options=build_chrome_options(paths.get("chrome_binary"), fast))
         except Exception as e2:
             print(f"Erro ao configurar driver (fallback): {e2}", file=sys.stderr)
             return None
-
-def extract_financial_data(driver, url):
-    """Extrair dados financeiros do Google Sheets"""
-    result = {
-        "success": False,
-        "message": "",
-        "valores": {
-            "vivaRioEmAberto": None,
-            "setembro": None,
-            "outubro": None,
-            "novembro": None,
-            "total": None,
-            "meses": {}  # Dados organizados por mês
-        },
-        "error": None
-    }
     
+    prepare_driver(driver, fast)
+    driver.setup_seconds = round(time.monotonic() - inicio, 2)
+    print(f"[GOOGLE SHEETS] Chrome iniciado em {driver.setup_seconds}s (perfil rápido: {'sim' if fast else 'não'})", file=sys.stderr)
+    return driver
+
+def get_page_bytes(driver):
+    """Bytes transferidos pela página atual (documento + recursos), via Resource Timing
+    Recursos vindos do cache em disco contam 0; None se não for possível medir
+    """
     try:
-        print(f"[GOOGLE SHEETS] Acessando planilha: {url}", file=sys.stderr)
-        driver.get(url)
-        
-        # Aguardar página carregar (reduzido de 5s para 2s)
-        print("[GOOGLE SHEETS] Aguardando página carregar...", file=sys.stderr)
-        wait = WebDriverWait(driver, 10)
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        time.sleep(2)  # Reduzido de 5s para 2s
-        
-        # Verificar se há erro de permissão
+        return driver.execute_script("""
+            const entradas = performance.getEntriesByType('navigation')
+                .concat(performance.getEntriesByType('resource'));
+            return entradas.reduce((total, e) => total + (e.transferSize || 0), 0);
+        """)
+    except Exception:
+        return None
+
+def is_driver_alive(driver):
+    """Verificar se a sessão do Chrome ainda responde"""
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+def quit_driver(driver):
+    """Encerrar o driver ignorando erros"""
+    if driver:
         try:
-            page_text = driver.find_element(By.TAG_NAME, "body").text
-            if "permissão" in page_text.lower() or "permission" in page_text.lower() or "acesso negado" in page_text.lower():
-                result["error"] = "Problema de permissão detectado"
-                result["message"] = "A planilha requer permissão de acesso"
-                return result
+            driver.quit()
         except:
-            pass  # Continuar se não conseguir verificar
-        
-        # Aguardar planilha renderizar (reduzido de 5s para 2s)
-        print("[GOOGLE SHEETS] Aguardando planilha renderizar...", file=sys.stderr)
-        time.sleep(2)  # Reduzido de 5s para 2s
-        
-        # Tentar encontrar a aba "RELATÓRIO CYLLA" (timeout reduzido)
-        print("[GOOGLE SHEETS] Procurando aba 'RELATÓRIO CYLLA'...", file=sys.stderr)
+            pass
+
+def wait_for_first_paint(driver, timeout=PAGE_READY_TIMEOUT):
+    """Aguardar o primeiro conteúdo da planilha: a grade ou uma mensagem de permissão
+    Retorna "grid", "permission" ou None (prazo esgotado)
+    """
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script("""
+            const body = document.body;
+            if (!body) return null;
+            if (document.querySelector('[role="gridcell"], [role="grid"], #waffle-grid-container, .grid-container')) {
+                return 'grid';
+            }
+            const texto = (body.innerText || '').toLowerCase();
+            if (texto.includes('permissão') || texto.includes('permission') || texto.includes('acesso negado')) {
+                return 'permission';
+            }
+            return null;
+        """))
+    except Exception:
+        return None
+
+def wait_for_tab_active(driver, tab_name, timeout=TAB_ACTIVE_TIMEOUT):
+    """Aguardar a aba tab_name ficar selecionada (aria-selected ou classe de aba ativa)"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script("""
+            const nome = arguments[0];
+            const abas = document.querySelectorAll('[role="tab"], .docs-sheet-tab');
+            return Array.from(abas).some(aba => (aba.textContent || '').includes(nome) && (
+                aba.getAttribute('aria-selected') === 'true' ||
+                aba.classList.contains('docs-sheet-active-tab')
+            ));
+        """, tab_name))
+        return True
+    except Exception:
+        return False
+
+def wait_for_grid_stable(driver, timeout=GRID_STABLE_TIMEOUT, quiet_ms=GRID_QUIET_MS):
+    """Aguardar o número de células da grade parar de mudar (MutationObserver)
+    Pronta quando há células e a contagem não muda por quiet_ms. Retorna o número de células
+    ou None se o prazo esgotar antes.
+    """
+    try:
+        driver.set_script_timeout(timeout + 5)
+        return driver.execute_async_script("""
+            const [timeoutMs, quietMs, done] = arguments;
+            const contar = () => document.querySelectorAll('[role="gridcell"]').length;
+            let ultimo = contar();
+            let silencio = null;
+            const terminar = (valor) => {
+                observer.disconnect();
+                clearTimeout(silencio);
+                clearTimeout(limite);
+                done(valor);
+            };
+            // Reiniciar a contagem de silêncio só quando o número de células muda
+            const reiniciar = () => {
+                clearTimeout(silencio);
+                silencio = setTimeout(() => {
+                    if (ultimo > 0) terminar(ultimo); else reiniciar();
+                }, quietMs);
+            };
+            const verificar = () => {
+                const total = contar();
+                if (total !== ultimo) {
+                    ultimo = total;
+                    reiniciar();
+                }
+            };
+            const observer = new MutationObserver(verificar);
+            observer.observe(document.body, {childList: true, subtree: true});
+            const limite = setTimeout(() => terminar(null), timeoutMs);
+            reiniciar();
+        """, int(timeout * 1000), quiet_ms)
+    except Exception:
+        return None
+
+def gid_from_sheet_url(url):
+    """Extrair o gid de uma URL da planilha (#gid=<gid> ou ?gid=<gid>; None se não houver)"""
+    partes = urllib.parse.urlparse(url)
+    for trecho in (partes.fragment, partes.query):
+        gid = urllib.parse.parse_qs(trecho).get('gid', [None])[0]
+        if gid is not None:
+            return gid
+    return None
+
+def select_sheet_tab(driver, tab_name):
+    """Clicar na aba tab_name e aguardar a seleção (se não for encontrada, segue adiante)"""
+    with timed("tab_click"):
+        print(f"[GOOGLE SHEETS] Procurando aba '{tab_name}'...", file=sys.stderr)
         try:
             # Procurar por abas (sheets tabs)
             aba_encontrada = False
-            wait_aba = WebDriverWait(driver, 5)  # Reduzido de 10s para 5s
+            wait_aba = WebDriverWait(driver, TAB_ACTIVE_TIMEOUT)
             
             # Tentar diferentes seletores para encontrar as abas
             aba_selectors = [
-                "//span[contains(text(), 'RELATÓRIO CYLLA')]",  # Mais comum, tentar primeiro
-                "//div[@role='tab' and contains(text(), 'RELATÓRIO CYLLA')]",
-                "//div[contains(@class, 'docs-sheet-tab') and contains(text(), 'RELATÓRIO CYLLA')]",
-                "//div[contains(@class, 'sheet-tab') and contains(text(), 'RELATÓRIO CYLLA')]"
+                f"//span[contains(text(), '{tab_name}')]",  # Mais comum, tentar primeiro
+                f"//div[@role='tab' and contains(text(), '{tab_name}')]",
+                f"//div[contains(@class, 'docs-sheet-tab') and contains(text(), '{tab_name}')]",
+                f"//div[contains(@class, 'sheet-tab') and contains(text(), '{tab_name}')]"
             ]
             
             for selector in aba_selectors:
@@ -148,359 +506,1511 @@ def extract_financial_data(driver, url):
                         print(f"[GOOGLE SHEETS] Aba encontrada com seletor: {selector}", file=sys.stderr)
                         aba_element.click()
                         aba_encontrada = True
-                        time.sleep(1)  # Reduzido de 3s para 1s
+                        if not wait_for_tab_active(driver, tab_name):
+                            print(f"[GOOGLE SHEETS] ⚠️ Aba '{tab_name}' não confirmou seleção em {TAB_ACTIVE_TIMEOUT}s", file=sys.stderr)
                         break
                 except:
                     continue
             
             if not aba_encontrada:
-                print("[GOOGLE SHEETS] ⚠️ Aba 'RELATÓRIO CYLLA' não encontrada, tentando continuar...", file=sys.stderr)
+                print(f"[GOOGLE SHEETS] ⚠️ Aba '{tab_name}' não encontrada, tentando continuar...", file=sys.stderr)
         except Exception as e:
             print(f"[GOOGLE SHEETS] Erro ao procurar aba: {e}", file=sys.stderr)
+
+def load_spreadsheet_page(driver, url, tab_name=SHEET_TAB_NAME):
+    """Abrir a planilha no navegador e selecionar a aba tab_name ('RELATÓRIO CYLLA')
+    Cada etapa espera por um sinal da página (grade, aba selecionada, grade estável) com
+    prazo próprio; se o prazo esgotar, a extração continua como antes. Com o gid na URL
+    (ou sem tab_name) a aba já abre selecionada e não é procurada.
+    Retorna None em caso de sucesso ou a mensagem de erro (ex: permissão)
+    """
+    print(f"[GOOGLE SHEETS] Acessando planilha: {url}", file=sys.stderr)
+    inicio = time.monotonic()
+    with timed("page_load"):
+        driver.get(url)
         
-        # Aguardar aba carregar (reduzido de 5s para 2s)
-        time.sleep(2)  # Reduzido de 5s para 2s
+        # Aguardar a grade ou uma mensagem de permissão no primeiro conteúdo da página
+        print("[GOOGLE SHEETS] Aguardando página carregar...", file=sys.stderr)
+        estado = wait_for_first_paint(driver)
+    if estado == "permission":
+        return "Problema de permissão detectado"
+    if estado is None:
+        print(f"[GOOGLE SHEETS] ⚠️ Grade não apareceu em {PAGE_READY_TIMEOUT}s, tentando continuar...", file=sys.stderr)
+    
+    # Tentar encontrar a aba "RELATÓRIO CYLLA" (timeout reduzido)
+    if tab_name is None or gid_from_sheet_url(url) is not None:
+        print("[GOOGLE SHEETS] Aba selecionada pelo GID da URL", file=sys.stderr)
+    else:
+        select_sheet_tab(driver, tab_name)
+    
+    # Aguardar as células da aba pararem de mudar
+    with timed("grid_wait"):
+        celulas = wait_for_grid_stable(driver)
+    if celulas is None:
+        print(f"[GOOGLE SHEETS] ⚠️ Grade não estabilizou em {GRID_STABLE_TIMEOUT}s, tentando continuar...", file=sys.stderr)
+    else:
+        print(f"[GOOGLE SHEETS] Planilha pronta em {time.monotonic() - inicio:.1f}s ({celulas} células)", file=sys.stderr)
+    
+    return None
+
+def is_spreadsheet_loaded(driver, url, tab_name=None):
+    """Verificar se a planilha já está aberta no driver, na aba pedida (sessão reaproveitada)
+    Com o gid na URL compara o gid da página aberta; sem ele, confere se tab_name está selecionada.
+    """
+    try:
+        spreadsheet_base = url.split("/edit")[0]
+        if not driver.current_url.startswith(spreadsheet_base):
+            return False
+        gid = gid_from_sheet_url(url)
+        if gid is not None:
+            return gid_from_sheet_url(driver.current_url) == gid
+        return tab_name is None or wait_for_tab_active(driver, tab_name, timeout=0)
+    except Exception:
+        return False
+
+def detect_active_gid(driver):
+    """Obter o GID da aba ativa na planilha aberta (padrão: '0')"""
+    try:
+        gid = driver.execute_script("""
+            // Tentar encontrar o GID da aba ativa
+            const tabs = document.querySelectorAll('[role="tab"], [data-sheet-id], .docs-sheet-tab');
+            for (let tab of tabs) {
+                if (tab.getAttribute('aria-selected') === 'true' || 
+                    tab.classList.contains('docs-sheet-active') ||
+                    tab.classList.contains('docs-sheet-tab-active')) {
+                    const sheetId = tab.getAttribute('data-sheet-id') || 
+                                  tab.getAttribute('data-sheetid') ||
+                                  tab.getAttribute('data-gid');
+                    if (sheetId) return sheetId;
+                }
+            }
+            // Tentar encontrar na URL
+            const urlMatch = window.location.href.match(/[#&]gid=([0-9]+)/);
+            if (urlMatch) return urlMatch[1];
+            return '0';
+        """)
+        print(f"[GOOGLE SHEETS] GID encontrado via JS: {gid}", file=sys.stderr)
+        return gid
+    except:
+        print("[GOOGLE SHEETS] Não foi possível obter GID via JS, usando '0'", file=sys.stderr)
+        return '0'
+
+def read_dom_matrix(driver, timeout=DOM_SCAN_TIMEOUT):
+    """Ler todas as células da grade numa única chamada (execute_async_script)
+    A grade do Sheets é virtualizada: o script rola o contêiner em trechos, guarda as células
+    renderizadas em cada um (sem repetir (linha, coluna)) e volta à posição inicial.
+    Retorna [(linha, coluna, texto)] 0-based, ou None
+    """
+    try:
+        driver.set_script_timeout(timeout + 5)
+        resultado = driver.execute_async_script("""
+            const [timeoutMs, settleMs, maxChunks, done] = arguments;
+            const inicio = Date.now();
+            const celulas = new Map();
+            const coletar = () => {
+                for (const cell of document.querySelectorAll('[role="gridcell"]')) {
+                    // data-row/data-col são 0-based; aria-rowindex/aria-colindex começam em 1
+                    const dataRow = cell.getAttribute('data-row');
+                    const dataCol = cell.getAttribute('data-col');
+                    const ariaRow = cell.getAttribute('aria-rowindex');
+                    const ariaCol = cell.getAttribute('aria-colindex');
+                    const row = dataRow !== null ? parseInt(dataRow) : (ariaRow !== null ? parseInt(ariaRow) - 1 : NaN);
+                    const col = dataCol !== null ? parseInt(dataCol) : (ariaCol !== null ? parseInt(ariaCol) - 1 : NaN);
+                    if (isNaN(row) || isNaN(col) || row < 0 || col < 0) continue;
+                    celulas.set(row + ',' + col, [row, col, (cell.textContent || '').trim()]);
+                }
+            };
+            // Contêiner rolável: ancestral da primeira célula com rolagem vertical, ou a barra do Sheets
+            const encontrarRolagem = () => {
+                let el = document.querySelector('[role="gridcell"]');
+                while (el && el !== document.body) {
+                    if (el.scrollHeight > el.clientHeight + 1 && /(auto|scroll)/.test(getComputedStyle(el).overflowY)) return el;
+                    el = el.parentElement;
+                }
+                return document.querySelector('.native-scrollbar-y');
+            };
+            const rolagem = encontrarRolagem();
+            const posicaoInicial = rolagem ? rolagem.scrollTop : 0;
+            let trechos = 0;
+            const terminar = () => {
+                if (rolagem) rolagem.scrollTop = posicaoInicial;
+                done({cells: Array.from(celulas.values()), chunks: trechos});
+            };
+            const proximo = () => {
+                coletar();
+                trechos++;
+                if (!rolagem || trechos >= maxChunks || Date.now() - inicio > timeoutMs) return terminar();
+                const antes = rolagem.scrollTop;
+                rolagem.scrollTop = antes + Math.max(rolagem.clientHeight * 0.8, 1);
+                // Sem sair do lugar: fim da grade
+                if (rolagem.scrollTop <= antes) return terminar();
+                setTimeout(proximo, settleMs);
+            };
+            if (rolagem) rolagem.scrollTop = 0;
+            setTimeout(proximo, rolagem && posicaoInicial > 0 ? settleMs : 0);
+        """, int(timeout * 1000), DOM_SCROLL_SETTLE_MS, DOM_MAX_CHUNKS)
+    except Exception as e:
+        print(f"[GOOGLE SHEETS] Erro ao ler células via JavaScript: {e}", file=sys.stderr)
+        return None
+    
+    if not resultado or not resultado.get("cells"):
+        return None
+    print(f"[GOOGLE SHEETS] {len(resultado['cells'])} células lidas em {resultado.get('chunks')} trecho(s) da grade", file=sys.stderr)
+    return [(int(linha), int(coluna), texto) for linha, coluna, texto in resultado["cells"]]
+
+def rows_to_csv(rows):
+    """Montar CSV com csv.writer (aspas em valores com vírgula, aspas ou quebra de linha)"""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(rows)
+    return buf.getvalue()
+
+def matrix_to_csv(celulas):
+    """CSV a partir de [(linha, coluna, texto)]; linhas ausentes viram linhas vazias, mantendo a
+    posição de cada linha igual à do export (ex: A33 continua na linha 33)
+    """
+    matriz = {}
+    for linha, coluna, texto in celulas:
+        matriz.setdefault(linha, {})[coluna] = texto
+    max_col = max(max(colunas) for colunas in matriz.values())
+    vazia = {}
+    return rows_to_csv(
+        [matriz.get(linha, vazia).get(coluna, "") for coluna in range(max_col + 1)]
+        for linha in range(max(matriz) + 1)
+    )
+
+def extract_csv_from_dom(driver):
+    """Extrair CSV diretamente da planilha renderizada (matriz da grade ou texto da página)
+    Retorna o conteúdo CSV ou None
+    """
+    csv_content = None
+    
+    try:
+        # Aguardar células da planilha pararem de mudar
+        print("[GOOGLE SHEETS] Aguardando planilha carregar completamente...", file=sys.stderr)
+        wait_for_grid_stable(driver)
         
-        # Método 0: Tentar obter CSV diretamente via URL de exportação (mais confiável)
-        print("[GOOGLE SHEETS] Tentando obter CSV via URL de exportação...", file=sys.stderr)
-        csv_content = None
+        # Método 1: todas as células da grade numa única chamada (rolando a grade virtualizada)
+        print("[GOOGLE SHEETS] Lendo células da grade via JavaScript...", file=sys.stderr)
+        celulas = read_dom_matrix(driver)
+        if celulas:
+            csv_content = matrix_to_csv(celulas)
+            linhas = max(linha for linha, _, _ in celulas) + 1
+            print(f"[GOOGLE SHEETS] ✅ Dados extraídos da grade: {linhas} linhas", file=sys.stderr)
+            note_timing("dom_method", "matriz")
         
-        try:
-            # Tentar diferentes GIDs e formatos
-            spreadsheet_id = "10vaVp0DcgOfjWW3_vat7M8mRVvMiBdtU9kAlDmjEioc"
-            
-            # Tentar obter o GID da aba atual via JavaScript
+        # Método 2: Se não conseguiu, tentar extrair texto completo e processar
+        if not csv_content:
+            print("[GOOGLE SHEETS] Tentando método alternativo: extrair texto completo...", file=sys.stderr)
             try:
-                gid = driver.execute_script("""
-                    // Tentar encontrar o GID da aba ativa
-                    const tabs = document.querySelectorAll('[role="tab"], [data-sheet-id], .docs-sheet-tab');
-                    for (let tab of tabs) {
-                        if (tab.getAttribute('aria-selected') === 'true' || 
-                            tab.classList.contains('docs-sheet-active') ||
-                            tab.classList.contains('docs-sheet-tab-active')) {
-                            const sheetId = tab.getAttribute('data-sheet-id') || 
-                                          tab.getAttribute('data-sheetid') ||
-                                          tab.getAttribute('data-gid');
-                            if (sheetId) return sheetId;
-                        }
-                    }
-                    // Tentar encontrar na URL
-                    const urlMatch = window.location.href.match(/[#&]gid=([0-9]+)/);
-                    if (urlMatch) return urlMatch[1];
-                    return '0';
-                """)
-                print(f"[GOOGLE SHEETS] GID encontrado via JS: {gid}", file=sys.stderr)
-            except:
-                gid = '0'
-                print("[GOOGLE SHEETS] Não foi possível obter GID via JS, usando '0'", file=sys.stderr)
-            
-            # Tentar diferentes URLs de exportação e GIDs
-            gids_to_try = [gid, '0', '1', '2', '3']
-            export_urls = []
-            
-            for g in gids_to_try:
-                export_urls.extend([
-                    f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={g}",
-                    f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/gviz/tq?tqx=out:csv&gid={g}",
-                ])
-            
-            # Adicionar URL sem GID
-            export_urls.append(f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv")
-            
-            for export_url in export_urls:
-                try:
-                    # Usar urllib para fazer requisição HTTP direta (timeout reduzido)
-                    req = urllib.request.Request(export_url)
-                    req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+                # Focar na área da planilha
+                sheet_container = driver.find_element(By.CSS_SELECTOR, "[role='grid'], [id*='grid'], .kix-appview-editor")
+                page_text = sheet_container.text if sheet_container else driver.find_element(By.TAG_NAME, "body").text
+                
+                print(f"[GOOGLE SHEETS] Texto extraído (primeiros 500 chars): {page_text[:500]}", file=sys.stderr)
+                
+                # Procurar por padrões específicos no texto
+                if "VIVA RIO" in page_text.upper() or "SETEMBRO" in page_text.upper():
+                    print("[GOOGLE SHEETS] Texto relevante encontrado, processando...", file=sys.stderr)
+                    # Dividir em linhas e tentar identificar estrutura
+                    lines = page_text.split("\n")
+                    csv_rows = []
+                    for line in lines:
+                        line_clean = line.strip()
+                        if line_clean and (any(char.isdigit() for char in line_clean) or "VIVA" in line_clean.upper() or "RIO" in line_clean.upper() or "SETEMBRO" in line_clean.upper() or "OUTUBRO" in line_clean.upper() or "NOVEMBRO" in line_clean.upper()):
+                            # Tentar separar por espaços múltiplos ou tabs
+                            parts = [p.strip() for p in line_clean.split() if p.strip()]
+                            if len(parts) > 1:
+                                csv_rows.append(parts)
                     
-                    response = urllib.request.urlopen(req, timeout=8)  # Reduzido de 15s para 8s
-                    csv_data = response.read().decode('utf-8')
+                    if csv_rows:
+                        csv_content = rows_to_csv(csv_rows)
+                        print(f"[GOOGLE SHEETS] ✅ Dados extraídos via texto: {len(csv_rows)} linhas", file=sys.stderr)
+                        note_timing("dom_method", "texto")
+            except Exception as e:
+                print(f"[GOOGLE SHEETS] Erro no método alternativo: {e}", file=sys.stderr)
                     
-                    # Verificar se é CSV válido (não HTML)
-                    if csv_data and len(csv_data) > 50 and ',' in csv_data and not csv_data.strip().startswith('<'):
-                        csv_content = csv_data
-                        print(f"[GOOGLE SHEETS] ✅ CSV obtido via URL de exportação ({len(csv_data)} caracteres)", file=sys.stderr)
-                        break
-                except Exception as e:
-                    # Log removido para melhorar performance - apenas continuar para próxima URL
-                    continue
+    except Exception as e:
+        print(f"[GOOGLE SHEETS] Erro ao extrair dados da página: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+    
+    return csv_content
+
+def check_negative_cell_colors(driver, valores):
+    """Verificar cores das células B34-B37 para identificar valores negativos (em vermelho)"""
+    print("[GOOGLE SHEETS] Verificando cores das células para identificar valores negativos...", file=sys.stderr)
+    try:
+        # Verificar cor das células B34, B35, B36, B37 (linhas 34-37, coluna B = índice 1)
+        cores_celulas = driver.execute_script("""
+            const cores = {};
+            // Procurar células nas linhas 34-37, coluna B
+            const linhas = [34, 35, 36, 37];
+            
+            linhas.forEach(linha => {
+                // Tentar encontrar célula por data-row e data-col
+                const cell = document.querySelector(`[data-row="${linha}"][data-col="1"]`) ||
+                           document.querySelector(`[aria-rowindex="${linha}"][aria-colindex="2"]`) ||
+                           document.querySelector(`[role="gridcell"][data-row="${linha}"]`);
+                
+                if (cell) {
+                    const style = window.getComputedStyle(cell);
+                    const color = style.color;
+                    const backgroundColor = style.backgroundColor;
                     
-        except Exception as e:
-            print(f"[GOOGLE SHEETS] Erro ao tentar obter CSV via URL: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
+                    // Verificar se a cor é vermelha (RGB ou hex)
+                    const isRed = color.includes('rgb(255') || 
+                                 color.includes('rgb(220') ||
+                                 color.includes('rgb(239') ||
+                                 color.includes('#ff') ||
+                                 color.includes('#ef') ||
+                                 color.includes('#dc');
+                    
+                    cores[linha] = {
+                        color: color,
+                        backgroundColor: backgroundColor,
+                        isRed: isRed
+                    };
+                }
+            });
+            
+            return cores;
+        """)
         
-        # Extrair dados diretamente da página renderizada (método alternativo)
-        if not csv_content:
-            print("[GOOGLE SHEETS] Extraindo dados diretamente da planilha renderizada...", file=sys.stderr)
+        # Aplicar informações de cor aos valores
+        if cores_celulas:
+            if 34 in cores_celulas and cores_celulas[34].get('isRed'):
+                valores["setembroNegativo"] = True
+                print("[GOOGLE SHEETS] ⚠️ Setembro está em vermelho (negativo)", file=sys.stderr)
+            
+            if 35 in cores_celulas and cores_celulas[35].get('isRed'):
+                valores["outubroNegativo"] = True
+                print("[GOOGLE SHEETS] ⚠️ Outubro está em vermelho (negativo)", file=sys.stderr)
+            
+            if 36 in cores_celulas and cores_celulas[36].get('isRed'):
+                valores["novembroNegativo"] = True
+                print("[GOOGLE SHEETS] ⚠️ Novembro está em vermelho (negativo)", file=sys.stderr)
+            
+            if 37 in cores_celulas and cores_celulas[37].get('isRed'):
+                valores["totalNegativo"] = True
+                print("[GOOGLE SHEETS] ⚠️ Total está em vermelho (negativo)", file=sys.stderr)
+    except Exception as e:
+        print(f"[GOOGLE SHEETS] Erro ao verificar cores: {e}", file=sys.stderr)
+
+# Namespaces do OOXML (xlsx)
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Cores vermelhas da paleta indexada do Excel (2 e 10 = FF0000, 16 = 800000)
+XLSX_INDEXED_RED = {'2', '10', '16'}
+
+# Formatos numéricos embutidos com negativos em vermelho
+XLSX_BUILTIN_NUMFMTS = {
+    38: '#,##0 ;[Red](#,##0)',
+    40: '#,##0.00;[Red](#,##0.00)',
+}
+
+# Tamanho máximo do XLSX mantido em memória antes de ir para um arquivo temporário
+XLSX_SPOOL_BYTES = 8 * 1024 * 1024
+
+def build_xlsx_url(spreadsheet_id, gid=None):
+    """URL de exportação XLSX da planilha"""
+    url = f"{spreadsheet_base_url(spreadsheet_id)}/export?format=xlsx"
+    return f"{url}&gid={gid}" if gid is not None else url
+
+def is_red_font(color):
+    """Verificar se o elemento <color> de uma fonte do xlsx é vermelho"""
+    if color is None:
+        return False
+    if color.get('indexed') in XLSX_INDEXED_RED:
+        return True
+    rgb = color.get('rgb')
+    if not rgb or len(rgb) < 6:
+        return False
+    try:
+        r, g, b = (int(rgb[-6:][k:k + 2], 16) for k in (0, 2, 4))
+    except ValueError:
+        return False
+    return r >= 180 and g < 100 and b < 100
+
+def is_red_number_format(format_code, valor):
+    """Verificar se o formato numérico pinta o valor de vermelho ([Red] na seção aplicada)"""
+    if not format_code:
+        return False
+    secoes = format_code.split(';')
+    if len(secoes) > 1 and valor is not None and valor < 0:
+        secao = secoes[1]
+    else:
+        secao = secoes[0]
+    return '[RED]' in secao.upper()
+
+def read_xlsx_styles(arquivo):
+    """Ler de styles.xml, em streaming, o necessário para saber se uma célula está em vermelho
+    Retorna os estilos de célula (cellXfs), na ordem: [(fonte vermelha, código do formato)]
+    """
+    formatos = {}
+    fontes_vermelhas = []
+    estilos = []
+    secao = None
+    
+    for evento, elem in ET.iterparse(arquivo, events=('start', 'end')):
+        tag = elem.tag
+        if evento == 'start':
+            if tag in (XLSX_NS + 'fonts', XLSX_NS + 'cellXfs', XLSX_NS + 'cellStyleXfs', XLSX_NS + 'dxfs'):
+                secao = tag
+            continue
         
+        if tag == XLSX_NS + 'numFmt' and secao is None:
+            formatos[int(elem.get('numFmtId'))] = elem.get('formatCode')
+        elif tag == XLSX_NS + 'font' and secao == XLSX_NS + 'fonts':
+            fontes_vermelhas.append(is_red_font(elem.find(XLSX_NS + 'color')))
+            elem.clear()
+        elif tag == XLSX_NS + 'xf' and secao == XLSX_NS + 'cellXfs':
+            estilos.append((int(elem.get('fontId', 0)), int(elem.get('numFmtId', 0))))
+            elem.clear()
+        elif tag in (XLSX_NS + 'fonts', XLSX_NS + 'cellXfs', XLSX_NS + 'cellStyleXfs', XLSX_NS + 'dxfs'):
+            secao = None
+    
+    estilos_celula = []
+    for font_id, numfmt_id in estilos:
+        vermelha = fontes_vermelhas[font_id] if font_id < len(fontes_vermelhas) else False
+        estilos_celula.append((vermelha, formatos.get(numfmt_id) or XLSX_BUILTIN_NUMFMTS.get(numfmt_id)))
+    return estilos_celula
+
+def find_xlsx_sheet(pacote, tab_name):
+    """Caminho (dentro do zip) da planilha tab_name; se não houver, a única planilha do arquivo"""
+    rels = {}
+    with pacote.open('xl/_rels/workbook.xml.rels') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == PKG_REL_NS + 'Relationship':
+                alvo = elem.get('Target')
+                rels[elem.get('Id')] = alvo.lstrip('/') if alvo.startswith('/') else 'xl/' + alvo
+    
+    planilhas = []
+    with pacote.open('xl/workbook.xml') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == XLSX_NS + 'sheet':
+                planilhas.append((elem.get('name'), rels.get(elem.get(XLSX_REL_NS + 'id'))))
+    
+    for nome, caminho in planilhas:
+        if nome == tab_name:
+            return caminho
+    if len(planilhas) == 1:
+        return planilhas[0][1]
+    return None
+
+def read_xlsx_cells(arquivo, referencias):
+    """Ler só as células pedidas ({"B34", ...}) de uma planilha do xlsx
+    A leitura é em streaming e para na primeira linha depois da última célula pedida.
+    Retorna {referência: (índice do estilo, valor numérico ou None)}
+    """
+    ultima_linha = max(int(CELULA_RE.fullmatch(ref).group(2)) for ref in referencias)
+    celulas = {}
+    
+    for _, elem in ET.iterparse(arquivo):
+        if elem.tag == XLSX_NS + 'c':
+            ref = elem.get('r')
+            if ref in referencias:
+                valor = None
+                v = elem.find(XLSX_NS + 'v')
+                if v is not None and elem.get('t') in (None, 'n'):
+                    try:
+                        valor = float(v.text)
+                    except (TypeError, ValueError):
+                        valor = None
+                celulas[ref] = (int(elem.get('s', 0)), valor)
+        elif elem.tag == XLSX_NS + 'row':
+            elem.clear()
+            if int(elem.get('r', 0)) >= ultima_linha or len(celulas) == len(referencias):
+                break
+    
+    return celulas
+
+def check_negative_cells_xlsx(spreadsheet_id, valores, plan=None, tab_name=SHEET_TAB_NAME, gid=None, timeout=15):
+    """Identificar valores negativos (em vermelho) pelo export XLSX, sem navegador
+    Lê a cor da fonte e o formato numérico ([Red]) das células de valor do resumo
+    (B34-B37 no layout padrão) direto de styles.xml e da planilha, sem carregar o workbook.
+    Retorna True se a verificação foi feita.
+    """
+    if plan is None:
+        plan = get_layout_plan()
+    referencias = {
+        f"{column_letter(coluna_valor)}{linha + 1}": campo
+        for campo, linha, _, _, coluna_valor, _ in plan.valores_resumo
+    }
+    if not referencias:
+        return False
+    
+    url = build_xlsx_url(spreadsheet_id, gid)
+    print(f"[GOOGLE SHEETS] Verificando cores das células pelo XLSX: {url}", file=sys.stderr)
+    try:
+        # O zip precisa de acesso aleatório: até XLSX_SPOOL_BYTES em memória, acima disso em disco
+        with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES) as arquivo:
+            response = open_url(url, timeout=timeout)
+            try:
+                shutil.copyfileobj(response, arquivo)
+            finally:
+                response.close()
+            arquivo.seek(0)
+            
+            with zipfile.ZipFile(arquivo) as pacote:
+                caminho = find_xlsx_sheet(pacote, tab_name)
+                if not caminho:
+                    print(f"[GOOGLE SHEETS] ⚠️ Aba '{tab_name or f'gid={gid}'}' não encontrada no XLSX", file=sys.stderr)
+                    return False
+                with pacote.open(caminho) as f:
+                    celulas = read_xlsx_cells(f, referencias)
+                with pacote.open('xl/styles.xml') as f:
+                    estilos = read_xlsx_styles(f)
+    except Exception as e:
+        print(f"[GOOGLE SHEETS] Erro ao verificar cores pelo XLSX: {e}", file=sys.stderr)
+        return False
+    
+    for ref, (estilo, valor) in celulas.items():
+        fonte_vermelha, formato = estilos[estilo] if estilo < len(estilos) else (False, None)
+        if fonte_vermelha or is_red_number_format(formato, valor):
+            campo = referencias[ref]
+            valores[f"{campo}Negativo"] = True
+            print(f"[GOOGLE SHEETS] ⚠️ {campo.capitalize()} está em vermelho (negativo)", file=sys.stderr)
+    return True
+
+class LazyDriver:
+    """Driver do Chrome criado apenas quando algum estágio realmente precisa do navegador"""
+    
+    def __init__(self, driver=None):
+        self.driver = driver
+        self.failed = False
+        self.page_bytes = None  # Bytes transferidos no último carregamento da planilha
+        # O webdriver não é thread-safe: no modo lote cada extração usa o navegador com o lock
+        self.lock = threading.RLock()
+    
+    def get(self):
+        """Retornar o driver, iniciando o Chrome na primeira chamada (None se falhar)"""
+        with self.lock:
+            if self.driver is None and not self.failed:
+                with timed("driver_setup"):
+                    self.driver = setup_driver()
+                self.failed = self.driver is None
+            return self.driver
+    
+    def quit(self):
+        """Encerrar o Chrome (se estiver aberto)"""
+        quit_driver(self.driver)
+        self.driver = None
+        self.failed = False
+        self.page_bytes = None
+    
+    def stats(self):
+        """Métricas do navegador para o resultado: tempo de inicialização e bytes da página"""
+        return {
+            "setup_seconds": getattr(self.driver, "setup_seconds", None),
+            "page_bytes": self.page_bytes,
+            "fast_profile": FAST_BROWSER
+        }
+
+def spreadsheet_base_url(spreadsheet_id):
+    """URL base da planilha (SHEETS_BASE_URL/spreadsheets/d/<id>)"""
+    return f"{SHEETS_BASE_URL}/spreadsheets/d/{spreadsheet_id}"
+
+def spreadsheet_url(spreadsheet_id, gid=None):
+    """URL de edição da planilha (abrindo a aba gid, se informada)"""
+    url = f"{spreadsheet_base_url(spreadsheet_id)}/edit?usp=sharing"
+    return f"{url}#gid={gid}" if gid is not None else url
+
+def build_export_urls(spreadsheet_id, gids, include_default=False):
+    """Montar as URLs de exportação CSV (export e gviz/tq) para cada GID"""
+    base = spreadsheet_base_url(spreadsheet_id)
+    export_urls = []
+    for g in gids:
+        export_urls.extend([
+            f"{base}/export?format=csv&gid={g}",
+            f"{base}/gviz/tq?tqx=out:csv&gid={g}",
+        ])
+    
+    if include_default:
+        # URL sem GID (primeira aba da planilha)
+        export_urls.append(f"{base}/export?format=csv")
+    
+    return export_urls
+
+def is_valid_csv(csv_data):
+    """Verificar se a resposta é um CSV válido (não HTML)"""
+    return bool(csv_data) and len(csv_data) > 50 and ',' in csv_data and not csv_data.strip().startswith('<')
+
+class ResponseTooLarge(Exception):
+    """Resposta HTTP maior que MAX_RESPONSE_BYTES"""
+
+class DecodedBody(io.RawIOBase):
+    """Corpo da resposta como arquivo binário, a partir de uma função que devolve trechos (b'' no fim)"""
+    
+    def __init__(self, next_chunk):
+        super().__init__()
+        self.next_chunk = next_chunk
+        self.pendente = memoryview(b'')
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, destino):
+        if not self.pendente:
+            self.pendente = memoryview(self.next_chunk())
+            if not self.pendente:
+                return 0
+        n = min(len(destino), len(self.pendente))
+        destino[:n] = self.pendente[:n]
+        self.pendente = self.pendente[n:]
+        return n
+
+class PooledResponse:
+    """Resposta de uma conexão do HttpPool, com o corpo descomprimido (gzip/deflate)
+    Mesma interface usada das respostas do urllib: read(n), readline(), iteração por linhas,
+    status, headers e close(). Lido até o fim, o corpo devolve a conexão ao pool; fechado
+    antes disso, a conexão é descartada.
+    """
+    
+    def __init__(self, pool, chave, conn, response, url, limite):
+        self.pool = pool
+        self.chave = chave
+        self.conn = conn
+        self.response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.limite = limite
+        self.wire_bytes = 0   # bytes recebidos (comprimidos)
+        self.tamanho = 0      # bytes do corpo descomprimido
+        self.fim = False
+        self.descompressor = None
+        self.comprimido = b''  # entrada ainda não descomprimida (saída limitada por chamada)
+        codificacao = (response.headers.get('Content-Encoding') or '').strip().lower()
+        if codificacao in ('gzip', 'x-gzip', 'deflate'):
+            # wbits | 32 detecta gzip ou zlib; deflate "cru" é tratado no primeiro trecho
+            self.descompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        self.deflate_cru = codificacao == 'deflate'
+        self.corpo = io.BufferedReader(DecodedBody(self.next_chunk), buffer_size=HTTP_CHUNK_BYTES)
+    
+    def decode(self, dados):
+        """Descomprimir um trecho gerando no máximo HTTP_CHUNK_BYTES (e nunca muito além do limite):
+        um corpo muito compressível não se expande inteiro na memória antes da verificação do
+        tamanho. A entrada que sobra fica em self.comprimido para a próxima chamada
+        """
+        if self.descompressor is not None:
+            maximo = min(HTTP_CHUNK_BYTES, self.limite - self.tamanho + 1)
+            try:
+                dados = self.descompressor.decompress(dados, maximo)
+            except zlib.error:
+                if not self.deflate_cru or self.tamanho:
+                    raise
+                self.descompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                dados = self.descompressor.decompress(dados, maximo)
+            self.deflate_cru = False
+            self.comprimido = self.descompressor.unconsumed_tail
+        return self.count_body(dados)
+    
+    def count_body(self, dados):
+        self.tamanho += len(dados)
+        if self.tamanho > self.limite:
+            self.close()
+            raise ResponseTooLarge(f"Resposta maior que {self.limite} bytes: {self.url}")
+        return dados
+    
+    def next_chunk(self):
+        """Próximo trecho do corpo já descomprimido (b'' no fim)"""
+        while not self.fim:
+            if self.comprimido:
+                dados = self.decode(self.comprimido)
+            else:
+                dados = self.response.read(HTTP_CHUNK_BYTES)
+                if dados:
+                    self.wire_bytes += len(dados)
+                    dados = self.decode(dados)
+                else:
+                    # Com a entrada toda consumida, flush() só devolve o que ficou no descompressor
+                    dados = self.count_body(self.descompressor.flush()) if self.descompressor else b''
+                    self.fim = True
+                    self.pool.release(self)
+            if dados:
+                return dados
+        return b''
+    
+    def read(self, n=-1):
+        return self.corpo.read(n)
+    
+    def readline(self, limite=-1):
+        return self.corpo.readline(limite)
+    
+    def __iter__(self):
+        return iter(self.corpo)
+    
+    def close(self):
+        if not self.fim:
+            # Corpo não lido até o fim: a conexão não pode ser reaproveitada
+            self.fim = True
+            self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+class PooledHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPSConnection que retoma a sessão TLS da conexão anterior ao mesmo host"""
+    
+    def __init__(self, pool, chave, timeout):
+        self.contexto_tls = pool.tls_context()
+        super().__init__(chave[1], chave[2], timeout=timeout, context=self.contexto_tls)
+        self.pool = pool
+        self.chave = chave
+    
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        sessao = self.pool.sessoes.get(self.chave)
         try:
-            # Aguardar células da planilha carregarem (timeout reduzido)
-            wait = WebDriverWait(driver, 10)  # Reduzido de 15s para 10s
-            print("[GOOGLE SHEETS] Aguardando planilha carregar completamente...", file=sys.stderr)
-            time.sleep(3)  # Reduzido de 8s para 3s
+            self.sock = self.contexto_tls.wrap_socket(self.sock, server_hostname=self.host, session=sessao)
+        except ssl.SSLError:
+            if sessao is None:
+                raise
+            # Sessão guardada não aceita: handshake completo em um socket novo
+            self.pool.sessoes.pop(self.chave, None)
+            http.client.HTTPConnection.connect(self)
+            self.sock = self.contexto_tls.wrap_socket(self.sock, server_hostname=self.host)
+        if self.sock.session_reused:
+            self.pool.count("tls_resumed")
+
+class HttpPool:
+    """Conexões HTTP(S) keep-alive compartilhadas pelas requisições do extrator
+    
+    - conexões ociosas por (esquema, host, porta), até HTTP_POOL_MAX_IDLE por host, descartadas
+      após HTTP_POOL_IDLE_SECONDS ou se o servidor as fechou;
+    - sessão TLS retomada nas conexões novas ao mesmo host (handshake abreviado);
+    - Accept-Encoding: gzip, deflate, com o corpo descomprimido durante a leitura;
+    - corpo limitado a MAX_RESPONSE_BYTES (ResponseTooLarge);
+    - redirecionamentos seguidos (o export do Sheets redireciona para googleusercontent.com)
+      e respostas de erro/304 como urllib.error.HTTPError, como no urllib.
+    """
+    
+    def __init__(self, max_idle=HTTP_POOL_MAX_IDLE, max_response_bytes=MAX_RESPONSE_BYTES):
+        self.max_idle = max_idle
+        self.max_response_bytes = max_response_bytes
+        self.ocioso = {}     # chave -> [(conexão, momento em que ficou ociosa)]
+        self.sessoes = {}    # chave -> ssl.SSLSession da última conexão
+        self.contexto = None
+        self.contagem = collections.Counter()
+        self.lock = threading.Lock()
+    
+    def tls_context(self):
+        with self.lock:
+            if self.contexto is None:
+                self.contexto = ssl.create_default_context()
+            return self.contexto
+    
+    def count(self, chave, n=1):
+        with self.lock:
+            self.contagem[chave] += n
+    
+    def stats(self):
+        """Contadores do pool: conexões abertas, reaproveitadas, sessões TLS retomadas, bytes"""
+        with self.lock:
+            return {**self.contagem, "idle": sum(len(livres) for livres in self.ocioso.values())}
+    
+    def acquire(self, chave, timeout):
+        """Conexão ociosa ainda válida para a chave ou uma nova: (conexão, reaproveitada)"""
+        agora = time.monotonic()
+        while True:
+            with self.lock:
+                livres = self.ocioso.get(chave)
+                conn, momento = livres.pop() if livres else (None, None)
+            if conn is None:
+                break
+            # Descartar as antigas e as que o servidor fechou (socket "legível" sem requisição = EOF)
+            if agora - momento > HTTP_POOL_IDLE_SECONDS or conn.sock is None or select.select([conn.sock], [], [], 0)[0]:
+                conn.close()
+                continue
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            self.count("reused")
+            return conn, True
+        
+        esquema, host, porta = chave
+        if esquema == 'https':
+            conn = PooledHTTPSConnection(self, chave, timeout)
+        else:
+            conn = http.client.HTTPConnection(host, porta, timeout=timeout)
+        self.count("connections")
+        return conn, False
+    
+    def release(self, resposta):
+        """Devolver a conexão de uma resposta lida até o fim"""
+        self.count("wire_bytes", resposta.wire_bytes)
+        self.count("body_bytes", resposta.tamanho)
+        conn = resposta.conn
+        if resposta.response.will_close or conn.sock is None:
+            conn.close()
+            return
+        if isinstance(conn.sock, ssl.SSLSocket) and conn.sock.session is not None:
+            self.sessoes[resposta.chave] = conn.sock.session
+        with self.lock:
+            livres = self.ocioso.setdefault(resposta.chave, [])
+            if len(livres) < self.max_idle:
+                livres.append((conn, time.monotonic()))
+                return
+        conn.close()
+    
+    def request(self, url, timeout=8, headers=None):
+        """Uma requisição GET (sem seguir redirecionamentos); retorna PooledResponse"""
+        partes = urllib.parse.urlsplit(url)
+        esquema = partes.scheme.lower()
+        if esquema not in ('http', 'https'):
+            raise ValueError(f"Esquema não suportado: {url}")
+        chave = (esquema, partes.hostname, partes.port or (443 if esquema == 'https' else 80))
+        caminho = (partes.path or '/') + (f"?{partes.query}" if partes.query else '')
+        cabecalhos = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate', **(headers or {})}
+        
+        for tentativa in range(2):
+            conn, reaproveitada = self.acquire(chave, timeout)
+            try:
+                conn.request('GET', caminho, headers=cabecalhos)
+                response = conn.getresponse()
+            except (ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                # Conexão keep-alive fechada pelo servidor entre as requisições: tentar uma nova
+                if reaproveitada and tentativa == 0:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
             
-            # Método 1: Tentar acessar célula A2 diretamente usando JavaScript
-            print("[GOOGLE SHEETS] Tentando acessar célula A2 via JavaScript...", file=sys.stderr)
+            tamanho = response.headers.get('Content-Length')
+            if tamanho and tamanho.isdigit() and not response.headers.get('Content-Encoding') and int(tamanho) > self.max_response_bytes:
+                conn.close()
+                raise ResponseTooLarge(f"Resposta maior que {self.max_response_bytes} bytes ({tamanho}): {url}")
+            return PooledResponse(self, chave, conn, response, url, self.max_response_bytes)
+    
+    def open(self, url, timeout=8, headers=None, max_redirects=5):
+        """GET seguindo redirecionamentos; status de erro (e 304) levantam urllib.error.HTTPError"""
+        for _ in range(max_redirects + 1):
+            resposta = self.request(url, timeout, headers)
+            if resposta.status in (301, 302, 303, 307, 308) and resposta.headers.get('Location'):
+                resposta.read()
+                resposta.close()
+                url = urllib.parse.urljoin(url, resposta.headers['Location'])
+                continue
+            if resposta.status >= 300:
+                corpo = resposta.read()
+                resposta.close()
+                raise urllib.error.HTTPError(url, resposta.status, resposta.reason, resposta.headers, io.BytesIO(corpo))
+            return resposta
+        raise urllib.error.HTTPError(url, resposta.status, "Redirecionamentos demais", resposta.headers, None)
+
+HTTP_POOL = HttpPool() if HTTP_POOL_ENABLED else None
+
+def uses_proxy(url):
+    """Verificar se a URL passaria por um proxy (HTTP_PROXY/HTTPS_PROXY); o pool só faz conexões diretas"""
+    partes = urllib.parse.urlsplit(url)
+    return partes.scheme in urllib.request.getproxies() and not urllib.request.proxy_bypass(partes.hostname or '')
+
+def open_url(url, timeout=8, headers=None):
+    """Abrir uma URL via HTTP e retornar a resposta (sem ler o corpo)
+    Usa as conexões keep-alive do HTTP_POOL (com gzip); urllib se o pool estiver desativado
+    ou houver proxy configurado. Uma resposta 304 (requisição condicional) levanta
+    urllib.error.HTTPError
+    """
+    if HTTP_POOL is not None and not uses_proxy(url):
+        return HTTP_POOL.open(url, timeout=timeout, headers=headers)
+    req = urllib.request.Request(url)
+    req.add_header('User-Agent', USER_AGENT)
+    for name, value in (headers or {}).items():
+        req.add_header(name, value)
+    return urllib.request.urlopen(req, timeout=timeout)
+
+def fetch_url(url, timeout=8, headers=None):
+    """Baixar uma URL via HTTP e retornar (corpo como texto, cabeçalhos da resposta, tamanho do corpo em bytes)"""
+    response = open_url(url, timeout=timeout, headers=headers)
+    try:
+        corpo = response.read()
+        return corpo.decode('utf-8'), response.headers, len(corpo)
+    finally:
+        response.close()
+
+def conditional_headers(previous):
+    """Cabeçalhos If-None-Match / If-Modified-Since a partir da extração anterior"""
+    headers = {}
+    if previous and previous.get("etag"):
+        headers['If-None-Match'] = previous["etag"]
+    if previous and previous.get("last_modified"):
+        headers['If-Modified-Since'] = previous["last_modified"]
+    return headers
+
+def fetch_export_csv(export_urls, timeout=8, required_text=None, deadline=None, max_workers=8, previous=None,
+                     stats_key=None, attempts=None):
+    """Baixar as URLs de exportação em paralelo e retornar a primeira resposta válida
+    As URLs "competem" entre si: a primeira resposta válida vence e as demais são descartadas.
+    required_text: texto que o CSV precisa conter para ser aceito (identifica a aba certa)
+    deadline: tempo máximo (s) para toda a tentativa; padrão EXPORT_DEADLINE
+    previous: extração anterior ({"url", "etag", "last_modified"}); a URL dela é pedida
+              de forma condicional e um 304 também vence a corrida
+    stats_key: (spreadsheet_id, aba) do histórico das variantes: as URLs são ordenadas por ele,
+               as com o disjuntor aberto são puladas, a mais confiável larga na frente (ver
+               order_export_urls) e o resultado de cada tentativa é gravado
+    attempts: lista que recebe as tentativas (url, sucesso, segundos, erro), ex: para saber
+              se a falha foi da aba (erro "html"/"wrong_tab") ou só da rede
+    
+    Retorna {"csv", "url", "etag", "last_modified", "not_modified"} ou None
+    """
+    if deadline is None:
+        deadline = EXPORT_DEADLINE
+    
+    vantagem = None
+    if stats_key and ADAPTIVE_EXPORT:
+        export_urls, vantagem = order_export_urls(export_urls, load_export_stats(*stats_key))
+    
+    pendentes = list(export_urls)
+    resultados = queue.Queue()
+    cancelado = threading.Event()
+    liberado = threading.Event()  # Demais URLs liberadas (fim da vantagem da primeira)
+    lock = threading.Lock()
+    timings = current_timings()
+    tentativas = attempts if attempts is not None else []  # (url, sucesso, segundos, erro)
+    if not vantagem:
+        liberado.set()
+    fim_vantagem = time.monotonic() + (vantagem or 0)
+    
+    def worker(primeiro):
+        while True:
+            # Só a primeira URL da primeira thread sai antes do fim da vantagem
+            if not primeiro:
+                liberado.wait(max(0.0, fim_vantagem - time.monotonic()))
+            primeiro = False
+            if cancelado.is_set():
+                return
+            with lock:
+                if not pendentes:
+                    return
+                export_url = pendentes.pop(0)
+            
+            headers = conditional_headers(previous) if previous and previous.get("url") == export_url else None
+            not_modified = False
+            inicio = time.monotonic()
+            status = 200
+            tamanho = 0
             try:
-                # Usar JavaScript para acessar células do Google Sheets
-                cell_data_js = driver.execute_script("""
-                    // Procurar células do Google Sheets
-                    const cells = [];
-                    const gridCells = document.querySelectorAll('[role="gridcell"]');
-                    
-                    gridCells.forEach((cell, index) => {
-                        const row = cell.getAttribute('data-row') || cell.getAttribute('aria-rowindex') || '';
-                        const col = cell.getAttribute('data-col') || cell.getAttribute('aria-colindex') || '';
-                        const text = cell.textContent || cell.innerText || '';
-                        
-                        if (row && col) {
-                            cells.push({
-                                row: parseInt(row) || 0,
-                                col: parseInt(col) || 0,
-                                text: text.trim(),
-                                index: index
-                            });
-                        }
-                    });
-                    
-                    // Procurar especificamente A2 (linha 2, coluna 1 no sistema do Google Sheets)
-                    const a2_cell = Array.from(gridCells).find(cell => {
-                        const row = parseInt(cell.getAttribute('data-row') || cell.getAttribute('aria-rowindex') || '0');
-                        const col = parseInt(cell.getAttribute('data-col') || cell.getAttribute('aria-colindex') || '0');
-                        // A2 = linha 2, coluna 1 (ou linha 1, coluna 0 em índice 0-based)
-                        return (row === 2 && col === 1) || (row === 1 && col === 0);
-                    });
-                    
-                    return {
-                        cells: cells.slice(0, 100), // Primeiras 100 células
-                        a2_text: a2_cell ? (a2_cell.textContent || a2_cell.innerText || '').trim() : null,
-                        total_cells: gridCells.length
-                    };
-                """)
-                
-                if cell_data_js:
-                    print(f"[GOOGLE SHEETS] Encontradas {cell_data_js.get('total_cells', 0)} células via JavaScript", file=sys.stderr)
-                    if cell_data_js.get('a2_text'):
-                        print(f"[GOOGLE SHEETS] ✅ Célula A2 encontrada via JS: '{cell_data_js['a2_text']}'", file=sys.stderr)
-                    
-                    # Organizar células em matriz
-                    cells_list = cell_data_js.get('cells', [])
-                    if cells_list:
-                        matrix = {}
-                        for cell_info in cells_list:
-                            row = cell_info.get('row', 0)
-                            col = cell_info.get('col', 0)
-                            text = cell_info.get('text', '')
-                            if row not in matrix:
-                                matrix[row] = {}
-                            matrix[row][col] = text
-                        
-                        # Converter para CSV
-                        if matrix:
-                            max_row = max(matrix.keys(), default=0)
-                            max_col = max([max(row.keys(), default=0) for row in matrix.values()], default=0) if matrix else 0
-                            
-                            csv_rows = []
-                            for row_idx in range(max_row + 1):
-                                if row_idx in matrix:
-                                    csv_row = []
-                                    for col_idx in range(max_col + 1):
-                                        csv_row.append(matrix[row_idx].get(col_idx, ""))
-                                    csv_rows.append(",".join(csv_row))
-                            
-                            if csv_rows:
-                                csv_content = "\n".join(csv_rows)
-                                print(f"[GOOGLE SHEETS] ✅ Dados extraídos via JavaScript: {len(csv_rows)} linhas", file=sys.stderr)
-                
+                csv_data, response_headers, tamanho = fetch_url(export_url, timeout=timeout, headers=headers)
+            except urllib.error.HTTPError as e:
+                csv_data, response_headers = None, e.headers
+                not_modified = e.code == 304 and bool(headers)
+                status = e.code
             except Exception as e:
-                print(f"[GOOGLE SHEETS] Erro ao acessar células via JavaScript: {e}", file=sys.stderr)
+                csv_data, response_headers = None, None
+                status = type(e).__name__
+            segundos = time.monotonic() - inicio
+            if timings:
+                timings.export_attempt(export_url, status, tamanho, segundos)
+            resultados.put((export_url, csv_data, response_headers, not_modified, status, segundos))
+    
+    def erro_da_resposta(csv_data, status):
+        """None se a resposta é um CSV válido da aba; senão o motivo da falha para o histórico"""
+        if csv_data is None:
+            return str(status)
+        if not is_valid_csv(csv_data):
+            return "html" if csv_data.strip().startswith('<') else "invalid"
+        if required_text and required_text not in csv_data.upper():
+            return "wrong_tab"
+        return None
+    
+    # Threads daemon: uma requisição travada não segura o fim do processo
+    for n in range(min(max_workers, len(export_urls))):
+        threading.Thread(target=worker, args=(n == 0,), daemon=True).start()
+    
+    limite = time.monotonic() + deadline
+    try:
+        for _ in range(len(export_urls)):
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                export_url, csv_data, response_headers, not_modified, status, segundos = resultados.get(timeout=restante)
+            except queue.Empty:
+                break
             
-            # Método 2: Tentar acessar célula A2 diretamente usando seletores
-            if not csv_content:
-                print("[GOOGLE SHEETS] Tentando acessar célula A2 via seletores CSS...", file=sys.stderr)
-                try:
-                    # Procurar células usando diferentes métodos
-                    # Google Sheets usa atributos data-row e data-col
-                    cell_a2 = None
-                    
-                    # Tentar encontrar célula na linha 1 (índice 0) e coluna 0 (A)
-                    cell_selectors = [
-                        "[data-row='1'][data-col='0']",
-                        "[data-row='1'][data-col='1']",  # Às vezes começa em 1
-                        "[aria-rowindex='2'][aria-colindex='1']",  # A2 = linha 2, coluna 1
-                        "[aria-rowindex='2'][aria-colindex='2']",
-                    ]
-                    
-                    for selector in cell_selectors:
-                        try:
-                            cells = driver.find_elements(By.CSS_SELECTOR, selector)
-                            if cells:
-                                cell_a2 = cells[0]
-                                print(f"[GOOGLE SHEETS] Célula A2 encontrada com seletor: {selector}", file=sys.stderr)
-                                break
-                        except:
-                            continue
-                    
-                    # Se não encontrou, tentar método alternativo: procurar todas as células e filtrar
-                    if not cell_a2:
-                        print("[GOOGLE SHEETS] Procurando todas as células e organizando...", file=sys.stderr)
-                        all_cells = driver.find_elements(By.CSS_SELECTOR, "[role='gridcell']")
-                        
-                        if all_cells:
-                            print(f"[GOOGLE SHEETS] Encontradas {len(all_cells)} células", file=sys.stderr)
-                            
-                            # Organizar células em matriz
-                            matrix = {}
-                            for cell in all_cells:
-                                try:
-                                    # Tentar obter coordenadas
-                                    row_attr = cell.get_attribute("data-row") or cell.get_attribute("aria-rowindex")
-                                    col_attr = cell.get_attribute("data-col") or cell.get_attribute("aria-colindex")
-                                    
-                                    if row_attr and col_attr:
-                                        # Converter para índices (pode começar em 0 ou 1)
-                                        try:
-                                            row_idx = int(row_attr) - 1  # Ajustar para índice 0-based
-                                            col_idx = int(col_attr) - 1
-                                            
-                                            text = cell.text.strip()
-                                            if row_idx not in matrix:
-                                                matrix[row_idx] = {}
-                                            matrix[row_idx][col_idx] = text
-                                            
-                                            # Se for A2 (linha 1, coluna 0 no índice 0-based)
-                                            if row_idx == 1 and col_idx == 0:
-                                                print(f"[GOOGLE SHEETS] ✅ Célula A2 encontrada: '{text}'", file=sys.stderr)
-                                        except ValueError:
-                                            continue
-                                except:
-                                    continue
-                            
-                            # Se temos uma matriz, converter para CSV
-                            if matrix:
-                                max_row = max(matrix.keys(), default=0)
-                                max_col = max([max(row.keys(), default=0) for row in matrix.values()], default=0)
-                                
-                                csv_rows = []
-                                for row_idx in range(max_row + 1):
-                                    if row_idx in matrix:
-                                        csv_row = []
-                                        for col_idx in range(max_col + 1):
-                                            csv_row.append(matrix[row_idx].get(col_idx, ""))
-                                        csv_rows.append(",".join(csv_row))
-                                
-                                if csv_rows:
-                                    csv_content = "\n".join(csv_rows)
-                                    print(f"[GOOGLE SHEETS] ✅ Dados extraídos da matriz: {len(csv_rows)} linhas", file=sys.stderr)
+            if not_modified:
+                tentativas.append((export_url, True, segundos, None))
+                print(f"[GOOGLE SHEETS] ✅ Planilha não modificada (304): {export_url}", file=sys.stderr)
+                return {
+                    "csv": None,
+                    "url": export_url,
+                    "etag": previous.get("etag"),
+                    "last_modified": previous.get("last_modified"),
+                    "not_modified": True
+                }
+            
+            erro = erro_da_resposta(csv_data, status)
+            tentativas.append((export_url, erro is None, segundos, erro))
+            if erro:
+                liberado.set()  # A primeira falhou: não esperar o fim da vantagem
+                continue
+            
+            print(f"[GOOGLE SHEETS] ✅ CSV obtido via URL de exportação ({len(csv_data)} caracteres): {export_url}", file=sys.stderr)
+            return {
+                "csv": csv_data,
+                "url": export_url,
+                "etag": response_headers.get('ETag'),
+                "last_modified": response_headers.get('Last-Modified'),
+                "not_modified": False
+            }
+    finally:
+        # Não iniciar as URLs que ainda estão na fila
+        cancelado.set()
+        liberado.set()
+        # Respostas que chegaram depois da vencedora também contam para o histórico
+        while attempts is not None or (stats_key and ADAPTIVE_EXPORT):
+            try:
+                export_url, csv_data, _, not_modified, status, segundos = resultados.get_nowait()
+            except queue.Empty:
+                break
+            erro = None if not_modified else erro_da_resposta(csv_data, status)
+            tentativas.append((export_url, erro is None, segundos, erro))
+        if stats_key and ADAPTIVE_EXPORT:
+            update_export_stats(*stats_key, tentativas)
+    
+    print(f"[GOOGLE SHEETS] Nenhuma URL de exportação retornou CSV válido (prazo de {deadline}s)", file=sys.stderr)
+    return None
+
+def iter_response_lines(response, estado, required_text=None):
+    """Gerar as linhas (texto) de uma resposta HTTP sem guardar o corpo
+    Calcula o hash e o tamanho e faz as mesmas verificações de is_valid_csv durante a leitura;
+    para ao perceber que a resposta é HTML (estado["html"] = True)
+    """
+    inicio = True
+    for linha in response:
+        estado["hash"].update(linha)
+        estado["bytes"] += len(linha)
+        texto = linha.decode('utf-8')
+        
+        if inicio and texto.strip():
+            inicio = False
+            if texto.lstrip().startswith('<'):
+                estado["html"] = True
+                return
+        if not estado["virgula"] and ',' in texto:
+            estado["virgula"] = True
+        if not estado["texto_requerido"] and required_text in texto.upper():
+            estado["texto_requerido"] = True
+        
+        yield texto
+
+def stream_response_ok(estado):
+    """Resposta em streaming (até aqui) passa nas verificações de is_valid_csv e do texto da aba"""
+    return not estado["html"] and estado["bytes"] > 50 and estado["virgula"] and estado["texto_requerido"]
+
+class PendingEvents:
+    """Eventos de uma resposta em streaming retidos até ela passar em stream_response_ok
+    Com um GID em cache que aponta para outra aba, nenhum bloco de mês ou resumo dessa aba é
+    anunciado; depois de liberados, os eventos seguintes passam direto
+    """
+    
+    def __init__(self, estado, on_month_block, on_summary):
+        self.estado = estado
+        self.pendentes = []
+        self.liberado = False
+        self.on_month_block = self.wrap(on_month_block)
+        self.on_summary = self.wrap(on_summary)
+    
+    def wrap(self, callback):
+        if not callback:
+            return None
+        return lambda *args: self.push(callback, args)
+    
+    def push(self, callback, args):
+        if not self.liberado and stream_response_ok(self.estado):
+            self.flush()
+        if self.liberado:
+            callback(*args)
+        else:
+            self.pendentes.append((callback, args))
+    
+    def flush(self):
+        self.liberado = True
+        pendentes, self.pendentes = self.pendentes, []
+        for callback, args in pendentes:
+            callback(*args)
+
+def stream_export_csv(export_urls, timeout=8, required_text=None, previous=None, on_month_block=None, plan=None,
+                      on_summary=None, stats_key=None, attempts=None):
+    """Baixar e processar o CSV em streaming, com memória constante
+    Tenta as URLs em ordem (normalmente as variantes de um GID já conhecido). As linhas
+    vão direto da resposta HTTP para process_csv_rows, sem montar o texto completo.
+    stats_key, attempts: como em fetch_export_csv (ordem pelo histórico e registro das tentativas)
+    
+    Retorna o mesmo dicionário de fetch_export_csv, com "valores" e "hash" no lugar de "csv"
+    """
+    timings = current_timings()
+    adaptativo = bool(stats_key) and ADAPTIVE_EXPORT
+    if adaptativo:
+        export_urls, _ = order_export_urls(export_urls, load_export_stats(*stats_key))
+    tentativas = attempts if attempts is not None else []
+    try:
+        return stream_export_attempts(export_urls, timeout, required_text, previous, on_month_block, plan,
+                                      on_summary, timings, tentativas)
+    finally:
+        if adaptativo:
+            update_export_stats(*stats_key, tentativas)
+
+def stream_export_attempts(export_urls, timeout, required_text, previous, on_month_block, plan, on_summary,
+                           timings, tentativas):
+    """Tentativas de stream_export_csv, na ordem; cada uma é anotada em tentativas (url, sucesso, segundos, erro)"""
+    for export_url in export_urls:
+        headers = conditional_headers(previous) if previous and previous.get("url") == export_url else None
+        inicio = time.monotonic()
+        try:
+            response = open_url(export_url, timeout=timeout, headers=headers)
+        except urllib.error.HTTPError as e:
+            if timings:
+                timings.export_attempt(export_url, e.code, 0, time.monotonic() - inicio)
+            tentativas.append((export_url, e.code == 304 and bool(headers), time.monotonic() - inicio, str(e.code)))
+            if e.code == 304 and headers:
+                print(f"[GOOGLE SHEETS] ✅ Planilha não modificada (304): {export_url}", file=sys.stderr)
+                return {
+                    "csv": None,
+                    "url": export_url,
+                    "etag": previous.get("etag"),
+                    "last_modified": previous.get("last_modified"),
+                    "not_modified": True
+                }
+            continue
+        except Exception as e:
+            if timings:
+                timings.export_attempt(export_url, type(e).__name__, 0, time.monotonic() - inicio)
+            tentativas.append((export_url, False, time.monotonic() - inicio, type(e).__name__))
+            continue
+        
+        estado = {
+            "hash": hashlib.sha256(),
+            "bytes": 0,
+            "html": False,
+            "virgula": False,
+            "texto_requerido": not required_text
+        }
+        eventos = PendingEvents(estado, on_month_block, on_summary)
+        try:
+            valores = process_csv_rows(iter_csv_rows(iter_response_lines(response, estado, required_text)),
+                                       eventos.on_month_block, plan, eventos.on_summary)
+        except Exception as e:
+            print(f"[GOOGLE SHEETS] Erro ao ler CSV em streaming ({export_url}): {e}", file=sys.stderr)
+            tentativas.append((export_url, False, time.monotonic() - inicio, type(e).__name__))
+            if eventos.liberado:
+                # Parte dos eventos já saiu: descartar os parciais antes da próxima URL
+                emit_event("reset", url=export_url)
+            continue
+        finally:
+            response.close()
+        if timings:
+            timings.export_attempt(export_url, response.status, estado["bytes"], time.monotonic() - inicio)
+        
+        if not stream_response_ok(estado):
+            erro = "html" if estado["html"] else "wrong_tab" if not estado["texto_requerido"] else "invalid"
+            tentativas.append((export_url, False, time.monotonic() - inicio, erro))
+            continue
+        eventos.flush()
+        tentativas.append((export_url, True, time.monotonic() - inicio, None))
+        
+        print(f"[GOOGLE SHEETS] ✅ CSV processado em streaming ({estado['bytes']} bytes): {export_url}", file=sys.stderr)
+        return {
+            "csv": None,
+            "valores": valores,
+            "hash": estado["hash"].hexdigest(),
+            "url": export_url,
+            "etag": response.headers.get('ETag'),
+            "last_modified": response.headers.get('Last-Modified'),
+            "not_modified": False
+        }
+    
+    return None
+
+def gid_from_export_url(export_url):
+    """Extrair o parâmetro gid de uma URL de exportação (None se não houver)"""
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(export_url).query)
+    return query.get('gid', [None])[0]
+
+def load_json_cache(path):
+    """Ler um cache JSON em disco ({} se não existir ou estiver corrompido)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_json_cache(path, data):
+    """Gravar um cache JSON (escrita atômica via arquivo temporário)"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[GOOGLE SHEETS] Erro ao gravar cache {path}: {e}", file=sys.stderr)
+
+def get_cached_gid(spreadsheet_id, tab_name):
+    """GID já resolvido para a aba (None se não estiver em cache)
+    Cache: {spreadsheet_id: {nome_da_aba: {"gid": ..., "updated_at": ...}}}
+    """
+    entry = load_json_cache(GID_CACHE_FILE).get(spreadsheet_id, {}).get(tab_name)
+    return entry.get("gid") if entry else None
+
+def set_cached_gid(spreadsheet_id, tab_name, gid):
+    """Guardar (ou remover, com gid=None) o GID resolvido para a aba"""
+    with CACHE_LOCK:
+        cache = load_json_cache(GID_CACHE_FILE)
+        abas = cache.setdefault(spreadsheet_id, {})
+        if gid is None:
+            if abas.pop(tab_name, None) is None:
+                return
+        else:
+            if abas.get(tab_name, {}).get("gid") == gid:
+                return
+            abas[tab_name] = {"gid": gid, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        save_json_cache(GID_CACHE_FILE, cache)
+
+def export_variant(export_url):
+    """Variante de uma URL de exportação no histórico: "export:<gid>", "gviz:<gid>" ou "export:-" (sem GID)"""
+    endpoint = "gviz" if "/gviz/" in export_url else "export"
+    gid = gid_from_export_url(export_url)
+    return f"{endpoint}:{gid if gid is not None else '-'}"
+
+def load_export_stats(spreadsheet_id, tab_name):
+    """Histórico das variantes de exportação da aba: {variante: {"ok", "fail", "latency", ...}}"""
+    return load_json_cache(EXPORT_STATS_FILE).get(spreadsheet_id, {}).get(tab_name, {})
+
+def decayed_counts(stats, agora):
+    """Sucessos e falhas da variante com decaimento exponencial (meia-vida EXPORT_STATS_HALF_LIFE)"""
+    fator = 0.5 ** (max(0.0, agora - stats.get("updated_at", agora)) / EXPORT_STATS_HALF_LIFE)
+    return stats.get("ok", 0) * fator, stats.get("fail", 0) * fator
+
+def order_export_urls(export_urls, stats):
+    """Ordenar as URLs pelo histórico das variantes
+    - menor tempo esperado até um CSV válido primeiro: latência / taxa de sucesso (com prior 1/2);
+      variantes sem histórico mantêm a ordem original entre si;
+    - variantes com o disjuntor aberto são puladas (a menos que todas estejam abertas);
+    - se a primeira é confiável (>= 80% de sucesso), ela larga sozinha por uma vantagem de
+      2x a sua latência (entre HEDGE_MIN_SECONDS e HEDGE_MAX_SECONDS) antes das demais
+    Retorna (urls, vantagem em segundos ou None)
+    """
+    agora = time.time()
+    
+    def custo(export_url):
+        variante = stats.get(export_variant(export_url)) or {}
+        ok, falhas = decayed_counts(variante, agora)
+        return variante.get("latency", EXPORT_DEFAULT_LATENCY) * (ok + falhas + 2) / (ok + 1)
+    
+    ordenadas = sorted(export_urls, key=custo)
+    fechadas = [url for url in ordenadas if (stats.get(export_variant(url)) or {}).get("open_until", 0) <= agora]
+    if fechadas and len(fechadas) < len(ordenadas):
+        puladas = [export_variant(url) for url in ordenadas if url not in fechadas]
+        print(f"[GOOGLE SHEETS] Pulando variante(s) com falhas recentes: {', '.join(puladas)}", file=sys.stderr)
+        note_timing("export_skipped", puladas)
+        ordenadas = fechadas
+    
+    vantagem = None
+    melhor = stats.get(export_variant(ordenadas[0])) or {} if ordenadas else {}
+    ok, falhas = decayed_counts(melhor, agora)
+    # ok > 1.5: pelo menos dois sucessos recentes (as contagens decaem continuamente)
+    if len(ordenadas) > 1 and ok > 1.5 and ok >= 0.8 * (ok + falhas):
+        vantagem = min(max(2 * melhor.get("latency", EXPORT_DEFAULT_LATENCY), HEDGE_MIN_SECONDS), HEDGE_MAX_SECONDS)
+    return ordenadas, vantagem
+
+def update_export_stats(spreadsheet_id, tab_name, tentativas):
+    """Gravar as tentativas [(url, sucesso, segundos, erro)] no histórico das variantes da aba
+    Sucesso: conta com decaimento, latência (média móvel) e fecha o disjuntor. Falha: guarda o
+    erro e, após CIRCUIT_FAILURES seguidas, abre o disjuntor com espera exponencial
+    """
+    if not tentativas:
+        return
+    with CACHE_LOCK:
+        cache = load_json_cache(EXPORT_STATS_FILE)
+        variantes = cache.setdefault(spreadsheet_id, {}).setdefault(tab_name, {})
+        agora = time.time()
+        for export_url, sucesso, segundos, erro in tentativas:
+            variante = variantes.setdefault(export_variant(export_url), {})
+            ok, falhas = decayed_counts(variante, agora)
+            if sucesso:
+                ok += 1
+                latencia = variante.get("latency")
+                variante["latency"] = round(segundos if latencia is None else 0.7 * latencia + 0.3 * segundos, 3)
+                variante["consecutive_failures"] = 0
+                variante.pop("open_until", None)
+            else:
+                falhas += 1
+                # Falhas seguidas antigas não contam mais para o disjuntor
+                if agora - variante.get("updated_at", agora) > CIRCUIT_MAX_SECONDS:
+                    variante["consecutive_failures"] = 0
+                seguidas = variante["consecutive_failures"] = variante.get("consecutive_failures", 0) + 1
+                variante["last_error"] = erro
+                variante["last_error_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+                if seguidas >= CIRCUIT_FAILURES:
+                    espera = min(CIRCUIT_BASE_SECONDS * 2 ** (seguidas - CIRCUIT_FAILURES), CIRCUIT_MAX_SECONDS)
+                    variante["open_until"] = round(agora + espera)
+            variante["ok"] = round(ok, 4)
+            variante["fail"] = round(falhas, 4)
+            variante["updated_at"] = round(agora, 3)
+        save_json_cache(EXPORT_STATS_FILE, cache)
+
+def get_last_result(spreadsheet_id, tab_name):
+    """Última extração bem-sucedida da aba: {"hash", "valores", "url", "etag", "last_modified"}"""
+    return load_json_cache(LAST_RESULT_FILE).get(spreadsheet_id, {}).get(tab_name)
+
+def set_last_result(spreadsheet_id, tab_name, entry):
+    """Guardar a última extração bem-sucedida da aba"""
+    with CACHE_LOCK:
+        cache = load_json_cache(LAST_RESULT_FILE)
+        cache.setdefault(spreadsheet_id, {})[tab_name] = entry
+        save_json_cache(LAST_RESULT_FILE, cache)
+
+def record_snapshot(result, spreadsheet_id, tab_name, layout, csv_hash):
+    """Gravar a extração no histórico SQLite (SNAPSHOT_DB); uma falha aqui não derruba a extração"""
+    try:
+        snapshot_id = save_snapshot(SNAPSHOT_DB, result, spreadsheet_id, tab_name, layout, csv_hash)
+        if snapshot_id is None:
+            print("[GOOGLE SHEETS] Snapshot não gravado: mesmo conteúdo do último do histórico", file=sys.stderr)
+        else:
+            print(f"[GOOGLE SHEETS] Snapshot {snapshot_id} gravado em {SNAPSHOT_DB}", file=sys.stderr)
+    except Exception as e:
+        print(f"[GOOGLE SHEETS] ⚠️ Erro ao gravar snapshot em {SNAPSHOT_DB}: {e}", file=sys.stderr)
+
+def open_spreadsheet(browser, url, reuse_page=False, tab_name=SHEET_TAB_NAME):
+    """Garantir que a planilha está aberta no Chrome (iniciando-o se necessário)
+    Retorna (driver, mensagem_de_erro)
+    """
+    driver = browser.get()
+    if not driver:
+        return None, "Chrome não disponível"
+    
+    if reuse_page and is_spreadsheet_loaded(driver, url, tab_name):
+        # O Google Sheets mantém a aba aberta sincronizada, não é preciso recarregar
+        print("[GOOGLE SHEETS] Reutilizando planilha já carregada na sessão", file=sys.stderr)
+        return driver, None
+    
+    erro = load_spreadsheet_page(driver, url, tab_name)
+    browser.page_bytes = get_page_bytes(driver)
+    if browser.page_bytes is not None:
+        print(f"[GOOGLE SHEETS] Planilha carregada: {browser.page_bytes / 1024:.0f} KB transferidos", file=sys.stderr)
+    return driver, erro
+
+def extract_financial_data(driver, url=None, reuse_page=False, color_check=None, stream=None,
+                           spreadsheet_id=SPREADSHEET_ID, tab_name=SHEET_TAB_NAME, gid=None, layout=DEFAULT_LAYOUT):
+    """Extrair dados financeiros do Google Sheets em estágios (ver run_extraction_stages)
+    O resultado traz em "timings" o tempo de cada fase: driver_setup, page_load, tab_click,
+    grid_wait, export_* (com cada tentativa de URL em "exports"), dom_extraction (e o
+    "dom_method" usado), process_csv e color_check
+    """
+    timings = Timings()
+    anterior = current_timings()
+    TIMINGS_ATUAL.timings = timings
+    try:
+        result = run_extraction_stages(driver, url, reuse_page, color_check, stream,
+                                       spreadsheet_id, tab_name, gid, layout)
+    finally:
+        TIMINGS_ATUAL.timings = anterior
+    
+    result["timings"] = timings.as_dict()
+    return result
+
+def run_extraction_stages(driver, url=None, reuse_page=False, color_check=None, stream=None,
+                          spreadsheet_id=SPREADSHEET_ID, tab_name=SHEET_TAB_NAME, gid=None, layout=DEFAULT_LAYOUT):
+    """Extrair dados financeiros do Google Sheets em estágios
+    
+    1. export: URL de exportação CSV via HTTP, sem navegador
+    2. browser_export: abre a planilha no Chrome e exporta o GID da aba tab_name
+    3. dom: extrai os dados da planilha renderizada (Métodos 1 e 2)
+    
+    O Chrome só é iniciado nos estágios 2 e 3 ou para a verificação de cores.
+    driver: webdriver já aberto, LazyDriver ou None (Chrome criado sob demanda)
+    reuse_page: não recarregar a planilha se ela já estiver aberta no driver (modo --serve)
+    color_check: "auto" (só se o Chrome já estiver aberto), "always", "never" ou "xlsx"
+                 (export XLSX, sem navegador); padrão: COLOR_CHECK
+    stream: processar o CSV do GID em cache em streaming (padrão: STREAM_CSV)
+    spreadsheet_id, tab_name, gid: planilha e aba (padrão: 'RELATÓRIO CYLLA' da Viva Saúde).
+    Com gid informado a aba não é procurada por tentativa nem pelo nome no navegador; sem
+    tab_name, "gid=<gid>" é usado só como chave dos caches
+    layout: chave de LAYOUTS
+    """
+    if stream is None:
+        stream = STREAM_CSV
+    if color_check is None:
+        color_check = COLOR_CHECK
+    aba_cache = tab_name if tab_name is not None else f"gid={gid}"  # Chave da aba nos caches
+    if url is None:
+        url = spreadsheet_url(spreadsheet_id, gid)
+    browser = driver if isinstance(driver, LazyDriver) else LazyDriver(driver)
+    result = {
+        "success": False,
+        "message": "",
+        "stage": None,  # Estágio que produziu os dados: export, browser_export ou dom
+        "valores": {
+            "vivaRioEmAberto": None,
+            "setembro": None,
+            "outubro": None,
+            "novembro": None,
+            "total": None,
+            "meses": {}  # Dados organizados por mês
+        },
+        "error": None
+    }
+    
+    try:
+        plan = get_layout_plan(layout)
+    except (ValueError, KeyError, TypeError) as e:
+        result["error"] = f"Layout inválido: {e}"
+        result["message"] = "Falha ao extrair dados da planilha"
+        return result
+    required_text = plan.required_text
+    
+    # Eventos de progresso: cada bloco de mês e o resumo assim que são lidos do CSV
+    def emit_month_block(mes, mes_data, indice):
+        emit_event("month_block", month=mes, row=indice, data=mes_data)
+    
+    def emit_summary(valores):
+        resumo = {chave: valor for chave, valor in valores.items() if chave != "meses"}
+        for chave in plan.campos_resumo:
+            resumo[f"{chave}Centavos"] = parse_brl_cents(valores.get(chave))
+        emit_event("summary", valores=resumo)
+    
+    try:
+        previous = get_last_result(spreadsheet_id, aba_cache)
+        resposta = None
+        stats_key = (spreadsheet_id, aba_cache)  # Histórico das variantes de exportação da aba
+        
+        # Estágio 1: exportação direta, sem navegador. Primeiro o GID informado ou já resolvido
+        # em execuções anteriores; o do cache só é invalidado se a resposta mostrar que ele não é
+        # mais a aba (HTML, aba errada, GID inexistente), não por timeout ou erro do servidor
+        cached_gid = gid if gid is not None else get_cached_gid(spreadsheet_id, aba_cache)
+        if cached_gid is not None:
+            print(f"[GOOGLE SHEETS] Tentando GID {cached_gid} para '{aba_cache}'", file=sys.stderr)
+            cached_urls = build_export_urls(spreadsheet_id, [cached_gid])
+            tentativas = []
+            with timed("export_cached_gid"):
+                if stream:
+                    resposta = stream_export_csv(cached_urls, required_text=required_text, previous=previous, plan=plan,
+                                                 on_month_block=emit_month_block, on_summary=emit_summary,
+                                                 stats_key=stats_key, attempts=tentativas)
+                else:
+                    resposta = fetch_export_csv(cached_urls, required_text=required_text, previous=previous,
+                                                stats_key=stats_key, attempts=tentativas)
+            aba_invalida = any(erro in GID_INVALID_ERRORS for _, _, _, erro in tentativas)
+            if not resposta and gid is None and aba_invalida:
+                print(f"[GOOGLE SHEETS] ⚠️ GID em cache {cached_gid} falhou, invalidando", file=sys.stderr)
+                set_cached_gid(spreadsheet_id, aba_cache, None)
+        
+        # Sem saber o GID da aba, só aceitar o CSV que contém o texto do layout (ex: "VIVA RIO")
+        if not resposta and gid is None:
+            print("[GOOGLE SHEETS] Tentando obter CSV via URL de exportação (sem navegador)...", file=sys.stderr)
+            export_urls = build_export_urls(spreadsheet_id, ['0', '1', '2', '3'], include_default=True)
+            with timed("export_gid_probe"):
+                resposta = fetch_export_csv(export_urls, required_text=required_text, previous=previous,
+                                            stats_key=stats_key)
+            if resposta and gid_from_export_url(resposta["url"]) is not None:
+                set_cached_gid(spreadsheet_id, aba_cache, gid_from_export_url(resposta["url"]))
+        
+        if resposta:
+            result["stage"] = "export"
+        else:
+            print("[GOOGLE SHEETS] Exportação direta falhou, abrindo a planilha no navegador...", file=sys.stderr)
+            with browser.lock:
+                active_driver, erro_pagina = open_spreadsheet(browser, url, reuse_page, tab_name)
+                if not active_driver:
+                    result["error"] = "Não foi possível obter o CSV e o Chrome não está disponível"
+                    result["message"] = "Falha ao extrair dados da planilha"
+                    return result
+                if erro_pagina:
+                    result["error"] = erro_pagina
+                    result["message"] = "A planilha requer permissão de acesso"
+                    return result
+                
+                # Estágio 2: exportação usando o GID da aba selecionada no navegador
+                active_gid = detect_active_gid(active_driver)
+                with timed("export_browser_gid"):
+                    resposta = fetch_export_csv(build_export_urls(spreadsheet_id, [active_gid]), previous=previous,
+                                                stats_key=stats_key)
+                if resposta:
+                    result["stage"] = "browser_export"
+                    # detect_active_gid cai para '0' se não achar o GID: só guardar se o CSV é mesmo da aba
+                    if resposta["csv"] and (not required_text or required_text in resposta["csv"].upper()):
+                        set_cached_gid(spreadsheet_id, aba_cache, active_gid)
+                else:
+                    # Estágio 3: extrair dados diretamente da página renderizada
+                    print("[GOOGLE SHEETS] Extraindo dados diretamente da planilha renderizada...", file=sys.stderr)
+                    with timed("dom_extraction"):
+                        dom_csv = extract_csv_from_dom(active_driver)
+                    if dom_csv:
+                        result["stage"] = "dom"
+                        resposta = {"csv": dom_csv, "url": None, "etag": None, "last_modified": None, "not_modified": False}
+        
+        if resposta:
+            csv_content = resposta["csv"]
+            if "hash" in resposta:
+                csv_hash = resposta["hash"]  # CSV já processado em streaming
+            else:
+                csv_hash = hashlib.sha256(csv_content.encode('utf-8')).hexdigest() if csv_content else None
+            
+            if previous and (resposta["not_modified"] or csv_hash == previous.get("hash")):
+                # Mesmo conteúdo da última extração: não reprocessar nem verificar cores
+                print("[GOOGLE SHEETS] Planilha sem alterações desde a última extração, reutilizando valores", file=sys.stderr)
+                valores = previous["valores"]
+                result["unchanged"] = True
+                result["changes"] = []
+                
+                # Guardar validadores novos (ETag/Last-Modified) para a próxima requisição condicional
+                novos_validadores = {"url": resposta["url"], "etag": resposta["etag"], "last_modified": resposta["last_modified"]}
+                if any(previous.get(k) != v for k, v in novos_validadores.items()):
+                    set_last_result(spreadsheet_id, aba_cache, {**previous, **novos_validadores})
+            else:
+                estado_diff = meses_afetados = None
+                if "valores" in resposta:
+                    valores = resposta["valores"]
+                else:
+                    # Com o estado da extração anterior, só os meses com linhas alteradas são recoletados
+                    anterior = {**previous["diff"], "valores": previous["valores"]} if previous and previous.get("diff") else None
+                    print(f"[GOOGLE SHEETS] Processando CSV (estágio: {result['stage']})...", file=sys.stderr)
+                    with timed("process_csv"):
+                        valores, estado_diff, meses_afetados = process_csv_incremental(csv_content, anterior, plan, emit_month_block, emit_summary)
                 
-                except Exception as e:
-                    print(f"[GOOGLE SHEETS] Erro ao acessar célula A2: {e}", file=sys.stderr)
-            
-            # Método 2: Se não conseguiu, tentar extrair texto completo e processar
-            if not csv_content:
-                print("[GOOGLE SHEETS] Tentando método alternativo: extrair texto completo...", file=sys.stderr)
-                try:
-                    # Focar na área da planilha
-                    sheet_container = driver.find_element(By.CSS_SELECTOR, "[role='grid'], [id*='grid'], .kix-appview-editor")
-                    page_text = sheet_container.text if sheet_container else driver.find_element(By.TAG_NAME, "body").text
-                    
-                    print(f"[GOOGLE SHEETS] Texto extraído (primeiros 500 chars): {page_text[:500]}", file=sys.stderr)
-                    
-                    # Procurar por padrões específicos no texto
-                    if "VIVA RIO" in page_text.upper() or "SETEMBRO" in page_text.upper():
-                        print("[GOOGLE SHEETS] Texto relevante encontrado, processando...", file=sys.stderr)
-                        # Dividir em linhas e tentar identificar estrutura
-                        lines = page_text.split("\n")
-                        csv_rows = []
-                        for line in lines:
-                            line_clean = line.strip()
-                            if line_clean and (any(char.isdigit() for char in line_clean) or "VIVA" in line_clean.upper() or "RIO" in line_clean.upper() or "SETEMBRO" in line_clean.upper() or "OUTUBRO" in line_clean.upper() or "NOVEMBRO" in line_clean.upper()):
-                                # Tentar separar por espaços múltiplos ou tabs
-                                parts = [p.strip() for p in line_clean.split() if p.strip()]
-                                if len(parts) > 1:
-                                    csv_rows.append(",".join(parts))
-                        
-                        if csv_rows:
-                            csv_content = "\n".join(csv_rows)
-                            print(f"[GOOGLE SHEETS] ✅ Dados extraídos via texto: {len(csv_rows)} linhas", file=sys.stderr)
-                except Exception as e:
-                    print(f"[GOOGLE SHEETS] Erro no método alternativo: {e}", file=sys.stderr)
-                        
-        except Exception as e:
-            print(f"[GOOGLE SHEETS] Erro ao extrair dados da página: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
-        
-        # Processar CSV se obtido
-        if csv_content:
-            print("[GOOGLE SHEETS] Processando CSV...", file=sys.stderr)
-            valores = process_csv(csv_content)
-            
-            # Se temos driver, verificar cores das células para identificar valores negativos
-            if driver:
-                print("[GOOGLE SHEETS] Verificando cores das células para identificar valores negativos...", file=sys.stderr)
-                try:
-                    # Verificar cor das células B34, B35, B36, B37 (linhas 34-37, coluna B = índice 1)
-                    cores_celulas = driver.execute_script("""
-                        const cores = {};
-                        // Procurar células nas linhas 34-37, coluna B
-                        const linhas = [34, 35, 36, 37];
-                        
-                        linhas.forEach(linha => {
-                            // Tentar encontrar célula por data-row e data-col
-                            const cell = document.querySelector(`[data-row="${linha}"][data-col="1"]`) ||
-                                       document.querySelector(`[aria-rowindex="${linha}"][aria-colindex="2"]`) ||
-                                       document.querySelector(`[role="gridcell"][data-row="${linha}"]`);
-                            
-                            if (cell) {
-                                const style = window.getComputedStyle(cell);
-                                const color = style.color;
-                                const backgroundColor = style.backgroundColor;
-                                
-                                // Verificar se a cor é vermelha (RGB ou hex)
-                                const isRed = color.includes('rgb(255') || 
-                                             color.includes('rgb(220') ||
-                                             color.includes('rgb(239') ||
-                                             color.includes('#ff') ||
-                                             color.includes('#ef') ||
-                                             color.includes('#dc');
-                                
-                                cores[linha] = {
-                                    color: color,
-                                    backgroundColor: backgroundColor,
-                                    isRed: isRed
-                                };
-                            }
-                        });
-                        
-                        return cores;
-                    """)
-                    
-                    # Aplicar informações de cor aos valores
-                    if cores_celulas:
-                        if 34 in cores_celulas and cores_celulas[34].get('isRed'):
-                            valores["setembroNegativo"] = True
-                            print("[GOOGLE SHEETS] ⚠️ Setembro está em vermelho (negativo)", file=sys.stderr)
-                        
-                        if 35 in cores_celulas and cores_celulas[35].get('isRed'):
-                            valores["outubroNegativo"] = True
-                            print("[GOOGLE SHEETS] ⚠️ Outubro está em vermelho (negativo)", file=sys.stderr)
-                        
-                        if 36 in cores_celulas and cores_celulas[36].get('isRed'):
-                            valores["novembroNegativo"] = True
-                            print("[GOOGLE SHEETS] ⚠️ Novembro está em vermelho (negativo)", file=sys.stderr)
-                        
-                        if 37 in cores_celulas and cores_celulas[37].get('isRed'):
-                            valores["totalNegativo"] = True
-                            print("[GOOGLE SHEETS] ⚠️ Total está em vermelho (negativo)", file=sys.stderr)
-                except Exception as e:
-                    print(f"[GOOGLE SHEETS] Erro ao verificar cores: {e}", file=sys.stderr)
+                # Verificar cores só quando o Chrome já está aberto (ou se pedido explicitamente),
+                # os valores negativos já são identificados pelo sinal em process_csv
+                if color_check == "xlsx":
+                    xlsx_gid = gid_from_export_url(resposta["url"]) if resposta["url"] else gid
+                    with timed("color_check"):
+                        check_negative_cells_xlsx(spreadsheet_id, valores, plan, tab_name, xlsx_gid)
+                elif color_check == "always" or (color_check == "auto" and browser.driver):
+                    with browser.lock, timed("color_check"):
+                        active_driver, erro_pagina = open_spreadsheet(browser, url, True, tab_name)
+                        if active_driver and not erro_pagina:
+                            check_negative_cell_colors(active_driver, valores)
+                
+                result["unchanged"] = False
+                if previous and previous.get("valores"):
+                    result["changes"] = diff_values(previous["valores"], valores, meses_afetados)
+                set_last_result(spreadsheet_id, aba_cache, {
+                    "hash": csv_hash,
+                    "valores": valores,
+                    "diff": estado_diff,
+                    "url": resposta["url"],
+                    "etag": resposta["etag"],
+                    "last_modified": resposta["last_modified"],
+                    "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+                })
             
             result["valores"] = valores
             result["success"] = True
             result["message"] = "Dados extraídos com sucesso"
-            result["csv_content"] = csv_content[:1000]  # Primeiros 1000 caracteres para debug
+            if SNAPSHOT_DB:
+                with timed("snapshot"):
+                    record_snapshot(result, spreadsheet_id, aba_cache, layout, csv_hash or (previous or {}).get("hash"))
+            if csv_content:
+                result["csv_content"] = csv_content[:1000]  # Primeiros 1000 caracteres para debug
+            if browser.driver:
+                result["browser"] = browser.stats()
         else:
             result["error"] = "Não foi possível obter o conteúdo CSV"
             result["message"] = "Falha ao extrair dados da planilha"
@@ -512,9 +2022,126 @@ def extract_financial_data(driver, url):
     
     return result
 
-def process_csv(csv_content):
+# Meses em português, na ordem de prioridade usada para identificar a célula da coluna A
+MESES_PT = [
+    "JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO",
+    "JULHO", "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"
+]
+MESES_RE = re.compile("|".join(MESES_PT))
+NUMERO_RE = re.compile(r'[\d.,]+')
+VALOR_MONETARIO_RE = re.compile(r'^\s*R\$\s*[\d.,]+', re.IGNORECASE)
+NUMERO_PURO_RE = re.compile(r'^\s*[\d.,]+\s*$')
+CABECALHOS_VALOR_NF = ('VALOR NF', 'VALOR NF.', 'VALORNF', 'VALORNF.')
+
+BRL_NUMERO_RE = re.compile(r'(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d{1,2}))?')
+
+def parse_brl(texto):
+    """Interpretar um valor em reais: retorna (negativo, centavos absolutos) ou None
+    Aceita "R$ 1.234,56", "-R$ 1.234,56", "R$ -1.234,56", "(R$ 1.234,56)", "1234,5" e "1.234"
+    """
+    if not texto:
+        return None
+    t = str(texto).strip().replace('\u2212', '-')
+    negativo = False
+    
+    if t.startswith('R$'):
+        t = t[2:].strip()
+    # Formato contábil: (R$ 1.234,56)
+    if t.startswith('(') and t.endswith(')'):
+        negativo = True
+        t = t[1:-1].strip()
+    if t.startswith('-'):
+        negativo = True
+        t = t[1:].strip()
+    if t.startswith('R$'):
+        t = t[2:].strip()
+    if t.startswith('-'):
+        negativo = True
+        t = t[1:].strip()
+    
+    m = BRL_NUMERO_RE.fullmatch(t)
+    if not m:
+        return None
+    centavos = int(m.group(1).replace('.', '')) * 100 + int((m.group(2) or '0').ljust(2, '0'))
+    return negativo, centavos
+
+def parse_brl_cents(texto):
+    """Converter um valor em reais (texto) para centavos inteiros; None se não for um valor BRL"""
+    parsed = parse_brl(texto)
+    if parsed is None:
+        return None
+    negativo, centavos = parsed
+    return -centavos if negativo else centavos
+
+def is_negative_value(valor_str):
+    """Verificar se o valor (texto) é negativo"""
+    if not valor_str:
+        return False
+    parsed = parse_brl(valor_str)
+    if parsed is not None:
+        # "-R$ 0,00" continua negativo (valor arredondado na exibição)
+        return parsed[0]
+    # Fora do formato BRL: considerar o sinal de menos ou parênteses (formato contábil)
+    valor_clean = valor_str.strip().replace('R$', '').replace('$', '').replace(' ', '')
+    return valor_clean.startswith('-') or valor_clean.startswith('(')
+
+def add_summary_cents(valores, plan):
+    """Adicionar <campo>Centavos para cada valor do resumo (setembroCentavos, ..., totalCentavos)
+    Os itens dos meses recebem "centavos" já na coleta (ver LayoutPlan.collect_month_block)
+    """
+    for chave in plan.campos_resumo:
+        valores[f"{chave}Centavos"] = parse_brl_cents(valores.get(chave))
+
+def iter_csv_rows(lines):
+    """Gerar as linhas do CSV a partir de um iterável de linhas de texto (arquivo, resposta HTTP, ...)
+    O delimitador (',', ';' ou tab) é detectado nos primeiros 100 caracteres, sem ler o resto
+    """
+    lines = iter(lines)
+    inicio = []
+    tamanho = 0
+    for line in lines:
+        if not inicio:
+            # Ignorar espaços e linhas em branco no início do conteúdo
+            line = line.lstrip()
+            if not line:
+                continue
+        inicio.append(line)
+        tamanho += len(line)
+        if tamanho >= 100:
+            break
+    
+    amostra = "".join(inicio)[:100]
+    delimiter = ','
+    if ';' in amostra:
+        delimiter = ';'
+    elif '\t' in amostra:
+        delimiter = '\t'
+    
+    return csv.reader(itertools.chain(inicio, lines), delimiter=delimiter)
+
+def find_month(label):
+    """Mês contido no rótulo da coluna A (já em maiúsculas), respeitando a ordem de MESES_PT"""
+    # A regex descarta rapidamente as linhas sem mês; com mês, manter a prioridade da lista
+    if not MESES_RE.search(label):
+        return None
+    for mes in MESES_PT:
+        if mes in label:
+            return mes
+    return None
+
+def is_monetary_value(texto):
+    """Verificar se o texto é um valor monetário (R$ 1.234,56, 1.234,56, ...)"""
+    texto_upper = texto.upper()
+    return bool(
+        texto_upper.startswith('R$') or
+        texto_upper.startswith('$') or
+        VALOR_MONETARIO_RE.search(texto) or
+        (NUMERO_PURO_RE.search(texto) and (',' in texto or '.' in texto))
+    )
+
+def process_csv(csv_content, on_month_block=None, plan=None, on_summary=None):
     """Processar CSV e extrair valores financeiros
-    Estrutura esperada:
+    Estrutura esperada (layout padrão, ver LAYOUTS):
     - A33: VIVA RIO EM ABERTO
     - A34: SETEMBRO | B34: valor
     - A35: OUTUBRO | B35: valor
@@ -528,363 +2155,97 @@ def process_csv(csv_content):
       - Valor recebido em D2 a D6 (relativo à linha do mês)
       - Data em E2 a E6 (relativo à linha do mês)
       - Situação em H2 até H5 (relativo à linha do mês)
+    - Valores monetários também em centavos inteiros (ver add_summary_cents)
     """
-    valores = {
-        "vivaRioEmAberto": None,
-        "setembro": None,
-        "outubro": None,
-        "novembro": None,
-        "total": None,
-        "meses": {}  # Nova estrutura para dados por mês
-    }
+    return process_csv_rows(iter_csv_rows(io.StringIO(csv_content.strip())), on_month_block, plan, on_summary)
+
+def process_csv_rows(rows, on_month_block=None, plan=None, on_summary=None):
+    """Processar as linhas do CSV em uma única passada, sem guardar a planilha inteira
     
-    # Lista de meses em português
-    meses_pt = [
-        "JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO",
-        "JULHO", "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"
-    ]
+    rows é qualquer iterável de linhas (lista, csv.reader sobre a resposta HTTP, ...).
+    plan é o LayoutPlan do layout da planilha (padrão: DEFAULT_LAYOUT). Só ficam em memória:
+    - as últimas linhas necessárias para os blocos de meses (i-2..i+2 no layout padrão);
+    - as primeiras linhas, até a última célula fixa do resumo (A33-A37 no layout padrão);
+    - as janelas em torno da linha "VIVA RIO" (10 linhas antes e depois), apenas se
+      o resumo não estiver nas linhas fixas e for preciso usar a busca genérica.
+    on_month_block(mes, mes_data, indice) é chamado assim que a janela de um bloco de
+    mês fica completa; on_summary(valores) assim que o resumo é lido (nas linhas fixas,
+    antes do resto da planilha, ou no fim, pela busca genérica).
+    """
+    if plan is None:
+        plan = get_layout_plan()
+    valores = plan.new_values()
+    
+    janela = collections.deque(maxlen=plan.tamanho_janela)  # (índice, linha) das últimas linhas
+    meses_pendentes = collections.deque()                    # (índice, mês) aguardando a última linha do bloco
+    primeiras = []                                           # linhas fixas do resumo
+    ultima_resumo = plan.linhas_resumo - 1
+    busca = None                                             # estado da busca genérica
+    total_linhas = 0
+    coluna_mes = plan.coluna_mes
+    depois = plan.depois
+    
+    def finish_month_block(i, mes):
+        plan.collect_month_block(janela, i, valores["meses"][mes])
+        if on_month_block:
+            on_month_block(mes, valores["meses"][mes], i)
     
     try:
-        # Parsear CSV - tentar diferentes delimitadores
-        csv_content_clean = csv_content.strip()
-        
-        # Tentar detectar delimitador
-        delimiter = ','
-        if ';' in csv_content_clean[:100]:
-            delimiter = ';'
-        elif '\t' in csv_content_clean[:100]:
-            delimiter = '\t'
+        for i, row in enumerate(rows):
+            total_linhas = i + 1
+            janela.append((i, row))
+            
+            # Rótulo da coluna do mês (A) em maiúsculas: identifica o bloco de mês
+            label = row[coluna_mes].strip().upper() if len(row) > coluna_mes else ""
+            mes_encontrado = find_month(label) if label else None
+            if mes_encontrado:
+                # Inicializar estrutura do mês se não existir (o log sai só na primeira vez: em
+                # planilhas grandes o mesmo mês se repete em milhares de blocos)
+                if mes_encontrado not in valores["meses"]:
+                    print(f"[GOOGLE SHEETS] ✅ Mês '{mes_encontrado}' encontrado na linha {i+1} (índice {i})", file=sys.stderr)
+                    valores["meses"][mes_encontrado] = plan.new_month(i)
+                meses_pendentes.append((i, mes_encontrado))
+            
+            # Blocos cuja janela ficou completa
+            while meses_pendentes and meses_pendentes[0][0] + depois <= i:
+                finish_month_block(*meses_pendentes.popleft())
+            
+            if busca is not None:
+                busca.feed(i, row)
+            elif i <= ultima_resumo:
+                primeiras.append(row)
+                if i == ultima_resumo:
+                    if plan.process_summary(primeiras, valores):
+                        if on_summary:
+                            on_summary(valores)
+                    else:
+                        busca = plan.start_fallback(primeiras)
+                        primeiras = []
         
-        csv_reader = csv.reader(io.StringIO(csv_content_clean), delimiter=delimiter)
-        rows = list(csv_reader)
+        while meses_pendentes:
+            finish_month_block(*meses_pendentes.popleft())
         
-        if not rows:
+        if total_linhas == 0:
             print("[GOOGLE SHEETS] CSV vazio ou inválido", file=sys.stderr)
             return valores
         
-        print(f"[GOOGLE SHEETS] CSV parseado: {len(rows)} linhas encontradas", file=sys.stderr)
+        print(f"[GOOGLE SHEETS] CSV parseado: {total_linhas} linhas encontradas", file=sys.stderr)
         
-        # NOVA FUNCIONALIDADE: Identificar meses na coluna A e coletar dados relacionados
-        # Log removido para melhorar performance
-        for i, row in enumerate(rows):
-            if not row or len(row) == 0:
-                continue
-            
-            # Verificar se a célula A (índice 0) contém um mês
-            cell_a = str(row[0]).strip().upper() if len(row) > 0 else ""
-            
-            # Verificar se é um mês
-            mes_encontrado = None
-            for mes in meses_pt:
-                if mes in cell_a:
-                    mes_encontrado = mes
-                    break
-            
-            if mes_encontrado:
-                print(f"[GOOGLE SHEETS] ✅ Mês '{mes_encontrado}' encontrado na linha {i+1} (índice {i})", file=sys.stderr)
-                
-                # Inicializar estrutura do mês se não existir
-                if mes_encontrado not in valores["meses"]:
-                    valores["meses"][mes_encontrado] = {
-                        "linha": i + 1,  # Linha no Excel (1-based)
-                        "indice": i,     # Índice no array (0-based)
-                        "upas": [],
-                        "valores_nf": [],
-                        "valores_recebidos": [],
-                        "datas": [],
-                        "situacoes": []
-                    }
-                
-                mes_data = valores["meses"][mes_encontrado]
-                
-                # Coletar dados baseado no exemplo: mês em A4
-                # - UPAs em B3, B4, B5 (linhas 3, 4, 5 do Excel = índices 2, 3, 4)
-                # - Valores em D2 a D6 (linhas 2 a 6 do Excel = índices 1 a 5)
-                # - Datas em E2 a E6 (linhas 2 a 6 do Excel = índices 1 a 5)
-                # - Situações em H2 até H5 (linhas 2 a 5 do Excel = índices 1 a 4)
-                
-                # Se o mês está na linha i+1 (Excel), coletar dados das linhas próximas
-                # Vamos coletar dados das linhas próximas ao mês (antes e depois)
-                
-                # Coletar UPAs em B3, B4, B5 (coluna B = índice 1)
-                # Se mês está na linha i+1, coletar linhas i-1, i, i+1 (B3, B4, B5)
-                linhas_upas = [i-1, i, i+1]  # Índices para B3, B4, B5
-                for idx_upa in linhas_upas:
-                    if 0 <= idx_upa < len(rows):
-                        if len(rows[idx_upa]) > 1:  # Coluna B existe
-                            upa = str(rows[idx_upa][1]).strip() if len(rows[idx_upa]) > 1 else ""
-                            if upa and upa not in mes_data["upas"]:
-                                # Filtrar valores monetários (remover se começar com R$ ou contiver padrão de valor monetário)
-                                upa_upper = upa.upper()
-                                # Verificar se é um valor monetário
-                                is_valor_monetario = (
-                                    upa_upper.startswith('R$') or
-                                    upa_upper.startswith('$') or
-                                    (re.search(r'^\s*R\$\s*[\d.,]+', upa, re.IGNORECASE)) or
-                                    (re.search(r'^\s*[\d.,]+\s*$', upa) and (',' in upa or '.' in upa))
-                                )
-                                
-                                if not is_valor_monetario:
-                                    mes_data["upas"].append(upa)
-                                    # Log removido para melhorar performance
-                
-                # Coletar VALOR NF em C2 a C6 (coluna C = índice 2)
-                # Se mês está na linha i+1, coletar linhas i-2, i-1, i, i+1, i+2 (C2 a C6)
-                linhas_valor_nf = range(max(0, i-2), min(len(rows), i+3))  # Índices para C2 a C6
-                for idx_valor_nf in linhas_valor_nf:
-                    if len(rows[idx_valor_nf]) > 2:  # Coluna C existe
-                        valor_nf = str(rows[idx_valor_nf][2]).strip() if len(rows[idx_valor_nf]) > 2 else ""
-                        if valor_nf:
-                            # Filtrar cabeçalho "VALOR NF." e variações
-                            valor_nf_upper = valor_nf.upper().strip()
-                            # Remover cabeçalhos
-                            if valor_nf_upper not in ['VALOR NF', 'VALOR NF.', 'VALORNF', 'VALORNF.']:
-                                mes_data["valores_nf"].append({
-                                    "linha": idx_valor_nf + 1,
-                                    "valor": valor_nf
-                                })
-                                # Log removido para melhorar performance
-                
-                # Coletar Valores Recebidos em D2 a D6 (coluna D = índice 3)
-                # Se mês está na linha i+1, coletar linhas i-2, i-1, i, i+1, i+2 (D2 a D6)
-                linhas_valores = range(max(0, i-2), min(len(rows), i+3))  # Índices para D2 a D6
-                for idx_valor in linhas_valores:
-                    if len(rows[idx_valor]) > 3:  # Coluna D existe
-                        valor = str(rows[idx_valor][3]).strip() if len(rows[idx_valor]) > 3 else ""
-                        if valor:
-                            mes_data["valores_recebidos"].append({
-                                "linha": idx_valor + 1,
-                                "valor": valor
-                            })
-                            # Log removido para melhorar performance
-                
-                # Coletar Datas em E2 a E6 (coluna E = índice 4)
-                # Se mês está na linha i+1, coletar linhas i-2, i-1, i, i+1, i+2 (E2 a E6)
-                linhas_datas = range(max(0, i-2), min(len(rows), i+3))  # Índices para E2 a E6
-                for idx_data in linhas_datas:
-                    if len(rows[idx_data]) > 4:  # Coluna E existe
-                        data = str(rows[idx_data][4]).strip() if len(rows[idx_data]) > 4 else ""
-                        if data:
-                            mes_data["datas"].append({
-                                "linha": idx_data + 1,
-                                "data": data
-                            })
-                            # Log removido para melhorar performance
-                
-                # Coletar Situações em H2 até H5 (coluna H = índice 7)
-                # Se mês está na linha i+1, coletar linhas i-2, i-1, i, i+1 (H2 até H5)
-                linhas_situacoes = range(max(0, i-2), min(len(rows), i+2))  # Índices para H2 até H5
-                for idx_situacao in linhas_situacoes:
-                    if len(rows[idx_situacao]) > 7:  # Coluna H existe
-                        situacao = str(rows[idx_situacao][7]).strip() if len(rows[idx_situacao]) > 7 else ""
-                        if situacao:
-                            mes_data["situacoes"].append({
-                                "linha": idx_situacao + 1,
-                                "situacao": situacao
-                            })
-                            # Log removido para melhorar performance
-        
-        # Buscar especificamente nas linhas 33-37 (índices 32-36)
-        # Logs de debug removidos para melhorar performance
-        # A33: VIVA RIO EM ABERTO
-        # A34: SETEMBRO | B34: valor
-        # A35: OUTUBRO | B35: valor
-        # A36: NOVEMBRO | B36: valor
-        # A37: Total | B37: valor total
-        
-        # Procurar linha 33 (índice 32) - VIVA RIO EM ABERTO
-        if len(rows) > 32:
-            linha_33 = rows[32]  # A33 (índice 32)
-            if linha_33 and len(linha_33) > 0:
-                cell_a33 = str(linha_33[0]).strip().upper() if len(linha_33) > 0 else ""
-                if "VIVA RIO" in cell_a33 or "VIVA RIO EM ABERTO" in cell_a33:
-                    valores["vivaRioEmAberto"] = "Encontrado"
-                    print(f"[GOOGLE SHEETS] ✅ Linha 33 (A33) encontrada: '{linha_33[0]}'", file=sys.stderr)
-        
-        # Função auxiliar para verificar se valor é negativo
-        def is_negative_value(valor_str):
-            if not valor_str:
-                return False
-            # Remover espaços e caracteres de formatação
-            valor_clean = valor_str.strip().replace('R$', '').replace('$', '').replace('.', '').replace(',', '.').replace(' ', '')
-            # Verificar se começa com menos ou parênteses (formato contábil)
-            if valor_clean.startswith('-') or valor_clean.startswith('('):
-                return True
-            # Tentar converter para número
-            try:
-                num_valor = float(valor_clean.replace('(', '').replace(')', ''))
-                return num_valor < 0
-            except:
-                return False
-        
-        # Procurar linha 34 (índice 33) - SETEMBRO
-        if len(rows) > 33:
-            linha_34 = rows[33]  # A34 (índice 33)
-            if linha_34 and len(linha_34) > 1:
-                cell_a34 = str(linha_34[0]).strip().upper() if len(linha_34) > 0 else ""
-                cell_b34 = str(linha_34[1]).strip() if len(linha_34) > 1 else ""
-                if "SETEMBRO" in cell_a34:
-                    valores["setembro"] = cell_b34 if cell_b34 else None
-                    # Verificar se é negativo pelo valor
-                    if cell_b34 and is_negative_value(cell_b34):
-                        valores["setembroNegativo"] = True
-                    print(f"[GOOGLE SHEETS] ✅ Setembro encontrado na linha 34, coluna B: '{cell_b34}'", file=sys.stderr)
-        
-        # Procurar linha 35 (índice 34) - OUTUBRO
-        if len(rows) > 34:
-            linha_35 = rows[34]  # A35 (índice 34)
-            if linha_35 and len(linha_35) > 1:
-                cell_a35 = str(linha_35[0]).strip().upper() if len(linha_35) > 0 else ""
-                cell_b35 = str(linha_35[1]).strip() if len(linha_35) > 1 else ""
-                if "OUTUBRO" in cell_a35:
-                    valores["outubro"] = cell_b35 if cell_b35 else None
-                    # Verificar se é negativo pelo valor
-                    if cell_b35 and is_negative_value(cell_b35):
-                        valores["outubroNegativo"] = True
-                    print(f"[GOOGLE SHEETS] ✅ Outubro encontrado na linha 35, coluna B: '{cell_b35}'", file=sys.stderr)
-        
-        # Procurar linha 36 (índice 35) - NOVEMBRO
-        if len(rows) > 35:
-            linha_36 = rows[35]  # A36 (índice 35)
-            if linha_36 and len(linha_36) > 1:
-                cell_a36 = str(linha_36[0]).strip().upper() if len(linha_36) > 0 else ""
-                cell_b36 = str(linha_36[1]).strip() if len(linha_36) > 1 else ""
-                if "NOVEMBRO" in cell_a36:
-                    valores["novembro"] = cell_b36 if cell_b36 else None
-                    # Verificar se é negativo pelo valor
-                    if cell_b36 and is_negative_value(cell_b36):
-                        valores["novembroNegativo"] = True
-                    print(f"[GOOGLE SHEETS] ✅ Novembro encontrado na linha 36, coluna B: '{cell_b36}'", file=sys.stderr)
-        
-        # Procurar linha 37 (índice 36) - Total
-        if len(rows) > 36:
-            linha_37 = rows[36]  # A37 (índice 36)
-            if linha_37 and len(linha_37) > 1:
-                cell_a37 = str(linha_37[0]).strip().upper() if len(linha_37) > 0 else ""
-                cell_b37 = str(linha_37[1]).strip() if len(linha_37) > 1 else ""
-                if "TOTAL" in cell_a37:
-                    valores["total"] = cell_b37 if cell_b37 else None
-                    # Verificar se é negativo pelo valor
-                    if cell_b37 and is_negative_value(cell_b37):
-                        valores["totalNegativo"] = True
-                    print(f"[GOOGLE SHEETS] ✅ Total encontrado na linha 37, coluna B: '{cell_b37}'", file=sys.stderr)
+        # Planilha mais curta que o resumo: ele ainda não foi verificado
+        if busca is None and total_linhas <= ultima_resumo:
+            if plan.process_summary(primeiras, valores):
+                if on_summary:
+                    on_summary(valores)
+            else:
+                busca = plan.start_fallback(primeiras)
         
         # Se não encontrou nas linhas específicas, tentar busca genérica
-        if not any([valores["setembro"], valores["outubro"], valores["novembro"], valores["total"]]):
-            print("[GOOGLE SHEETS] ⚠️ Não encontrado nas linhas específicas, tentando busca genérica...", file=sys.stderr)
-            linha_viva_rio = None
-            indice_viva_rio = -1
-            
-            for i, row in enumerate(rows):
-                row_text = " ".join([str(cell) for cell in row]).upper()
-                if "VIVA RIO EM ABERTO" in row_text or ("VIVA" in row_text and "RIO" in row_text and "ABERTO" in row_text):
-                    linha_viva_rio = row
-                    indice_viva_rio = i
-                    valores["vivaRioEmAberto"] = "Encontrado"
-                    print(f"[GOOGLE SHEETS] ✅ Linha 'VIVA RIO EM ABERTO' encontrada na linha {i + 1}: {row}", file=sys.stderr)
-                    break
-            
-            if not linha_viva_rio:
-                # Tentar procurar apenas "VIVA RIO"
-                for i, row in enumerate(rows):
-                    row_text = " ".join([str(cell) for cell in row]).upper()
-                    if "VIVA RIO" in row_text:
-                        linha_viva_rio = row
-                        indice_viva_rio = i
-                        valores["vivaRioEmAberto"] = "Encontrado"
-                        print(f"[GOOGLE SHEETS] ✅ Linha 'VIVA RIO' encontrada na linha {i + 1}: {row}", file=sys.stderr)
-                        break
+        if busca is not None:
+            plan.finish_fallback(busca, valores)
+            if on_summary:
+                on_summary(valores)
         
-        if linha_viva_rio:
-            # Procurar cabeçalho com meses (pode estar antes ou depois da linha VIVA RIO)
-            header_row = None
-            header_index = -1
-            
-            # Procurar nas linhas próximas (até 10 linhas antes e depois)
-            search_range = range(max(0, indice_viva_rio - 10), min(len(rows), indice_viva_rio + 10))
-            
-            for i in search_range:
-                row = rows[i]
-                row_text = " ".join([str(cell) for cell in row]).upper()
-                # Verificar se contém nomes de meses
-                if any(month in row_text for month in ["SETEMBRO", "OUTUBRO", "NOVEMBRO", "TOTAL"]):
-                    header_row = row
-                    header_index = i
-                    print(f"[GOOGLE SHEETS] ✅ Cabeçalho encontrado na linha {i + 1}: {row}", file=sys.stderr)
-                    break
-            
-            if header_row:
-                # Encontrar índices das colunas
-                indice_setembro = -1
-                indice_outubro = -1
-                indice_novembro = -1
-                indice_total = -1
-                
-                for j, cell in enumerate(header_row):
-                    cell_upper = str(cell).upper().strip()
-                    if "SETEMBRO" in cell_upper and indice_setembro == -1:
-                        indice_setembro = j
-                        print(f"[GOOGLE SHEETS] Coluna Setembro encontrada no índice {j}", file=sys.stderr)
-                    elif "OUTUBRO" in cell_upper and indice_outubro == -1:
-                        indice_outubro = j
-                        print(f"[GOOGLE SHEETS] Coluna Outubro encontrada no índice {j}", file=sys.stderr)
-                    elif "NOVEMBRO" in cell_upper and indice_novembro == -1:
-                        indice_novembro = j
-                        print(f"[GOOGLE SHEETS] Coluna Novembro encontrada no índice {j}", file=sys.stderr)
-                    elif "TOTAL" in cell_upper and indice_total == -1:
-                        indice_total = j
-                        print(f"[GOOGLE SHEETS] Coluna Total encontrada no índice {j}", file=sys.stderr)
-                
-                # Extrair valores da linha VIVA RIO
-                print(f"[GOOGLE SHEETS] Extraindo valores da linha VIVA RIO (índices: Set={indice_setembro}, Out={indice_outubro}, Nov={indice_novembro}, Tot={indice_total})", file=sys.stderr)
-                
-                if indice_setembro != -1 and indice_setembro < len(linha_viva_rio):
-                    valores["setembro"] = str(linha_viva_rio[indice_setembro]).strip()
-                    print(f"[GOOGLE SHEETS] Setembro: {valores['setembro']}", file=sys.stderr)
-                
-                if indice_outubro != -1 and indice_outubro < len(linha_viva_rio):
-                    valores["outubro"] = str(linha_viva_rio[indice_outubro]).strip()
-                    print(f"[GOOGLE SHEETS] Outubro: {valores['outubro']}", file=sys.stderr)
-                
-                if indice_novembro != -1 and indice_novembro < len(linha_viva_rio):
-                    valores["novembro"] = str(linha_viva_rio[indice_novembro]).strip()
-                    print(f"[GOOGLE SHEETS] Novembro: {valores['novembro']}", file=sys.stderr)
-                
-                if indice_total != -1 and indice_total < len(linha_viva_rio):
-                    valores["total"] = str(linha_viva_rio[indice_total]).strip()
-                    print(f"[GOOGLE SHEETS] Total: {valores['total']}", file=sys.stderr)
-            
-            # Se ainda não encontrou valores, procurar nas linhas próximas
-            if not all([valores["setembro"], valores["outubro"], valores["novembro"], valores["total"]]):
-                print("[GOOGLE SHEETS] Procurando valores nas linhas próximas...", file=sys.stderr)
-                for i in range(max(0, indice_viva_rio - 2), min(len(rows), indice_viva_rio + 5)):
-                    row = rows[i]
-                    row_text = " ".join([str(cell) for cell in row]).upper()
-                    
-                    # Procurar valores numéricos na mesma linha ou próxima
-                    for j, cell in enumerate(row):
-                        cell_clean = str(cell).strip()
-                        # Verificar se é um valor numérico (pode ter vírgula, ponto, R$, etc)
-                        if cell_clean and re.search(r'[\d.,]+', cell_clean):
-                            # Verificar contexto
-                            if i > 0:
-                                prev_row = rows[i-1]
-                                prev_row_text = " ".join([str(c) for c in prev_row]).upper()
-                                
-                                if "SETEMBRO" in prev_row_text and not valores["setembro"]:
-                                    valores["setembro"] = cell_clean
-                                    print(f"[GOOGLE SHEETS] Setembro encontrado na linha {i + 1}, coluna {j}: {cell_clean}", file=sys.stderr)
-                                elif "OUTUBRO" in prev_row_text and not valores["outubro"]:
-                                    valores["outubro"] = cell_clean
-                                    print(f"[GOOGLE SHEETS] Outubro encontrado na linha {i + 1}, coluna {j}: {cell_clean}", file=sys.stderr)
-                                elif "NOVEMBRO" in prev_row_text and not valores["novembro"]:
-                                    valores["novembro"] = cell_clean
-                                    print(f"[GOOGLE SHEETS] Novembro encontrado na linha {i + 1}, coluna {j}: {cell_clean}", file=sys.stderr)
-                                elif "TOTAL" in prev_row_text and not valores["total"]:
-                                    valores["total"] = cell_clean
-                                    print(f"[GOOGLE SHEETS] Total encontrado na linha {i + 1}, coluna {j}: {cell_clean}", file=sys.stderr)
-        else:
-            print("[GOOGLE SHEETS] ⚠️ Linha 'VIVA RIO EM ABERTO' não encontrada no CSV", file=sys.stderr)
+        add_summary_cents(valores, plan)
             
     except Exception as e:
         print(f"[GOOGLE SHEETS] Erro ao processar CSV: {e}", file=sys.stderr)
@@ -893,77 +2254,926 @@ def process_csv(csv_content):
     
     return valores
 
-def main():
-    """Função principal"""
-    url = "https://docs.google.com/spreadsheets/d/10vaVp0DcgOfjWW3_vat7M8mRVvMiBdtU9kAlDmjEioc/edit?usp=sharing"
+def row_fingerprint(row):
+    """Impressão digital (CRC32) de uma linha do CSV, para o diff entre extrações"""
+    return zlib.crc32("\x1f".join(row).encode('utf-8'))
+
+def encode_fingerprints(linhas):
+    """Impressões digitais (array 'I') em base64, para o cache JSON da última extração"""
+    return base64.b64encode(linhas.tobytes()).decode('ascii')
+
+def process_csv_incremental(csv_content, previous=None, plan=None, on_month_block=None, on_summary=None):
+    """Processar o CSV reaproveitando a extração anterior quando só algumas células mudaram
     
-    driver = None
-    result = None
+    Compara as linhas com as impressões digitais da extração anterior (previous["linhas"]) e,
+    se o número de linhas é o mesmo e nenhum rótulo de mês mudou, recoleta só os meses cujos
+    blocos contêm linhas alteradas (e o resumo); senão processa tudo (process_csv_rows).
     
-    # Garantir que qualquer saída seja enviada imediatamente
-    sys.stdout.reconfigure(line_buffering=True)
-    sys.stderr.reconfigure(line_buffering=True)
+    Retorna (valores, estado, meses_afetados): estado vai para o cache da última extração
+    (linhas, blocos, resumo_fixo, layout) e meses_afetados é None quando tudo foi processado.
+    As impressões digitais ficam em base64 (4 bytes por linha) para o cache JSON continuar leve.
+    Planilhas com mais de DIFF_MAX_ROWS linhas são processadas direto, sem estado.
+    Sem extração anterior aproveitável, as linhas são lidas e registradas durante a própria
+    passada de process_csv_rows: o resumo (on_summary) sai assim que as linhas dele são lidas,
+    antes do resto da planilha.
+    """
+    if plan is None:
+        plan = get_layout_plan()
+    if csv_content.count('\n') > DIFF_MAX_ROWS:
+        return process_csv(csv_content, on_month_block, plan, on_summary), None, None
+    
+    if previous and previous.get("layout") == plan.nome and previous.get("valores"):
+        rows = list(iter_csv_rows(io.StringIO(csv_content.strip())))
+        linhas = array.array('I', [row_fingerprint(row) for row in rows])
+        valores, afetados = reprocess_changed_blocks(rows, linhas, previous, plan, on_month_block, on_summary)
+        if valores is not None:
+            estado = {"linhas": encode_fingerprints(linhas), "blocos": previous["blocos"], "resumo_fixo": True,
+                      "layout": plan.nome}
+            return valores, estado, afetados
+    else:
+        rows = iter_csv_rows(io.StringIO(csv_content.strip()))
+        linhas = array.array('I')
     
+    blocos = []
+    # O resumo veio das células fixas se foi lido durante a passada (a busca genérica só roda no fim)
+    resumo = {"lendo": True, "fixo": plan.linhas_resumo == 0}
+    
+    def registrar_bloco(mes, mes_data, indice):
+        blocos.append((mes, indice))
+        if on_month_block:
+            on_month_block(mes, mes_data, indice)
+    
+    def registrar_resumo(valores):
+        resumo["fixo"] = resumo["lendo"]
+        if on_summary:
+            on_summary(valores)
+    
+    def ler_linhas():
+        if linhas:
+            yield from rows  # Já lidas e registradas para o diff
+        else:
+            registrar = linhas.append
+            for row in rows:
+                registrar(row_fingerprint(row))
+                yield row
+        resumo["lendo"] = False
+    
+    valores = process_csv_rows(ler_linhas(), registrar_bloco, plan, registrar_resumo)
+    estado = {"linhas": encode_fingerprints(linhas), "blocos": sorted(blocos, key=lambda bloco: bloco[1]), "resumo_fixo": resumo["fixo"], "layout": plan.nome}
+    return valores, estado, None
+
+def reprocess_changed_blocks(rows, linhas, previous, plan, on_month_block=None, on_summary=None):
+    """Recoletar só os meses e o resumo afetados pelas linhas alteradas
+    Retorna (valores, meses_afetados), ou (None, None) se for preciso processar tudo
+    """
+    if not previous.get("linhas") or not previous.get("resumo_fixo"):
+        return None, None
+    anteriores = array.array('I')
     try:
-        print("[GOOGLE SHEETS] Iniciando processo...", file=sys.stderr)
-        sys.stderr.flush()
+        anteriores.frombytes(base64.b64decode(previous["linhas"]))
+    except (binascii.Error, ValueError, TypeError):
+        return None, None
+    if len(anteriores) != len(linhas):
+        return None, None
+    
+    alteradas = [i for i, (nova, antiga) in enumerate(zip(linhas, anteriores)) if nova != antiga]
+    inicios = {i: mes for mes, i in previous["blocos"]}
+    coluna_mes = plan.coluna_mes
+    
+    # Um rótulo de mês novo, removido ou trocado muda os limites dos blocos: processar tudo
+    for i in alteradas:
+        row = rows[i]
+        label = row[coluna_mes].strip().upper() if len(row) > coluna_mes else ""
+        if (find_month(label) if label else None) != inicios.get(i):
+            return None, None
+    
+    valores = dict(previous["valores"])
+    valores["meses"] = dict(valores["meses"])
+    
+    # Resumo: relido das células fixas (são poucas linhas); se sumiu de lá, processar tudo
+    if any(i < plan.linhas_resumo for i in alteradas):
+        for campo in plan.new_values():
+            if campo != "meses":
+                valores[campo] = None
+                valores.pop(f"{campo}Negativo", None)
+        if not plan.process_summary(rows[:plan.linhas_resumo], valores):
+            return None, None
+        add_summary_cents(valores, plan)
+    if on_summary:
+        on_summary(valores)
+    
+    # Meses com algum bloco cuja janela (antes..depois da linha do mês) contém uma linha alterada
+    afetados = {mes for mes, inicio in previous["blocos"]
+                if any(inicio - plan.antes <= i <= inicio + plan.depois for i in alteradas)}
+    for mes in afetados:
+        blocos_mes = [inicio for nome, inicio in previous["blocos"] if nome == mes]
+        mes_data = plan.new_month(blocos_mes[0])
+        for inicio in blocos_mes:
+            janela = [(j, rows[j]) for j in range(max(0, inicio - plan.antes), min(len(rows), inicio + plan.depois + 1))]
+            plan.collect_month_block(janela, inicio, mes_data)
+            if on_month_block:
+                on_month_block(mes, mes_data, inicio)
+        valores["meses"][mes] = mes_data
+    
+    print(f"[GOOGLE SHEETS] Diff: {len(alteradas)} linha(s) alterada(s), {len(afetados)} mês(es) reprocessado(s)", file=sys.stderr)
+    return valores, afetados
+
+def diff_values(antigos, novos, meses=None):
+    """Lista de alterações entre duas extrações (resumo e linhas dos meses)
+    meses: só comparar estes meses (None compara todos, incluindo meses novos e removidos)
+    Cada item: {"type": "summary" | "month_added" | "month_removed" | "line", ...} com "old"/"new"
+    """
+    changes = []
+    
+    for campo in novos:
+        if campo == "meses" or campo.endswith(("Negativo", "Centavos")):
+            continue
+        if antigos.get(campo) != novos.get(campo):
+            change = {"type": "summary", "field": campo, "old": antigos.get(campo), "new": novos.get(campo)}
+            if f"{campo}Centavos" in novos:
+                change["old_cents"] = antigos.get(f"{campo}Centavos")
+                change["new_cents"] = novos.get(f"{campo}Centavos")
+            changes.append(change)
+    
+    meses_antigos = antigos.get("meses") or {}
+    meses_novos = novos.get("meses") or {}
+    if meses is None:
+        changes.extend({"type": "month_removed", "month": mes} for mes in meses_antigos if mes not in meses_novos)
+        changes.extend({"type": "month_added", "month": mes} for mes in meses_novos if mes not in meses_antigos)
+        meses = [mes for mes in meses_novos if mes in meses_antigos]
+    
+    for mes in sorted(meses, key=lambda nome: meses_novos[nome].get("indice", 0)):
+        linhas_antigas = list(month_lines(meses_antigos.get(mes) or {}))
+        linhas_novas = list(month_lines(meses_novos[mes]))
+        for posicao in range(max(len(linhas_antigas), len(linhas_novas))):
+            antiga = linhas_antigas[posicao] if posicao < len(linhas_antigas) else {}
+            nova = linhas_novas[posicao] if posicao < len(linhas_novas) else {}
+            for campo in ("upa", "valor_nf", "valor_recebido", "data", "situacao"):
+                if antiga.get(campo) == nova.get(campo):
+                    continue
+                change = {
+                    "type": "line",
+                    "month": mes,
+                    "position": posicao,
+                    "upa": nova.get("upa") or antiga.get("upa"),
+                    "field": campo,
+                    "old": antiga.get(campo),
+                    "new": nova.get(campo)
+                }
+                if f"{campo}_centavos" in nova or f"{campo}_centavos" in antiga:
+                    change["old_cents"] = antiga.get(f"{campo}_centavos")
+                    change["new_cents"] = nova.get(f"{campo}_centavos")
+                changes.append(change)
+    
+    return changes
+
+class GenericLayoutSearch:
+    """Localizar, em streaming, a janela de linhas em torno da linha "VIVA RIO"
+    
+    Guarda 10 linhas antes e 9 depois da primeira linha "VIVA RIO EM ABERTO" (ou VIVA +
+    RIO + ABERTO) e, enquanto ela não aparece, da primeira linha com "VIVA RIO" — o
+    suficiente para a busca do cabeçalho (±10) e dos valores vizinhos (-3..+4).
+    """
+    
+    ANTES = 10
+    DEPOIS = 9
+    
+    def __init__(self):
+        self.anteriores = collections.deque(maxlen=self.ANTES)
+        self.forte = None   # [índice inicial, linhas, linhas que ainda faltam]
+        self.fraca = None
+    
+    def feed(self, i, row):
+        for captura in (self.forte, self.fraca):
+            if captura and captura[2] > 0:
+                captura[1].append(row)
+                captura[2] -= 1
+        
+        if self.forte is None:
+            texto = " ".join(row).upper()
+            if "VIVA RIO EM ABERTO" in texto or ("VIVA" in texto and "RIO" in texto and "ABERTO" in texto):
+                self.forte = self._capture(i, row)
+            elif self.fraca is None and "VIVA RIO" in texto:
+                self.fraca = self._capture(i, row)
+        
+        self.anteriores.append((i, row))
+    
+    def _capture(self, i, row):
+        inicio = self.anteriores[0][0] if self.anteriores else i
+        return [inicio, [linha for _, linha in self.anteriores] + [row], self.DEPOIS]
+    
+    def window(self):
+        """(índice da primeira linha, linhas) da janela escolhida, ou (0, None)"""
+        captura = self.forte or self.fraca
+        if captura is None:
+            return 0, None
+        return captura[0], captura[1]
+
+def process_generic_layout(rows, valores, offset=0):
+    """Busca genérica do resumo: linha "VIVA RIO", cabeçalho de meses próximo e valores vizinhos
+    rows pode ser só a janela em torno da linha "VIVA RIO"; offset é o índice da primeira linha dela
+    """
+    textos = [None] * len(rows)
+    
+    def row_text(i):
+        # Texto completo da linha em maiúsculas, montado uma única vez (células já são str)
+        if textos[i] is None:
+            textos[i] = " ".join(rows[i]).upper()
+        return textos[i]
+    
+    # Preferir "VIVA RIO EM ABERTO" (ou VIVA + RIO + ABERTO); senão a primeira linha com "VIVA RIO"
+    indice_viva_rio = -1
+    primeira_viva_rio = -1
+    for i in range(len(rows)):
+        texto = row_text(i)
+        if "VIVA RIO EM ABERTO" in texto or ("VIVA" in texto and "RIO" in texto and "ABERTO" in texto):
+            indice_viva_rio = i
+            print(f"[GOOGLE SHEETS] ✅ Linha 'VIVA RIO EM ABERTO' encontrada na linha {offset + i + 1}: {rows[i]}", file=sys.stderr)
+            break
+        if primeira_viva_rio == -1 and "VIVA RIO" in texto:
+            primeira_viva_rio = i
+    
+    if indice_viva_rio == -1 and primeira_viva_rio != -1:
+        indice_viva_rio = primeira_viva_rio
+        print(f"[GOOGLE SHEETS] ✅ Linha 'VIVA RIO' encontrada na linha {offset + indice_viva_rio + 1}: {rows[indice_viva_rio]}", file=sys.stderr)
+    
+    if indice_viva_rio == -1:
+        print("[GOOGLE SHEETS] ⚠️ Linha 'VIVA RIO EM ABERTO' não encontrada no CSV", file=sys.stderr)
+        return
+    
+    valores["vivaRioEmAberto"] = "Encontrado"
+    linha_viva_rio = rows[indice_viva_rio]
+    
+    # Procurar cabeçalho com meses nas linhas próximas (até 10 linhas antes e depois)
+    header_row = None
+    for i in range(max(0, indice_viva_rio - 10), min(len(rows), indice_viva_rio + 10)):
+        texto = row_text(i)
+        if any(month in texto for month in ["SETEMBRO", "OUTUBRO", "NOVEMBRO", "TOTAL"]):
+            header_row = rows[i]
+            print(f"[GOOGLE SHEETS] ✅ Cabeçalho encontrado na linha {offset + i + 1}: {header_row}", file=sys.stderr)
+            break
+    
+    if header_row:
+        # Encontrar índices das colunas (primeira ocorrência de cada mês)
+        indices = {"setembro": -1, "outubro": -1, "novembro": -1, "total": -1}
+        for j, cell in enumerate(header_row):
+            cell_upper = str(cell).upper().strip()
+            if "SETEMBRO" in cell_upper and indices["setembro"] == -1:
+                indices["setembro"] = j
+            elif "OUTUBRO" in cell_upper and indices["outubro"] == -1:
+                indices["outubro"] = j
+            elif "NOVEMBRO" in cell_upper and indices["novembro"] == -1:
+                indices["novembro"] = j
+            elif "TOTAL" in cell_upper and indices["total"] == -1:
+                indices["total"] = j
+        
+        # Extrair valores da linha VIVA RIO
+        print(f"[GOOGLE SHEETS] Extraindo valores da linha VIVA RIO (índices: Set={indices['setembro']}, Out={indices['outubro']}, Nov={indices['novembro']}, Tot={indices['total']})", file=sys.stderr)
+        for chave, j in indices.items():
+            if j != -1 and j < len(linha_viva_rio):
+                valores[chave] = str(linha_viva_rio[j]).strip()
+    
+    # Se ainda não encontrou valores, procurar nas linhas próximas
+    if not all([valores["setembro"], valores["outubro"], valores["novembro"], valores["total"]]):
+        print("[GOOGLE SHEETS] Procurando valores nas linhas próximas...", file=sys.stderr)
+        for i in range(max(1, indice_viva_rio - 2), min(len(rows), indice_viva_rio + 5)):
+            # O contexto (mês) vem da linha anterior
+            prev_row_text = row_text(i - 1)
+            for j, cell in enumerate(rows[i]):
+                cell_clean = str(cell).strip()
+                if not cell_clean or not NUMERO_RE.search(cell_clean):
+                    continue
+                
+                if "SETEMBRO" in prev_row_text and not valores["setembro"]:
+                    valores["setembro"] = cell_clean
+                elif "OUTUBRO" in prev_row_text and not valores["outubro"]:
+                    valores["outubro"] = cell_clean
+                elif "NOVEMBRO" in prev_row_text and not valores["novembro"]:
+                    valores["novembro"] = cell_clean
+                elif "TOTAL" in prev_row_text and not valores["total"]:
+                    valores["total"] = cell_clean
+                else:
+                    continue
+                print(f"[GOOGLE SHEETS] Valor encontrado na linha {offset + i + 1}, coluna {j}: {cell_clean}", file=sys.stderr)
+
+# Layouts de planilha, descritos em dados e compilados em um LayoutPlan na primeira utilização.
+# Colunas por letra, linhas do resumo 1-based como na planilha, linhas dos blocos de meses
+# relativas à linha do mês (inclusive). Outros layouts podem ser adicionados sem mudar o código
+# em um JSON {nome: layout} indicado por GOOGLE_SHEETS_LAYOUTS_FILE.
+#   required_text: texto que identifica a aba certa no CSV exportado (quando o GID é desconhecido)
+#   month_blocks.fields: name (lista em mes_data), column, rows [início, fim], key (itens
+#       {"linha", key}; sem key, lista de textos), skip (textos ignorados), unique,
+#       skip_monetary, cents (adicionar "centavos" aos itens)
+#   summary.anchor: célula com o texto "contains" (o campo recebe "Encontrado")
+#   summary.values: rótulo "label" na célula label_cell e valor na coluna value_column
+#   fallback: busca usada quando o resumo não está nas células fixas (FALLBACK_SEARCHES)
+LAYOUTS = {
+    "relatorio_cylla": {
+        "required_text": "VIVA RIO",
+        "month_blocks": {
+            "label_column": "A",
+            "fields": [
+                {"name": "upas", "column": "B", "rows": [-1, 1], "unique": True, "skip_monetary": True},
+                {"name": "valores_nf", "column": "C", "rows": [-2, 2], "key": "valor", "skip": list(CABECALHOS_VALOR_NF), "cents": True},
+                {"name": "valores_recebidos", "column": "D", "rows": [-2, 2], "key": "valor", "cents": True},
+                {"name": "datas", "column": "E", "rows": [-2, 2], "key": "data"},
+                {"name": "situacoes", "column": "H", "rows": [-2, 1], "key": "situacao"}
+            ]
+        },
+        "summary": {
+            "anchor": {"field": "vivaRioEmAberto", "cell": "A33", "contains": "VIVA RIO"},
+            "values": [
+                {"field": "setembro", "label_cell": "A34", "label": "SETEMBRO", "value_column": "B"},
+                {"field": "outubro", "label_cell": "A35", "label": "OUTUBRO", "value_column": "B"},
+                {"field": "novembro", "label_cell": "A36", "label": "NOVEMBRO", "value_column": "B"},
+                {"field": "total", "label_cell": "A37", "label": "TOTAL", "value_column": "B"}
+            ]
+        },
+        "fallback": "viva_rio_nearby"
+    },
+}
+LAYOUTS_FILE = os.getenv('GOOGLE_SHEETS_LAYOUTS_FILE')
+
+# Buscas genéricas disponíveis para o "fallback" dos layouts: (busca em streaming, processamento da janela)
+FALLBACK_SEARCHES = {
+    "viva_rio_nearby": (GenericLayoutSearch, process_generic_layout),
+}
+
+CELULA_RE = re.compile(r'([A-Z]+)(\d+)')
+
+def column_index(coluna):
+    """Índice 0-based de uma coluna ("A", "H", "AA" ou já numérico)"""
+    if isinstance(coluna, int):
+        return coluna
+    indice = 0
+    for letra in coluna.strip().upper():
+        indice = indice * 26 + ord(letra) - ord('A') + 1
+    return indice - 1
+
+def column_letter(indice):
+    """Letra da coluna a partir do índice 0-based (0 -> "A", 26 -> "AA")"""
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+def cell_position(celula):
+    """(linha 0-based, coluna 0-based) de uma referência de célula como "A33" """
+    m = CELULA_RE.fullmatch(celula.strip().upper())
+    if not m:
+        raise ValueError(f"Célula inválida no layout: {celula}")
+    return int(m.group(2)) - 1, column_index(m.group(1))
+
+class LayoutPlan:
+    """Plano de extração compilado a partir de um layout de LAYOUTS
+    
+    A especificação é validada e convertida uma única vez em tuplas com índices prontos
+    (colunas, deslocamentos, tamanho das janelas), usadas por process_csv_rows na passada
+    única sobre as linhas.
+    """
+    
+    def __init__(self, nome, spec):
+        self.nome = nome
+        self.required_text = spec.get("required_text")
+        
+        blocos = spec.get("month_blocks") or {}
+        self.coluna_mes = column_index(blocos.get("label_column", "A"))
+        # (nome, coluna, início, fim, key, skip, unique, skip_monetary)
+        self.campos = []
+        self.campos_centavos = []
+        for campo in blocos.get("fields", []):
+            inicio, fim = campo["rows"]
+            if inicio > fim:
+                raise ValueError(f"Layout {nome}: intervalo de linhas inválido em {campo['name']}")
+            self.campos.append((
+                campo["name"],
+                column_index(campo["column"]),
+                inicio,
+                fim,
+                campo.get("key"),
+                frozenset(texto.upper() for texto in campo.get("skip", ())),
+                campo.get("unique", False),
+                campo.get("skip_monetary", False)
+            ))
+            if campo.get("cents"):
+                if not campo.get("key"):
+                    raise ValueError(f"Layout {nome}: 'cents' exige 'key' em {campo['name']}")
+                self.campos_centavos.append((campo["name"], campo["key"]))
+        
+        # Janela de linhas mantida para os blocos de meses
+        self.antes = max([-campo[2] for campo in self.campos] + [0])
+        self.depois = max([campo[3] for campo in self.campos] + [0])
+        self.tamanho_janela = self.antes + self.depois + 1
+        # Campos de cada linha do bloco, por deslocamento em relação à linha do mês:
+        # (nome, coluna, key, skip, unique, skip_monetary, cents)
+        com_centavos = {nome for nome, _ in self.campos_centavos}
+        self.campos_por_linha = {
+            d: tuple((campo[0], campo[1]) + campo[4:] + (campo[0] in com_centavos,)
+                     for campo in self.campos if campo[2] <= d <= campo[3])
+            for d in range(-self.antes, self.depois + 1)
+        }
+        # Texto -> centavos: as colunas de valores repetem muito os mesmos textos
+        self.cache_centavos = {}
+        
+        resumo = spec.get("summary") or {}
+        self.ancora = None
+        linhas = []
+        if resumo.get("anchor"):
+            ancora = resumo["anchor"]
+            linha, coluna = cell_position(ancora["cell"])
+            self.ancora = (ancora["field"], linha, coluna, ancora["contains"].upper(), ancora["cell"].upper())
+            linhas.append(linha)
+        # (campo, linha, coluna do rótulo, rótulo, coluna do valor, letra da coluna do valor)
+        self.valores_resumo = []
+        for item in resumo.get("values", []):
+            linha, coluna = cell_position(item["label_cell"])
+            self.valores_resumo.append((
+                item["field"], linha, coluna, item["label"].upper(),
+                column_index(item["value_column"]), str(item["value_column"]).upper()
+            ))
+            linhas.append(linha)
+        self.campos_resumo = [item[0] for item in self.valores_resumo]
+        self.linhas_resumo = max(linhas) + 1 if linhas else 0
+        
+        self.fallback = None
+        if spec.get("fallback"):
+            if spec["fallback"] not in FALLBACK_SEARCHES:
+                raise ValueError(f"Layout {nome}: busca desconhecida {spec['fallback']}")
+            self.fallback = FALLBACK_SEARCHES[spec["fallback"]]
+    
+    def new_values(self):
+        """Dicionário de valores vazio para o layout"""
+        valores = {}
+        if self.ancora:
+            valores[self.ancora[0]] = None
+        for campo in self.campos_resumo:
+            valores[campo] = None
+        valores["meses"] = {}  # Dados organizados por mês
+        return valores
+    
+    def new_month(self, i):
+        """Estrutura de um mês encontrado na linha i (0-based)"""
+        mes_data = {
+            "linha": i + 1,  # Linha no Excel (1-based)
+            "indice": i      # Índice no array (0-based)
+        }
+        for campo in self.campos:
+            mes_data[campo[0]] = []
+        return mes_data
+    
+    def collect_month_block(self, janela, i, mes_data):
+        """Coletar os dados do bloco do mês da linha i a partir da janela [(índice, linha), ...]
+        Os itens das colunas marcadas com "cents" já saem com "centavos"
+        """
+        campos_por_linha = self.campos_por_linha
+        cache_centavos = self.cache_centavos
+        for j, row in janela:
+            campos = campos_por_linha.get(j - i)
+            if not campos:
+                continue
+            tamanho = len(row)
+            for nome, coluna, chave, ignorar, unico, ignorar_monetarios, centavos in campos:
+                if tamanho <= coluna:
+                    continue
+                texto = row[coluna].strip()
+                if not texto or (ignorar and texto.upper() in ignorar):
+                    continue
+                
+                itens = mes_data[nome]
+                if chave is None:
+                    # Nomes repetidos (o caso comum) saem antes da verificação de valor monetário
+                    if unico and texto in itens:
+                        continue
+                    if ignorar_monetarios and is_monetary_value(texto):
+                        continue
+                    itens.append(texto)
+                else:
+                    if (unico and any(item[chave] == texto for item in itens)) or \
+                            (ignorar_monetarios and is_monetary_value(texto)):
+                        continue
+                    if centavos:
+                        try:
+                            valor_centavos = cache_centavos[texto]
+                        except KeyError:
+                            if len(cache_centavos) >= 100000:
+                                cache_centavos.clear()
+                            valor_centavos = cache_centavos[texto] = parse_brl_cents(texto)
+                        itens.append({"linha": j + 1, chave: texto, "centavos": valor_centavos})
+                    else:
+                        itens.append({"linha": j + 1, chave: texto})
+    
+    def process_summary(self, primeiras, valores):
+        """Ler o resumo nas células fixas; retorna True se algum valor foi encontrado"""
+        if self.ancora:
+            campo, linha, coluna, texto, celula = self.ancora
+            if len(primeiras) > linha and len(primeiras[linha]) > coluna and texto in primeiras[linha][coluna].strip().upper():
+                valores[campo] = "Encontrado"
+                print(f"[GOOGLE SHEETS] ✅ Linha {linha + 1} ({celula}) encontrada: '{primeiras[linha][coluna]}'", file=sys.stderr)
+        
+        for campo, linha, coluna, rotulo, coluna_valor, letra in self.valores_resumo:
+            if len(primeiras) <= linha:
+                continue
+            row = primeiras[linha]
+            if len(row) > max(coluna, coluna_valor) and rotulo in row[coluna].strip().upper():
+                valor = row[coluna_valor].strip()
+                valores[campo] = valor if valor else None
+                # Verificar se é negativo pelo valor
+                if valor and is_negative_value(valor):
+                    valores[f"{campo}Negativo"] = True
+                print(f"[GOOGLE SHEETS] ✅ {campo.capitalize()} encontrado na linha {linha + 1}, coluna {letra}: '{valor}'", file=sys.stderr)
+        
+        return any(valores[campo] for campo in self.campos_resumo)
+    
+    def start_fallback(self, primeiras):
+        """Iniciar a busca genérica com as linhas já lidas (None se o layout não tiver busca)"""
+        if self.fallback is None:
+            return None
+        busca = self.fallback[0]()
+        for j, linha in enumerate(primeiras):
+            busca.feed(j, linha)
+        return busca
+    
+    def finish_fallback(self, busca, valores):
+        """Aplicar a busca genérica sobre a janela encontrada"""
+        print("[GOOGLE SHEETS] ⚠️ Não encontrado nas linhas específicas, tentando busca genérica...", file=sys.stderr)
+        offset, linhas = busca.window()
+        if linhas is None:
+            print("[GOOGLE SHEETS] ⚠️ Linha 'VIVA RIO EM ABERTO' não encontrada no CSV", file=sys.stderr)
+        else:
+            self.fallback[1](linhas, valores, offset)
+
+def load_layouts_file(path):
+    """Adicionar a LAYOUTS os layouts do arquivo JSON {nome: layout}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            LAYOUTS.update(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"[GOOGLE SHEETS] Erro ao ler layouts de {path}: {e}", file=sys.stderr)
+
+if LAYOUTS_FILE:
+    load_layouts_file(LAYOUTS_FILE)
+
+# Planos já compilados, por nome de layout
+PLANOS_COMPILADOS = {}
+
+def get_layout_plan(layout=DEFAULT_LAYOUT):
+    """Plano compilado do layout (a compilação acontece uma vez por processo)"""
+    plano = PLANOS_COMPILADOS.get(layout)
+    if plano is None:
+        if layout not in LAYOUTS:
+            raise ValueError(f"Layout desconhecido: {layout}")
+        plano = PLANOS_COMPILADOS[layout] = LayoutPlan(layout, LAYOUTS[layout])
+    return plano
+
+# Extrações simultâneas no modo lote (--manifest ou comando "batch" do --serve)
+DEFAULT_BATCH_WORKERS = int(os.getenv('GOOGLE_SHEETS_BATCH_WORKERS', '4'))
+
+def load_manifest(path):
+    """Ler o manifesto do modo lote ("-" lê do stdin)
+    JSON com uma lista de entradas (ou {"entries": [...]}), por exemplo:
+      {"name": "viva-saude", "spreadsheet_id": "...", "tab": "RELATÓRIO CYLLA", "layout": "relatorio_cylla"}
+    Cada entrada precisa de "spreadsheet_id" e de "tab" e/ou "gid"
+    """
+    if path == '-':
+        manifest = json.load(sys.stdin)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest.get("entries", [])
+    return manifest
+
+def extract_entry(browser, entry, color_check=None):
+    """Extrair uma entrada do manifesto; o resultado leva o "name" da entrada"""
+    name = None
+    try:
+        name = entry.get("name") or entry.get("spreadsheet_id")
+        if not entry.get("spreadsheet_id"):
+            raise ValueError("entrada sem spreadsheet_id")
+        if entry.get("tab") is None and entry.get("gid") is None:
+            raise ValueError("entrada sem tab nem gid")
         
-        driver = setup_driver()
-        if not driver:
-            # Tentar método alternativo sem Selenium (apenas URL de exportação)
-            print("[GOOGLE SHEETS] Chrome não encontrado, tentando método alternativo (URL direta)...", file=sys.stderr)
-            sys.stderr.flush()
+        gid = entry.get("gid")
+        result = extract_financial_data(
+            browser,
+            color_check=color_check,
+            spreadsheet_id=entry["spreadsheet_id"],
+            tab_name=entry.get("tab"),
+            gid=str(gid) if gid is not None else None,
+            layout=entry.get("layout", DEFAULT_LAYOUT)
+        )
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": str(e),
+            "message": f"Erro geral: {e}"
+        }
+    
+    result["name"] = name
+    return result
+
+def extract_batch(entries, browser, max_workers=DEFAULT_BATCH_WORKERS, on_result=None, color_check=None):
+    """Extrair várias planilhas/abas em paralelo no mesmo processo
+    As exportações HTTP correm em paralelo; o Chrome (um só, compartilhado via LazyDriver)
+    é usado por uma extração de cada vez. on_result(resultado) é chamado assim que cada
+    entrada termina.
+    
+    Retorna os resultados na ordem do manifesto
+    """
+    print(f"[GOOGLE SHEETS] Extraindo {len(entries)} planilha(s) em lote ({max_workers} em paralelo)...", file=sys.stderr)
+    resultados = [None] * len(entries)
+    pendentes = list(enumerate(entries))
+    lock = threading.Lock()
+    
+    def worker():
+        while True:
+            with lock:
+                if not pendentes:
+                    return
+                i, entry = pendentes.pop(0)
+            
+            resultados[i] = extract_entry(browser, entry, color_check)
+            if on_result:
+                with lock:
+                    on_result(resultados[i])
+    
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(max_workers, len(entries))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    return resultados
+
+# Limites padrão para reciclar o Chrome no modo --serve
+DEFAULT_MAX_RUNS = 50
+DEFAULT_MAX_MEMORY_MB = 1024
+
+def get_browser_memory_mb(driver):
+    """Memória (RSS, em MB) do chromedriver e de todos os processos do Chrome
+    Lê /proc, portanto só funciona no Linux; retorna None nos demais sistemas
+    """
+    try:
+        root_pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    if not os.path.isdir('/proc'):
+        return None
+    
+    filhos = {}
+    rss_por_pid = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Campos após "(comm)": estado, ppid, ... rss é o 24º campo do arquivo
+        campos = stat.rsplit(')', 1)[1].split()
+        pid = int(entry)
+        filhos.setdefault(int(campos[1]), []).append(pid)
+        rss_por_pid[pid] = int(campos[21])
+    
+    total_paginas = 0
+    pendentes = [root_pid]
+    while pendentes:
+        pid = pendentes.pop()
+        total_paginas += rss_por_pid.get(pid, 0)
+        pendentes.extend(filhos.get(pid, []))
+    
+    return round(total_paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+def emit_json(payload):
+    """Escrever uma linha JSON no stdout (protocolo do script)"""
+    print(json.dumps(payload, ensure_ascii=False), file=sys.stdout)
+    sys.stdout.flush()
+
+def serve(url, max_runs=DEFAULT_MAX_RUNS, max_memory_mb=DEFAULT_MAX_MEMORY_MB, spreadsheet_id=SPREADSHEET_ID):
+    """Modo servidor: processo persistente falando JSON-lines via stdin/stdout
+    
+    Cada linha recebida no stdin é um comando JSON:
+      {"id": 1, "cmd": "extract"}   -> extrair dados (padrão se "cmd" for omitido); com
+                                       "events": true, os eventos de progresso ("phase",
+                                       "month_block", "summary", "reset") saem antes da
+                                       resposta, cada um com o mesmo "id"
+      {"id": 5, "cmd": "batch", "entries": [...]}
+                                    -> extrair várias planilhas (entradas do manifesto),
+                                       resposta com "results" na mesma ordem
+      {"id": 2, "cmd": "ping"}      -> verificar se o processo está vivo
+      {"id": 3, "cmd": "recycle"}   -> fechar o Chrome (reabre na próxima extração)
+      {"id": 4, "cmd": "shutdown"}  -> encerrar o processo
+    Cada resposta é uma linha JSON com o mesmo "id" (a de extract/batch com "event": "final").
+    
+    O Chrome (quando precisa ser aberto) e a planilha carregada são mantidos entre
+    extrações e o navegador é reciclado após max_runs extrações ou quando passa de
+    max_memory_mb.
+    """
+    browser = LazyDriver()
+    runs = 0
+    
+    print(f"[GOOGLE SHEETS] Modo servidor iniciado (máx. {max_runs} extrações ou {max_memory_mb} MB por navegador)", file=sys.stderr)
+    emit_json({"event": "ready", "pid": os.getpid()})
+    
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
             
             try:
-                spreadsheet_id = "10vaVp0DcgOfjWW3_vat7M8mRVvMiBdtU9kAlDmjEioc"
-                # Tentar diferentes GIDs
-                for gid in ['0', '1', '2', '3']:
-                    try:
-                        export_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}"
-                        req = urllib.request.Request(export_url)
-                        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-                        response = urllib.request.urlopen(req, timeout=10)
-                        csv_data = response.read().decode('utf-8')
-                        
-                        if csv_data and len(csv_data) > 50 and ',' in csv_data and not csv_data.strip().startswith('<'):
-                            valores = process_csv(csv_data)
-                            result = {
-                                "success": True,
-                                "message": "Dados extraídos via URL direta (sem Selenium)",
-                                "valores": valores,
-                                "method": "url_direct"
-                            }
-                            break
-                    except:
-                        continue
+                request = json.loads(line)
+            except ValueError as e:
+                emit_json({"id": None, "success": False, "error": f"Comando inválido: {e}"})
+                continue
+            
+            request_id = request.get("id")
+            cmd = request.get("cmd", "extract")
+            
+            if cmd == "ping":
+                emit_json({"id": request_id, "success": True, "runs": runs, "driver": browser.driver is not None,
+                           "http": HTTP_POOL.stats() if HTTP_POOL else None})
+                continue
+            
+            if cmd == "shutdown":
+                emit_json({"id": request_id, "success": True, "message": "Encerrando"})
+                break
+            
+            if cmd == "recycle":
+                browser.quit()
+                emit_json({"id": request_id, "success": True, "message": "Navegador reciclado"})
+                continue
+            
+            if cmd not in ("extract", "batch"):
+                emit_json({"id": request_id, "success": False, "error": f"Comando desconhecido: {cmd}"})
+                continue
+            
+            # Reciclar o navegador se atingiu os limites ou se a sessão morreu
+            if browser.driver:
+                memoria_mb = get_browser_memory_mb(browser.driver)
+                motivo = None
+                if runs >= max_runs:
+                    motivo = f"{runs} extrações"
+                elif memoria_mb is not None and memoria_mb > max_memory_mb:
+                    motivo = f"{memoria_mb} MB em uso"
+                elif not is_driver_alive(browser.driver):
+                    motivo = "sessão encerrada"
                 
-                if not result:
-                    result = {
-                        "success": False,
-                        "error": "Não foi possível configurar o driver do Chrome e método alternativo falhou",
-                        "message": "Erro ao inicializar Selenium e método alternativo"
+                if motivo:
+                    print(f"[GOOGLE SHEETS] Reciclando navegador ({motivo})...", file=sys.stderr)
+                    browser.quit()
+            
+            # Tentar iniciar o Chrome novamente se falhou numa extração anterior
+            browser.failed = False
+            had_driver = browser.driver is not None
+            
+            def run():
+                # O Chrome só é aberto se a exportação direta falhar (e fica aberto para as próximas)
+                if cmd == "batch":
+                    resultados = extract_batch(request.get("entries") or [], browser)
+                    return {
+                        "success": all(r.get("success") for r in resultados),
+                        "results": resultados
                     }
-            except Exception as alt_error:
+                sink = (lambda evento: emit_json({"id": request_id, **evento})) if request.get("events") else None
+                with event_sink(sink):
+                    return extract_financial_data(browser, url, reuse_page=True, spreadsheet_id=spreadsheet_id)
+            
+            try:
+                # Com GOOGLE_SHEETS_PROFILE, cada extração regrava o perfil (fica o da última)
+                if PROFILE_FILE:
+                    result = run_profiled(run, PROFILE_FILE)
+                    result["profile"] = PROFILE_FILE
+                else:
+                    result = run()
+            except Exception as e:
                 result = {
                     "success": False,
-                    "error": f"Chrome não encontrado e método alternativo falhou: {str(alt_error)}",
-                    "message": "Erro ao inicializar Selenium"
+                    "error": str(e),
+                    "message": f"Erro geral: {e}"
                 }
             
-            # Garantir que JSON vai para stdout
-            json_output = json.dumps(result, ensure_ascii=False)
-            print(json_output, file=sys.stdout)
-            sys.stdout.flush()
+            if browser.driver:
+                runs = runs + 1 if had_driver else 1
             
-            if not result.get("success"):
-                sys.exit(1)
+            result["id"] = request_id
+            result["event"] = "final"
+            result["daemon"] = {
+                "runs": runs,
+                "memory_mb": get_browser_memory_mb(browser.driver) if browser.driver else None
+            }
+            emit_json(result)
+    finally:
+        browser.quit()
+
+def run_profiled(func, path):
+    """Executar func() com cProfile e tracemalloc (GOOGLE_SHEETS_PROFILE)
+    Grava o perfil binário em path (abrir com pstats/snakeviz) e um resumo legível em
+    path + '.txt': funções por tempo acumulado, memória atual/pico e maiores alocações.
+    Só a thread principal é perfilada (as threads do download paralelo aparecem como espera).
+    """
+    import cProfile
+    import pstats
+    import tracemalloc
+    
+    tracemalloc.start()
+    perfil = cProfile.Profile()
+    try:
+        return perfil.runcall(func)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        atual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        try:
+            perfil.dump_stats(path)
+            with open(path + '.txt', 'w', encoding='utf-8') as f:
+                pstats.Stats(perfil, stream=f).sort_stats('cumulative').print_stats(40)
+                f.write(f"\nMemória: atual {atual / 1024:.0f} KB, pico {pico / 1024:.0f} KB\n\n")
+                for stat in snapshot.statistics('lineno')[:25]:
+                    f.write(f"{stat}\n")
+            print(f"[GOOGLE SHEETS] Perfil gravado em {path} (resumo em {path}.txt)", file=sys.stderr)
+        except OSError as e:
+            print(f"[GOOGLE SHEETS] Erro ao gravar perfil {path}: {e}", file=sys.stderr)
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Extrair dados financeiros do Google Sheets")
+    parser.add_argument("--serve", action="store_true",
+                        help="manter o processo (e o Chrome) vivo, recebendo comandos JSON-lines pelo stdin")
+    parser.add_argument("--max-runs", type=int, default=DEFAULT_MAX_RUNS,
+                        help="reciclar o navegador após N extrações (modo --serve)")
+    parser.add_argument("--max-memory-mb", type=float, default=DEFAULT_MAX_MEMORY_MB,
+                        help="reciclar o navegador quando a memória passar deste limite (modo --serve)")
+    parser.add_argument("--manifest", metavar="ARQUIVO",
+                        help="extrair as planilhas do manifesto JSON ('-' para stdin), uma linha JSON por entrada")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                        help="extrações simultâneas no modo --manifest")
+    parser.add_argument("--base-url", default=SHEETS_BASE_URL,
+                        help="endereço do Google Sheets (ex: http://127.0.0.1:8765 do fake_sheets_server.py)")
+    parser.add_argument("--spreadsheet-id", default=SPREADSHEET_ID,
+                        help="ID da planilha a extrair")
+    parser.add_argument("--snapshot-db", default=SNAPSHOT_DB, metavar="ARQUIVO",
+                        help="gravar cada extração bem-sucedida no histórico SQLite (ver snapshot_store.py)")
+    parser.add_argument("--events", action="store_true",
+                        help="saída NDJSON: eventos phase, month_block, summary e reset durante a extração e "
+                             "o resultado por último, com \"event\": \"final\"")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    global SHEETS_BASE_URL, SNAPSHOT_DB
+    args = parse_args()
+    SHEETS_BASE_URL = args.base_url.rstrip('/')
+    SNAPSHOT_DB = args.snapshot_db
+    spreadsheet_id = args.spreadsheet_id
+    url = spreadsheet_url(spreadsheet_id)
+    
+    browser = None
+    result = None
+    
+    # Garantir que qualquer saída seja enviada imediatamente
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+    
+    if args.serve:
+        try:
+            serve(url, max_runs=args.max_runs, max_memory_mb=args.max_memory_mb, spreadsheet_id=spreadsheet_id)
+        except KeyboardInterrupt:
+            pass
+        return
+    
+    try:
+        print("[GOOGLE SHEETS] Iniciando processo...", file=sys.stderr)
+        sys.stderr.flush()
+        
+        # O Chrome só é iniciado se a exportação direta não bastar
+        browser = LazyDriver()
+        
+        if args.manifest:
+            # Uma linha JSON por entrada, emitida assim que a entrada termina
+            entries = load_manifest(args.manifest)
+            run_batch = lambda: extract_batch(entries, browser, max_workers=args.workers, on_result=emit_json)
+            if PROFILE_FILE:
+                run_profiled(run_batch, PROFILE_FILE)
             else:
-                sys.exit(0)
+                run_batch()
+            return
         
-        print("[GOOGLE SHEETS] Driver configurado, extraindo dados...", file=sys.stderr)
-        sys.stderr.flush()
+        def extract():
+            # Com --events, cada evento de progresso é uma linha JSON no stdout, enviada assim que acontece
+            with event_sink(emit_json if args.events else None):
+                return extract_financial_data(browser, url, spreadsheet_id=spreadsheet_id)
         
-        result = extract_financial_data(driver, url)
+        if PROFILE_FILE:
+            result = run_profiled(extract, PROFILE_FILE)
+            result["profile"] = PROFILE_FILE
+        else:
+            result = extract()
+        if args.events:
+            result["event"] = "final"
         
         # Garantir que JSON vai para stdout (sem indent para evitar problemas)
         json_output = json.dumps(result, ensure_ascii=False)
@@ -976,6 +3186,8 @@ def main():
             "error": "Processo interrompido pelo usuário",
             "message": "Interrupção manual"
         }
+        if args.events:
+            result["event"] = "final"
         json_output = json.dumps(result, ensure_ascii=False)
         print(json_output, file=sys.stdout)
         sys.stdout.flush()
@@ -989,17 +3201,16 @@ def main():
             "message": f"Erro geral: {e}",
             "traceback": error_trace
         }
+        if args.events:
+            result["event"] = "final"
         # Garantir que JSON vai para stdout
         json_output = json.dumps(result, ensure_ascii=False)
         print(json_output, file=sys.stdout)
         sys.stdout.flush()
         sys.exit(1)
     finally:
-        if driver:
-            try:
-                driver.quit()
-            except:
-                pass
+        if browser:
+            browser.quit()
 
 if __name__ == "__main__":
     main()
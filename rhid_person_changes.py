@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Alterações entre exportações consecutivas de funcionários do RHID (downloads/person_*.csv)
+Da exportação anterior só fica um índice pequeno em JSON: por id_funcionario, o hash da linha
+inteira e os campos acompanhados (nome, departamento, cargo, horário, ativo, data de demissão).
+Na exportação nova, linhas com o mesmo hash são só contadas; as demais são convertidas e
+comparadas, gerando a lista de alterações:
+
+    {"type": "hired", "id_funcionario", "nome", "departamento", "cargo", "horario", "admissao"}
+    {"type": "dismissed" | "readmitted", "id_funcionario", "nome", "departamento", "demissao"}
+    {"type": "changed", "id_funcionario", "nome", "field", "old", "new"}
+    {"type": "removed", "id_funcionario", "nome", "departamento"}
+
+Sem índice anterior (primeira execução) o índice é criado e a lista vem vazia ("baseline": true).
+
+Uso:
+    python rhid_person_changes.py downloads/person_20251221224431.csv --index .sheets_cache/rhid/delta.json
+    python rhid_person_changes.py downloads/person_20251222080000.csv --index ... --dry-run --json
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+
+from rhid_person_export import build_converters, header_indices, open_person_export, parse_int, read_header
+
+INDEX_VERSION = 1
+
+# Campos guardados no índice, na ordem de cada entrada (depois do hash)
+TRACKED_FIELDS = ("nome", "departamento", "cargo", "horario", "ativo", "demissao")
+# Campos cuja alteração vira um item "changed" (demissão tem tipos próprios)
+CHANGE_FIELDS = ("departamento", "cargo", "horario", "ativo", "nome")
+
+RHID_INDEX_DIR = os.getenv('RHID_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sheets_cache', 'rhid'))
+
+def row_hash(row):
+    """Hash do conteúdo da linha inteira (todas as colunas)"""
+    return hashlib.blake2b("\x1f".join(row).encode('utf-8'), digest_size=8).hexdigest()
+
+def json_value(valor):
+    """Datas em ISO para o índice e o resultado JSON"""
+    return valor.isoformat() if isinstance(valor, datetime.date) else valor
+
+def load_index(path):
+    """Índice da exportação anterior (None se não existir ou for de outra versão)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[RHID] Índice {path} inválido, recriando: {e}", file=sys.stderr)
+        return None
+    if index.get("versao") != INDEX_VERSION:
+        return None
+    return index
+
+def save_index(path, index):
+    """Gravar o índice (escrita atômica via arquivo temporário)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def diff_export(path, index=None):
+    """Comparar a exportação em path com o índice anterior
+    Retorna (resultado, novo_indice); resultado tem "changes", "total", "unchanged" e "other_updates"
+    """
+    anteriores = (index or {}).get("funcionarios", {})
+    baseline = index is None
+    campos = ("id_funcionario",) + TRACKED_FIELDS + ("admissao",)
+    funcionarios = {}
+    changes = []
+    total = inalterados = outras = sem_id = 0
+
+    with open_person_export(path) as f:
+        delimiter, colunas = read_header(f)
+        if not colunas:
+            # Sem isso, um download vazio marcaria todos os funcionários como removidos
+            raise ValueError("exportação vazia")
+        indices = header_indices(colunas, campos)
+        conversores = build_converters(campos)
+        minimo = max(indices) + 1
+        posicao_id = indices[0]
+
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) < minimo:
+                if not any(valor.strip() for valor in row):
+                    continue
+                row = row + [''] * (minimo - len(row))
+            chave = row[posicao_id].strip()
+            if not chave:
+                sem_id += 1
+                continue
+            total += 1
+            hash_linha = row_hash(row)
+            anterior = anteriores.get(chave)
+            if anterior is not None and anterior[0] == hash_linha:
+                funcionarios[chave] = anterior
+                inalterados += 1
+                continue
+
+            # Linha nova ou alterada: só agora converter os campos
+            valores = [json_value(conversor(row[i])) for conversor, i in zip(conversores, indices)]
+            registro = dict(zip(campos, valores))
+            funcionarios[chave] = [hash_linha] + [registro[campo] for campo in TRACKED_FIELDS]
+            if baseline:
+                continue
+            if anterior is None:
+                changes.append({
+                    "type": "hired",
+                    "id_funcionario": registro["id_funcionario"],
+                    "nome": registro["nome"],
+                    "departamento": registro["departamento"],
+                    "cargo": registro["cargo"],
+                    "horario": registro["horario"],
+                    "admissao": registro["admissao"]
+                })
+                continue
+
+            antigo = dict(zip(TRACKED_FIELDS, anterior[1:]))
+            quantidade = len(changes)
+            if antigo["demissao"] != registro["demissao"] and not (antigo["demissao"] and registro["demissao"]):
+                changes.append({
+                    "type": "dismissed" if registro["demissao"] else "readmitted",
+                    "id_funcionario": registro["id_funcionario"],
+                    "nome": registro["nome"],
+                    "departamento": registro["departamento"],
+                    "demissao": registro["demissao"] or antigo["demissao"]
+                })
+            campos_alterados = CHANGE_FIELDS + (("demissao",) if antigo["demissao"] and registro["demissao"] else ())
+            for campo in campos_alterados:
+                if antigo[campo] != registro[campo]:
+                    changes.append({
+                        "type": "changed",
+                        "id_funcionario": registro["id_funcionario"],
+                        "nome": registro["nome"],
+                        "field": campo,
+                        "old": antigo[campo],
+                        "new": registro[campo]
+                    })
+            if len(changes) == quantidade:
+                outras += 1  # Mudou só alguma coluna não acompanhada
+
+    if not baseline:
+        for chave, anterior in anteriores.items():
+            if chave not in funcionarios:
+                antigo = dict(zip(TRACKED_FIELDS, anterior[1:]))
+                changes.append({"type": "removed", "id_funcionario": parse_int(chave),
+                                "nome": antigo["nome"], "departamento": antigo["departamento"]})
+
+    if sem_id:
+        print(f"[RHID] {sem_id} linha(s) sem id_funcionario ignorada(s) em {os.path.basename(path)}", file=sys.stderr)
+
+    novo_indice = {
+        "versao": INDEX_VERSION,
+        "arquivo": os.path.basename(path),
+        "atualizado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "funcionarios": funcionarios
+    }
+    resultado = {
+        "arquivo": os.path.basename(path),
+        "anterior": (index or {}).get("arquivo"),
+        "baseline": baseline,
+        "total": total,
+        "unchanged": inalterados,
+        "other_updates": outras,
+        "changes": changes
+    }
+    return resultado, novo_indice
+
+def update_index(path, index_path, dry_run=False):
+    """Comparar a exportação com o índice em index_path e (sem dry_run) substituir o índice"""
+    resultado, novo_indice = diff_export(path, load_index(index_path))
+    if not dry_run:
+        save_index(index_path, novo_indice)
+    return resultado
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Alterações entre exportações de funcionários do RHID")
+    parser.add_argument("file", help="exportação person_*.csv nova")
+    parser.add_argument("--index", help=f"índice da exportação anterior (padrão: {RHID_INDEX_DIR}/<empresa>.json)")
+    parser.add_argument("--system", default="rhid", help="nome do índice no diretório padrão (ex: delta, coop-vitta)")
+    parser.add_argument("--dry-run", action="store_true", help="não atualizar o índice")
+    parser.add_argument("--json", action="store_true", help="imprimir o resultado em JSON")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    args = parse_args()
+    index_path = args.index or os.path.join(RHID_INDEX_DIR, f"{args.system.lower()}.json")
+    try:
+        resultado = update_index(args.file, index_path, args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"[RHID] Erro ao comparar {args.file}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"[RHID] {resultado['arquivo']}: {resultado['total']} funcionários, {len(resultado['changes'])} alteração(ões), "
+          f"{resultado['unchanged']} sem alteração" + (" (índice criado)" if resultado["baseline"] else ""), file=sys.stderr)
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False))
+    else:
+        for change in resultado["changes"]:
+            detalhe = f"{change['field']}: {change['old']} -> {change['new']}" if change["type"] == "changed" else \
+                " ".join(str(change[campo]) for campo in ("departamento", "demissao", "admissao") if change.get(campo))
+            print(f"{change['type']:11} {change['id_funcionario']!s:>8} {change['nome'] or '-':40} {detalhe}")
+
+if __name__ == "__main__":
+    main()
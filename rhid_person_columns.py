@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabela colunar em memória dos funcionários do RHID (exportações downloads/person_*.csv)
+Cada campo vira uma coluna em array; os de baixa cardinalidade (empresa, departamento/UPA,
+cargo e horário/plantão, ex: NOITE-PAR/NOITE-IMPAR) são codificados em dicionário: a coluna
+guarda só o código inteiro de cada valor. Filtros e contagens por grupo rodam sobre os códigos
+(bytes.translate, zip e Counter em C), sem reler ou comparar strings.
+
+Uso:
+    python rhid_person_columns.py downloads/person_*.csv                      # ativos por UPA e plantão
+    python rhid_person_columns.py downloads/person_*.csv --by empresa cargo --all --json
+"""
+
+import argparse
+import array
+import collections
+import datetime
+import itertools
+import json
+import sys
+import time
+
+from rhid_person_export import iter_person_rows, open_person_export
+
+CATEGORICAL_FIELDS = ("empresa", "departamento", "cargo", "horario")
+BOOL_FIELDS = ("ativo",)
+DATE_FIELDS = ("admissao", "demissao")
+LOAD_FIELDS = ("id_funcionario", "nome") + CATEGORICAL_FIELDS + BOOL_FIELDS + DATE_FIELDS
+
+# Coluna booleana: 0 = falso, 1 = verdadeiro, 2 = vazio/não reconhecido
+BOOL_CODES = {False: 0, True: 1, None: 2}
+BOOL_VALUES = (False, True, None)
+
+class DictionaryColumn:
+    """Coluna codificada em dicionário: valores distintos em uma lista, códigos em um array
+    O array começa com 1 byte por linha ('B') e cresce para 'H'/'I' se houver muitos valores
+    """
+
+    def __init__(self):
+        self.valores = []    # código -> valor
+        self.codigos = {}    # valor -> código
+        self.dados = array.array('B')
+
+    def append(self, valor):
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+            if codigo == 0x100 or codigo == 0x10000:
+                self.dados = array.array('H' if codigo == 0x100 else 'I', self.dados)
+        self.dados.append(codigo)
+
+    def __len__(self):
+        return len(self.dados)
+
+    def codes_for(self, valores):
+        """Códigos dos valores pedidos (os que não aparecem na coluna são ignorados)"""
+        return {self.codigos[valor] for valor in valores if valor in self.codigos}
+
+    def mask(self, valores):
+        """Máscara (bytes 0/1 por linha) das linhas com algum dos valores"""
+        return code_mask(self.dados, self.codes_for(valores), len(self.valores))
+
+def code_mask(dados, codigos, total_codigos):
+    """Máscara das linhas cujo código está em codigos; com 1 byte por código usa bytes.translate"""
+    if dados.typecode == 'B':
+        tabela = bytes(1 if codigo in codigos else 0 for codigo in range(256))
+        return dados.tobytes().translate(tabela)
+    tabela = bytes(1 if codigo in codigos else 0 for codigo in range(total_codigos))
+    return bytes(map(tabela.__getitem__, dados))
+
+def and_masks(mascaras):
+    """E lógico das máscaras (bytes 0/1) como inteiros grandes, em C"""
+    mascaras = list(mascaras)
+    if len(mascaras) == 1:
+        return mascaras[0]
+    tamanho = len(mascaras[0])
+    resultado = int.from_bytes(mascaras[0], 'big')
+    for mascara in mascaras[1:]:
+        resultado &= int.from_bytes(mascara, 'big')
+    return resultado.to_bytes(tamanho, 'big')
+
+class PersonColumns:
+    """Funcionários de uma ou mais exportações do RHID, em colunas
+
+    Colunas: id_funcionario e nome (listas), empresa/departamento/cargo/horario
+    (DictionaryColumn), ativo (array de 0/1/2) e admissao/demissao (ordinais de data, 0 = vazio)
+    """
+
+    def __init__(self):
+        self.id_funcionario = []
+        self.nome = []
+        self.categorias = {campo: DictionaryColumn() for campo in CATEGORICAL_FIELDS}
+        self.ativo = array.array('B')
+        self.datas = {campo: array.array('i') for campo in DATE_FIELDS}
+
+    def __len__(self):
+        return len(self.id_funcionario)
+
+    @classmethod
+    def from_exports(cls, paths):
+        """Carregar as exportações (ex: uma por empresa) em uma única tabela"""
+        tabela = cls()
+        for path in paths:
+            with open_person_export(path) as f:
+                tabela.extend(iter_person_rows(f, LOAD_FIELDS))
+        return tabela
+
+    def extend(self, linhas):
+        """Acrescentar linhas (tuplas na ordem de LOAD_FIELDS, como as de iter_person_rows)"""
+        ids, nomes = self.id_funcionario, self.nome
+        categorias = [self.categorias[campo].append for campo in CATEGORICAL_FIELDS]
+        ativo = self.ativo
+        datas = [self.datas[campo].append for campo in DATE_FIELDS]
+        for id_funcionario, nome, *resto in linhas:
+            ids.append(id_funcionario)
+            nomes.append(nome)
+            for append, valor in zip(categorias, resto):
+                append(valor)
+            ativo.append(BOOL_CODES.get(resto[4], 2))
+            for append, data in zip(datas, resto[5:]):
+                append(data.toordinal() if data else 0)
+
+    def mask(self, where):
+        """Máscara das linhas que atendem a where: {campo: valor ou lista de valores}
+        Campos aceitos: os categóricos e "ativo"; None seleciona os vazios
+        """
+        mascaras = []
+        for campo, valores in where.items():
+            if not isinstance(valores, (list, tuple, set, frozenset)):
+                valores = [valores]
+            if campo in self.categorias:
+                mascaras.append(self.categorias[campo].mask(valores))
+            elif campo in BOOL_FIELDS:
+                codigos = {BOOL_CODES[valor] for valor in valores if valor in BOOL_CODES}
+                mascaras.append(code_mask(self.ativo, codigos, len(BOOL_VALUES)))
+            else:
+                raise ValueError(f"Filtro não suportado no campo {campo}")
+        return and_masks(mascaras) if mascaras else None
+
+    def count(self, **where):
+        """Número de linhas que atendem ao filtro"""
+        mascara = self.mask(where)
+        return len(self) if mascara is None else mascara.count(1)
+
+    def rows(self, **where):
+        """Índices das linhas que atendem ao filtro"""
+        mascara = self.mask(where)
+        if mascara is None:
+            return range(len(self))
+        return list(itertools.compress(range(len(self)), mascara))
+
+    def column_codes(self, campo):
+        """Array de códigos e a função que decodifica um código, para group_count"""
+        if campo in self.categorias:
+            coluna = self.categorias[campo]
+            return coluna.dados, coluna.valores.__getitem__
+        if campo in BOOL_FIELDS:
+            return self.ativo, BOOL_VALUES.__getitem__
+        raise ValueError(f"Agrupamento não suportado no campo {campo}")
+
+    def group_count(self, by, **where):
+        """Contagem por grupo: {valor: n} com um campo em by, {(valor, valor, ...): n} com vários"""
+        if isinstance(by, str):
+            by = (by,)
+        colunas, decodificadores = zip(*(self.column_codes(campo) for campo in by))
+        chaves = colunas[0] if len(colunas) == 1 else zip(*colunas)
+        mascara = self.mask(where)
+        if mascara is not None:
+            chaves = itertools.compress(chaves, mascara)
+        contagem = collections.Counter(chaves)
+
+        if len(by) == 1:
+            decodificar = decodificadores[0]
+            return {decodificar(codigo): n for codigo, n in contagem.items()}
+        return {
+            tuple(decodificar(codigo) for decodificar, codigo in zip(decodificadores, chave)): n
+            for chave, n in contagem.items()
+        }
+
+    def active_headcount(self, by=("departamento", "horario")):
+        """Funcionários ativos por UPA e plantão (ou pelos campos de by)"""
+        return self.group_count(by, ativo=True)
+
+    def record(self, i):
+        """Linha i decodificada (datas em ISO), para exibição"""
+        registro = {"id_funcionario": self.id_funcionario[i], "nome": self.nome[i]}
+        for campo, coluna in self.categorias.items():
+            registro[campo] = coluna.valores[coluna.dados[i]]
+        registro["ativo"] = BOOL_VALUES[self.ativo[i]]
+        for campo, coluna in self.datas.items():
+            registro[campo] = datetime.date.fromordinal(coluna[i]).isoformat() if coluna[i] else None
+        return registro
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Contagens por grupo dos funcionários do RHID")
+    parser.add_argument("files", nargs="+", help="exportações person_*.csv (uma por empresa)")
+    parser.add_argument("--by", nargs="+", default=["departamento", "horario"],
+                        choices=list(CATEGORICAL_FIELDS + BOOL_FIELDS), help="campos do agrupamento")
+    parser.add_argument("--all", action="store_true", help="contar também os inativos")
+    parser.add_argument("--json", action="store_true", help="imprimir o resultado em JSON")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    args = parse_args()
+    try:
+        tabela = PersonColumns.from_exports(args.files)
+    except (OSError, ValueError) as e:
+        print(f"[RHID] Erro ao carregar as exportações: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    where = {} if args.all else {"ativo": True}
+    inicio = time.perf_counter()
+    contagem = tabela.group_count(args.by, **where)
+    duracao = (time.perf_counter() - inicio) * 1e6
+    print(f"[RHID] {len(tabela)} funcionários, {len(contagem)} grupos em {duracao:.0f} µs", file=sys.stderr)
+
+    linhas = []
+    for chave, n in sorted(contagem.items(), key=lambda item: (-item[1], str(item[0]))):
+        chave = chave if isinstance(chave, tuple) else (chave,)
+        linhas.append({**dict(zip(args.by, chave)), "total": n})
+
+    if args.json:
+        print(json.dumps(linhas, ensure_ascii=False, indent=2))
+    else:
+        for linha in linhas:
+            grupo = " / ".join(str(linha[campo]) if linha[campo] is not None else "-" for campo in args.by)
+            print(f"{grupo:60} {linha['total']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura em streaming das exportações de funcionários do RHID (downloads/person_*.csv)
+Os arquivos vêm com BOM, separados por ';', com campos entre aspas e ~75 colunas por funcionário.
+Só as colunas pedidas são lidas, linha a linha, para registros PersonRecord compactos
+(__slots__), com datas e booleanos já convertidos: a memória não cresce com o tamanho do arquivo.
+
+Campos (atributo: coluna do CSV):
+    id_funcionario: id_funcionario       departamento: Departamento
+    nome: Nome                           cargo: Cargo
+    empresa: Empresa                     horario: Horário de Trabalho
+    ativo: Ativo (bool)                  admissao / demissao: Data de Admissão / Demissão (date)
+
+Uso:
+    python rhid_person_export.py downloads/person_20251221224431.csv --fields nome departamento ativo
+    python rhid_person_export.py --latest downloads --json    # exportação mais recente, NDJSON
+"""
+
+import argparse
+import csv
+import datetime
+import glob
+import json
+import operator
+import os
+import sys
+
+# Atributo do registro -> (coluna do CSV, tipo)
+FIELDS = {
+    "id_funcionario": ("id_funcionario", "int"),
+    "nome": ("Nome", "text"),
+    "empresa": ("Empresa", "category"),
+    "departamento": ("Departamento", "category"),
+    "cargo": ("Cargo", "category"),
+    "horario": ("Horário de Trabalho", "category"),
+    "ativo": ("Ativo", "bool"),
+    "admissao": ("Data de Admissão", "date"),
+    "demissao": ("Data de Demissão", "date"),
+}
+
+DEFAULT_FIELDS = ("id_funcionario", "nome", "departamento", "cargo", "horario", "ativo", "admissao", "demissao")
+
+VERDADEIROS = frozenset(("1", "S", "SIM", "TRUE", "ATIVO", "ACTIVE"))
+FALSOS = frozenset(("", "0", "N", "NAO", "NÃO", "FALSE", "INATIVO", "INACTIVE"))
+
+class PersonRecord:
+    """Funcionário de uma exportação do RHID (campos fora da projeção ficam None)"""
+
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, id_funcionario=None, nome=None, empresa=None, departamento=None, cargo=None,
+                 horario=None, ativo=None, admissao=None, demissao=None):
+        self.id_funcionario = id_funcionario
+        self.nome = nome
+        self.empresa = empresa
+        self.departamento = departamento
+        self.cargo = cargo
+        self.horario = horario
+        self.ativo = ativo
+        self.admissao = admissao
+        self.demissao = demissao
+
+    def as_dict(self, fields=None):
+        """Dicionário serializável em JSON (datas em ISO)"""
+        resultado = {}
+        for campo in fields or self.__slots__:
+            valor = getattr(self, campo)
+            resultado[campo] = valor.isoformat() if isinstance(valor, datetime.date) else valor
+        return resultado
+
+    def __repr__(self):
+        return f"PersonRecord({self.id_funcionario!r}, {self.nome!r}, {self.departamento!r})"
+
+def parse_int(texto):
+    """Inteiro (id_funcionario); texto não numérico é mantido como está"""
+    texto = texto.strip()
+    try:
+        return int(texto)
+    except ValueError:
+        return texto or None
+
+def parse_bool(texto):
+    """Booleano da coluna Ativo ("1"/"0", "Sim"/"Não", ...); None se não reconhecido"""
+    texto = texto.strip().upper()
+    if texto in VERDADEIROS:
+        return True
+    if texto in FALSOS:
+        return False
+    return None
+
+def make_date_parser():
+    """Conversor de datas dd/mm/aaaa (ou aaaa-mm-dd) com cache: as exportações repetem muito as mesmas datas"""
+    cache = {}
+
+    def parse_date(texto):
+        try:
+            return cache[texto]
+        except KeyError:
+            pass
+        valor = texto.strip()
+        data = None
+        if valor:
+            for formato in ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y"):
+                try:
+                    data = datetime.datetime.strptime(valor, formato).date()
+                    break
+                except ValueError:
+                    continue
+        if len(cache) < 10000:
+            cache[texto] = data
+        return data
+
+    return parse_date
+
+def make_category_parser():
+    """Texto de baixa cardinalidade (departamento, cargo, ...): uma única instância por valor"""
+    cache = {}
+
+    def parse_category(texto):
+        try:
+            return cache[texto]
+        except KeyError:
+            valor = cache[texto] = texto.strip() or None
+            return valor
+
+    return parse_category
+
+def parse_text(texto):
+    """Texto sem espaços nas pontas (None se vazio)"""
+    return texto.strip() or None
+
+def build_converters(fields):
+    """Conversor de cada campo, na ordem de fields"""
+    parse_date = make_date_parser()
+    conversores = []
+    for campo in fields:
+        tipo = FIELDS[campo][1]
+        if tipo == "int":
+            conversores.append(parse_int)
+        elif tipo == "bool":
+            conversores.append(parse_bool)
+        elif tipo == "date":
+            conversores.append(parse_date)
+        elif tipo == "category":
+            conversores.append(make_category_parser())
+        else:
+            conversores.append(parse_text)
+    return conversores
+
+def normalize_header(texto):
+    """Nome de coluna para comparação (sem BOM, aspas e diferença de maiúsculas)"""
+    return texto.strip().lstrip('\ufeff').strip('"').strip().casefold()
+
+def detect_delimiter(linha):
+    """';' nas exportações do RHID; ',' ou tab se o arquivo foi salvo por outra ferramenta"""
+    if ';' in linha:
+        return ';'
+    if '\t' in linha:
+        return '\t'
+    return ','
+
+def read_header(f, delimiter=None):
+    """Ler o cabeçalho do arquivo aberto f: (delimitador, colunas); colunas vazio se o arquivo está vazio"""
+    cabecalho = f.readline()
+    if not cabecalho:
+        return delimiter or ';', []
+    delimiter = delimiter or detect_delimiter(cabecalho)
+    return delimiter, next(csv.reader([cabecalho], delimiter=delimiter), [])
+
+def header_indices(colunas, fields):
+    """Posição no cabeçalho da coluna de cada campo de fields
+    Levanta ValueError se algum campo for desconhecido ou se a coluna não estiver no cabeçalho
+    """
+    desconhecidos = [campo for campo in fields if campo not in FIELDS]
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(desconhecidos)}")
+
+    posicoes = {}
+    for i, coluna in enumerate(colunas):
+        posicoes.setdefault(normalize_header(coluna), i)
+
+    indices = []
+    ausentes = []
+    for campo in fields:
+        coluna = FIELDS[campo][0]
+        if normalize_header(coluna) in posicoes:
+            indices.append(posicoes[normalize_header(coluna)])
+        else:
+            ausentes.append(coluna)
+    if ausentes:
+        raise ValueError(f"Colunas ausentes na exportação: {', '.join(ausentes)}")
+    return indices
+
+def iter_person_rows(f, fields=DEFAULT_FIELDS, delimiter=None):
+    """Gerar tuplas com os valores (convertidos) de fields para cada funcionário do arquivo aberto f
+    Levanta ValueError se alguma coluna pedida não estiver no cabeçalho
+    """
+    fields = tuple(fields)
+    delimiter, colunas = read_header(f, delimiter)
+    if not colunas:
+        return
+    indices = header_indices(colunas, fields)
+    if not indices:
+        return
+
+    # itemgetter devolve sempre uma tupla (mesmo com um campo só) e extrai tudo em C
+    pegar = operator.itemgetter(*indices, indices[0]) if len(indices) == 1 else operator.itemgetter(*indices)
+    minimo = max(indices) + 1
+    conversores = build_converters(fields)
+    pares = tuple(zip(conversores, range(len(fields))))
+
+    for row in csv.reader(f, delimiter=delimiter):
+        if len(row) < minimo:
+            row = row + [''] * (minimo - len(row))
+        valores = pegar(row)
+        if not any(valores):
+            continue  # Linha em branco (ou sem nenhuma das colunas pedidas)
+        yield tuple(conversor(valores[i]) for conversor, i in pares)
+
+def open_person_export(path):
+    """Abrir a exportação descartando o BOM (utf-8-sig) e com newline='' para o módulo csv"""
+    return open(path, 'r', encoding='utf-8-sig', newline='')
+
+def iter_person_records(path, fields=DEFAULT_FIELDS, delimiter=None):
+    """Gerar um PersonRecord por funcionário da exportação em path, lendo só as colunas de fields"""
+    fields = tuple(fields)
+    with open_person_export(path) as f:
+        for valores in iter_person_rows(f, fields, delimiter):
+            yield PersonRecord(**dict(zip(fields, valores)))
+
+def load_person_records(path, fields=DEFAULT_FIELDS, delimiter=None):
+    """Lista de PersonRecord da exportação em path"""
+    return list(iter_person_records(path, fields, delimiter))
+
+def find_person_exports(directory='downloads'):
+    """Exportações person_*.csv do diretório, da mais recente para a mais antiga"""
+    arquivos = glob.glob(os.path.join(directory, 'person_*.csv'))
+    return sorted(arquivos, key=os.path.getmtime, reverse=True)
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Ler exportações de funcionários do RHID (person_*.csv)")
+    parser.add_argument("files", nargs="*", help="arquivos person_*.csv")
+    parser.add_argument("--latest", metavar="DIR", help="usar a exportação mais recente do diretório")
+    parser.add_argument("--fields", nargs="+", choices=list(FIELDS), default=list(DEFAULT_FIELDS),
+                        help="campos a ler (projeção)")
+    parser.add_argument("--json", action="store_true", help="imprimir um registro JSON por linha")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    args = parse_args()
+    arquivos = list(args.files)
+    if args.latest:
+        arquivos[:0] = find_person_exports(args.latest)[:1]
+    if not arquivos:
+        print("[RHID] Nenhuma exportação person_*.csv informada ou encontrada", file=sys.stderr)
+        sys.exit(1)
+
+    for arquivo in arquivos:
+        total = ativos = 0
+        try:
+            for registro in iter_person_records(arquivo, args.fields):
+                total += 1
+                ativos += registro.ativo is True
+                if args.json:
+                    print(json.dumps(registro.as_dict(args.fields), ensure_ascii=False))
+        except (OSError, ValueError) as e:
+            print(f"[RHID] Erro ao ler {arquivo}: {e}", file=sys.stderr)
+            sys.exit(1)
+        resumo = f"{total} registros" + (f", Ativos={ativos}" if "ativo" in args.fields else "")
+        print(f"[RHID] {os.path.basename(arquivo)}: {resumo}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -82,6 +82,7 @@ const systems = {
 // Estado da aplicação
 let autoRefreshInterval = null;
 const AUTO_REFRESH_INTERVAL = 24 * 60 * 60 * 1000; // 24 horas
+const FINANCEIRO_PARTIAL_RETRY = 5000; // Nova busca quando o financeiro chega parcial (5 segundos)
 
 // Buscar dados financeiros do Viva Saúde
 async function fetchFinanceiroVivaSaude() {
@@ -449,7 +450,10 @@ async function fetchFinanceiroVivaSaude() {
                                     });
                                 } else if (itemValor) {
                                     // Se não tem valor monetário na situação, usar o valor recebido
-                                    const valor = converterValor(itemValor.valor);
+                                    // (já convertido em centavos pelo extrator, quando disponível)
+                                    const valor = typeof itemValor.centavos === 'number'
+                                        ? itemValor.centavos / 100
+                                        : converterValor(itemValor.valor);
                                     if (valor > 0) {
                                         total += valor;
                                         valoresProcessados.push({
@@ -603,6 +607,11 @@ async function fetchFinanceiroVivaSaude() {
                 // Formatar valor total (usar valor do CSV se disponível, senão usar valorTotal)
                 let valorTotal = data.valores?.total || data.valorTotal || '0';
                 
+                // Usar o total em centavos do extrator, se disponível
+                if (typeof data.valores?.totalCentavos === 'number') {
+                    valorTotal = data.valores.totalCentavos / 100;
+                }
+                
                 // Limpar e formatar valor
                 if (typeof valorTotal === 'string') {
                     valorTotal = valorTotal.replace(/R\$\s*/g, '').trim();
@@ -630,8 +639,13 @@ async function fetchFinanceiroVivaSaude() {
             }
             
             if (statusEl) {
-                statusEl.textContent = 'Atualizado';
-                statusEl.style.color = '#10b981';
+                statusEl.textContent = data.partial ? 'Carregando meses...' : 'Atualizado';
+                statusEl.style.color = data.partial ? '#f59e0b' : '#10b981';
+            }
+            
+            // Resumo parcial (extração ainda lendo os meses): buscar de novo em instantes
+            if (data.partial) {
+                setTimeout(fetchFinanceiroVivaSaude, FINANCEIRO_PARTIAL_RETRY);
             }
             
             console.log('[FRONTEND] Dados financeiros atualizados:', data);
@@ -5,9 +5,8 @@ const fs = require('fs');
 const path = require('path');
 const https = require('https');
 const http = require('http');
-const { exec } = require('child_process');
-const { promisify } = require('util');
-const execAsync = promisify(exec);
+const { spawn } = require('child_process');
+const EventEmitter = require('events');
 require('dotenv').config();
 
 const app = express();
@@ -80,7 +79,8 @@ const cache = {
     // Cache de dados financeiros
     financeiro: {
         data: null,
-        timestamp: null
+        timestamp: null,
+        partial: null // Resumo e meses já recebidos da extração em andamento (eventos NDJSON)
     },
     // Configuração
     config: {
@@ -143,58 +143,338 @@ async function updateSystemCache(system) {
     }
 }
 
-// Função para atualizar cache financeiro em background
-async function updateFinanceiroCache() {
-    try {
-        console.log('[CACHE] Atualizando cache financeiro em background...');
+// Processo Python persistente (modo --serve): mantém o Chrome e a planilha abertos entre extrações
+// Pode ser desativado com FINANCEIRO_DAEMON=false (volta a executar o script a cada atualização)
+const USE_FINANCEIRO_DAEMON = process.env.FINANCEIRO_DAEMON !== 'false';
+const FINANCEIRO_TIMEOUT = 180000; // 3 minutos
+const RHID_DIFF_TIMEOUT = 30000;
+
+const financeiroDaemon = {
+    process: null,
+    ready: null,
+    nextId: 1,
+    pending: new Map(),
+    inflight: null
+};
+
+// Eventos de progresso do extrator (NDJSON, ver --events no script Python)
+const financeiroEvents = new EventEmitter();
+
+// Ler as linhas JSON (NDJSON) da saída do processo Python, chamando onMessage para cada objeto
+function readJsonLines(stream, onMessage) {
+    let buffer = '';
+    stream.setEncoding('utf-8');
+    stream.on('data', chunk => {
+        buffer += chunk;
+        let newline;
+        while ((newline = buffer.indexOf('\n')) !== -1) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (!line) continue;
+            
+            let message;
+            try {
+                message = JSON.parse(line);
+            } catch (parseError) {
+                console.error('[GOOGLE SHEETS] Linha inválida do processo Python:', line.substring(0, 200));
+                continue;
+            }
+            onMessage(message);
+        }
+    });
+}
+
+// Eventos que chegam antes do resultado final ("phase", "month_block", "summary", "reset")
+function isProgressEvent(message) {
+    return Boolean(message.event) && message.event !== 'final';
+}
+
+// Aplicar um evento de progresso: o resumo (A33-B37) e cada bloco de mês vão para
+// cache.financeiro.partial assim que são lidos, antes do fim da extração; "reset" descarta
+// o que já chegou (a leitura da resposta falhou no meio e o extrator vai tentar outra URL)
+function handleFinanceiroEvent(message) {
+    const partial = cache.financeiro.partial;
+    if (!partial) return;
+    
+    if (message.event === 'phase') {
+        if (message.status === 'end') {
+            console.log(`[GOOGLE SHEETS] Fase ${message.phase}: ${message.seconds}s`);
+        }
+    } else if (message.event === 'month_block') {
+        partial.valores.meses[message.month] = message.data;
+    } else if (message.event === 'summary') {
+        Object.assign(partial.valores, message.valores, { meses: partial.valores.meses });
+        partial.hasSummary = true;
+        console.log('[GOOGLE SHEETS] ✅ Resumo recebido antes do fim da extração');
+        financeiroEvents.emit('summary', partial);
+    } else if (message.event === 'reset') {
+        partial.valores = { meses: {} };
+        partial.hasSummary = false;
+        console.log('[GOOGLE SHEETS] ⚠️ Dados parciais descartados, extração recomeçando');
+    }
+}
+
+function resetFinanceiroDaemon(error) {
+    financeiroDaemon.process = null;
+    financeiroDaemon.ready = null;
+    for (const pending of financeiroDaemon.pending.values()) {
+        clearTimeout(pending.timer);
+        pending.reject(error);
+    }
+    financeiroDaemon.pending.clear();
+}
+
+function startFinanceiroDaemon() {
+    if (financeiroDaemon.ready) {
+        return financeiroDaemon.ready;
+    }
+    
+    const scriptPath = path.join(__dirname, 'google_sheets_extractor.py');
+    const pythonCommand = process.platform === 'win32' ? 'python' : 'python3';
+    
+    console.log('[GOOGLE SHEETS] Iniciando processo Python persistente (--serve)...');
+    const child = spawn(pythonCommand, [scriptPath, '--serve'], {
+        cwd: __dirname,
+        env: {
+            ...process.env,
+            PYTHONUNBUFFERED: '1'
+        },
+        stdio: ['pipe', 'pipe', 'inherit'] // Logs do Python (stderr) vão direto para o console
+    });
+    financeiroDaemon.process = child;
+    
+    financeiroDaemon.ready = new Promise((resolve, reject) => {
+        const readyTimer = setTimeout(() => {
+            reject(new Error('Timeout ao iniciar processo Python persistente'));
+            child.kill();
+        }, 30000);
+        
+        readJsonLines(child.stdout, message => {
+            if (message.event === 'ready') {
+                clearTimeout(readyTimer);
+                console.log(`[GOOGLE SHEETS] ✅ Processo Python persistente pronto (pid ${message.pid})`);
+                resolve(child);
+                return;
+            }
+            
+            const pending = financeiroDaemon.pending.get(message.id);
+            if (!pending) return;
+            if (isProgressEvent(message)) {
+                handleFinanceiroEvent(message);
+                return;
+            }
+            financeiroDaemon.pending.delete(message.id);
+            clearTimeout(pending.timer);
+            pending.resolve(message);
+        });
         
-        const scriptPath = path.join(__dirname, 'google_sheets_extractor.py');
-        const pythonCommand = process.platform === 'win32' ? 'python' : 'python3';
-        const fullCommand = `"${pythonCommand}" "${scriptPath}"`;
-        
-        const { stdout, stderr } = await Promise.race([
-            execAsync(fullCommand, {
-                maxBuffer: 10 * 1024 * 1024,
-                timeout: 600000,
-                cwd: __dirname,
-                env: {
-                    ...process.env,
-                    PYTHONUNBUFFERED: '1'
-                }
-            }),
-            new Promise((_, reject) => 
-                setTimeout(() => reject(new Error('Timeout: Script Python demorou mais de 3 minutos')), 180000)
-            )
-        ]);
+        const onExit = (reason) => {
+            clearTimeout(readyTimer);
+            const error = new Error(`Processo Python persistente encerrado (${reason})`);
+            console.log(`[GOOGLE SHEETS] ${error.message}`);
+            reject(error);
+            if (financeiroDaemon.process === child) {
+                resetFinanceiroDaemon(error);
+            }
+        };
+        child.on('exit', code => onExit(`código ${code}`));
+        child.on('error', err => onExit(err.message));
+        // Processo morto entre requisições: a escrita no stdin falha com EPIPE, que sem este
+        // handler viraria um 'error' não tratado e derrubaria o servidor
+        child.stdin.on('error', err => {
+            console.error(`[GOOGLE SHEETS] Erro ao enviar comando ao processo persistente: ${err.message}`);
+            if (financeiroDaemon.process === child) {
+                child.kill();
+                resetFinanceiroDaemon(err);
+            }
+        });
+    });
+    
+    return financeiroDaemon.ready;
+}
+
+async function requestFinanceiroDaemon(cmd = 'extract') {
+    const child = await startFinanceiroDaemon();
+    const id = financeiroDaemon.nextId++;
+    
+    return new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+            financeiroDaemon.pending.delete(id);
+            // Processo travado: encerrar para que a próxima chamada comece do zero
+            child.kill();
+            const error = new Error('Timeout: Script Python demorou mais de 3 minutos');
+            error.timeout = true;
+            reject(error);
+        }, FINANCEIRO_TIMEOUT);
+        
+        financeiroDaemon.pending.set(id, { resolve, reject, timer });
+        child.stdin.write(JSON.stringify({ id, cmd, events: true }) + '\n', error => {
+            if (error && financeiroDaemon.pending.delete(id)) {
+                clearTimeout(timer);
+                reject(error);
+            }
+        });
+    });
+}
+
+// Executar o script Python avulso (um processo por extração), lendo a saída NDJSON (--events)
+// timeoutMs: tempo máximo da execução (o que sobrou do prazo, quando é fallback do processo persistente)
+function execFinanceiroExtractor(timeoutMs = FINANCEIRO_TIMEOUT) {
+    const scriptPath = path.join(__dirname, 'google_sheets_extractor.py');
+    const pythonCommand = process.platform === 'win32' ? 'python' : 'python3';
+    
+    console.log(`[GOOGLE SHEETS] Executando: "${pythonCommand}" "${scriptPath}" --events`);
+    
+    return new Promise((resolve, reject) => {
+        const child = spawn(pythonCommand, [scriptPath, '--events'], {
+            cwd: __dirname,
+            env: {
+                ...process.env,
+                PYTHONUNBUFFERED: '1' // Desabilitar buffer do Python
+            },
+            stdio: ['ignore', 'pipe', 'inherit'] // Logs do Python (stderr) vão direto para o console
+        });
         
-        let result;
-        try {
-            const stdoutClean = stdout.trim();
-            const jsonMatch = stdoutClean.match(/\{[\s\S]*\}/);
-            const jsonString = jsonMatch ? jsonMatch[0] : stdoutClean;
-            
-            if (!jsonString || jsonString.length < 10) {
-                throw new Error('JSON não encontrado no stdout');
+        let result = null;
+        const timer = setTimeout(() => {
+            child.kill();
+            reject(new Error(`Timeout: Script Python demorou mais de ${Math.round(timeoutMs / 1000)} segundos`));
+        }, timeoutMs);
+        
+        readJsonLines(child.stdout, message => {
+            if (isProgressEvent(message)) {
+                handleFinanceiroEvent(message);
+            } else {
+                result = message;
             }
-            
-            result = JSON.parse(jsonString);
-        } catch (parseError) {
-            console.error('[CACHE] Erro ao parsear JSON:', parseError.message);
-            throw new Error(`Resposta inválida do script Python: ${parseError.message}`);
-        }
+        });
         
-        if (!result || typeof result !== 'object') {
-            throw new Error('Resposta do script Python não é um objeto válido');
+        child.on('error', error => {
+            clearTimeout(timer);
+            reject(error);
+        });
+        child.on('close', code => {
+            clearTimeout(timer);
+            if (result) {
+                resolve(result);
+            } else {
+                reject(new Error(`Script Python não retornou dados (código ${code}). Verifique os logs acima.`));
+            }
+        });
+    });
+}
+
+// Extrair dados financeiros: usa o processo persistente e cai para o script avulso em caso de falha.
+// Chamadas simultâneas (rota + atualização em background) compartilham a mesma extração.
+function runFinanceiroExtractor() {
+    if (financeiroDaemon.inflight) {
+        return financeiroDaemon.inflight;
+    }
+    
+    // Resumo e meses desta extração, preenchidos pelos eventos de progresso
+    cache.financeiro.partial = {
+        success: true,
+        partial: true,
+        hasSummary: false,
+        message: 'Extração em andamento',
+        valores: { meses: {} }
+    };
+    
+    financeiroDaemon.inflight = (async () => {
+        // Prazo único para a extração: o script avulso só usa o tempo que sobrar
+        const deadline = Date.now() + FINANCEIRO_TIMEOUT;
+        if (USE_FINANCEIRO_DAEMON) {
+            try {
+                return await requestFinanceiroDaemon();
+            } catch (error) {
+                if (error.timeout) {
+                    throw error; // Sem tempo para uma segunda tentativa
+                }
+                console.error('[GOOGLE SHEETS] ⚠️ Processo persistente falhou, executando script avulso:', error.message);
+            }
         }
-        
-        if (result.success === undefined) {
-            result.success = true;
+        const restante = deadline - Date.now();
+        if (restante <= 0) {
+            throw new Error('Timeout: Script Python demorou mais de 3 minutos');
         }
-        
-        cache.financeiro.data = result;
+        return execFinanceiroExtractor(restante);
+    })();
+    
+    return financeiroDaemon.inflight.finally(() => {
+        financeiroDaemon.inflight = null;
+        cache.financeiro.partial = null;
+    });
+}
+
+// Aguardar o resumo da extração em andamento ou o resultado final, o que vier primeiro
+// Retorna { partial } se o resumo chegou antes, ou { result } com o resultado final
+function waitForFinanceiroSummary(extraction) {
+    return new Promise((resolve, reject) => {
+        const onSummary = partial => resolve({ partial });
+        financeiroEvents.once('summary', onSummary);
+        extraction
+            .then(result => resolve({ result }), reject)
+            .finally(() => financeiroEvents.off('summary', onSummary));
+    });
+}
+
+// Encerrar o processo Python persistente junto com o servidor
+process.on('exit', () => {
+    if (financeiroDaemon.process) {
+        financeiroDaemon.process.kill();
+    }
+});
+
+// Guardar o resultado de uma extração financeira no cache (atualização em background ou
+// conclusão de uma extração que já respondeu com o resumo). Falhas não substituem o cache;
+// planilha sem alterações só renova a validade dos dados atuais
+function storeFinanceiroResult(result) {
+    if (!result || typeof result !== 'object') {
+        throw new Error('Resposta do script Python não é um objeto válido');
+    }
+    
+    if (result.success === undefined) {
+        result.success = true;
+    }
+    
+    // Tempo de cada fase da extração (ver "timings" no JSON do script Python)
+    if (result.timings) {
+        const fases = Object.entries(result.timings.phases || {})
+            .map(([fase, segundos]) => `${fase}=${segundos}s`)
+            .join(', ');
+        console.log(`[CACHE] Extração financeira em ${result.timings.total}s (${fases || 'sem fases'})`);
+    }
+    
+    if (!result.success) {
+        console.error('[CACHE] ❌ Extração financeira falhou, cache mantido:', result.error || result.message);
+        return;
+    }
+    
+    // Planilha sem alterações: só renovar a validade do cache atual
+    if (result.unchanged && cache.financeiro.data) {
         cache.financeiro.timestamp = Date.now();
+        console.log('[CACHE] ✅ Planilha sem alterações, cache financeiro renovado');
+        return;
+    }
+    
+    // Alterações em relação à extração anterior (ver "changes" no JSON do script Python)
+    if (Array.isArray(result.changes) && result.changes.length > 0) {
+        const meses = [...new Set(result.changes.map(change => change.month).filter(Boolean))];
+        console.log(`[CACHE] ${result.changes.length} alteração(ões) na planilha financeira${meses.length ? ` (meses: ${meses.join(', ')})` : ''}`);
+    }
+    
+    cache.financeiro.data = result;
+    cache.financeiro.timestamp = Date.now();
+    
+    console.log('[CACHE] ✅ Cache financeiro atualizado com sucesso');
+}
+
+// Função para atualizar cache financeiro em background
+async function updateFinanceiroCache() {
+    try {
+        console.log('[CACHE] Atualizando cache financeiro em background...');
         
-        console.log('[CACHE] ✅ Cache financeiro atualizado com sucesso');
+        storeFinanceiroResult(await runFinanceiroExtractor());
     } catch (error) {
         console.error('[CACHE] ❌ Erro ao atualizar cache financeiro:', error.message);
     }
@@ -527,6 +807,41 @@ function getPuppeteerOptions() {
     return options;
 }
 
+// Alterações em relação à exportação anterior do mesmo sistema (rhid_person_changes.py).
+// Só um índice pequeno (hash e campos acompanhados por funcionário) fica guardado entre as exportações.
+// Resolve null em caso de falha: as alterações são um complemento, não impedem o login.
+function diffRHIDExport(csvPath, systemName) {
+    const scriptPath = path.join(__dirname, 'rhid_person_changes.py');
+    const pythonCommand = process.platform === 'win32' ? 'python' : 'python3';
+    
+    return new Promise(resolve => {
+        const child = spawn(pythonCommand, [scriptPath, csvPath, '--system', systemName, '--json'], {
+            cwd: __dirname,
+            stdio: ['ignore', 'pipe', 'inherit']
+        });
+        
+        let output = '';
+        const timer = setTimeout(() => child.kill(), RHID_DIFF_TIMEOUT);
+        child.stdout.on('data', chunk => {
+            output += chunk;
+        });
+        child.on('error', error => {
+            clearTimeout(timer);
+            console.log(`[${systemName}] Erro ao comparar exportações: ${error.message}`);
+            resolve(null);
+        });
+        child.on('close', code => {
+            clearTimeout(timer);
+            try {
+                resolve(code === 0 ? JSON.parse(output) : null);
+            } catch (e) {
+                console.log(`[${systemName}] Resposta inválida do comparador de exportações: ${e.message}`);
+                resolve(null);
+            }
+        });
+    });
+}
+
 // Função para fazer login no RHID e exportar CSV (Coop Vitta e Delta)
 async function loginRHIDAndExportCSV(username, password, systemName = 'COOP-VITTA') {
     let browser = null;
@@ -871,6 +1186,12 @@ async function loginRHIDAndExportCSV(username, password, systemName = 'COOP-VITT
 
         console.log(`[${systemName}] CSV processado: ${data.length} registros, Ativos=${ativos}, Inativos=${inativos}`);
 
+        // Comparar com a exportação anterior antes de apagar o arquivo
+        const alteracoes = await diffRHIDExport(csvPath, systemName);
+        if (alteracoes && !alteracoes.baseline) {
+            console.log(`[${systemName}] ${alteracoes.changes.length} alteração(ões) desde ${alteracoes.anterior || 'a exportação anterior'}`);
+        }
+
         // Obter cookies antes de fechar o browser
         const cookies = await page.cookies();
 
@@ -891,7 +1212,8 @@ async function loginRHIDAndExportCSV(username, password, systemName = 'COOP-VITT
                 total: data.length,
                 ativos: ativos,
                 inativos: inativos,
-                headers: headers
+                headers: headers,
+                changes: alteracoes ? alteracoes.changes : null
             }
         };
     } catch (error) {
@@ -2637,83 +2959,41 @@ app.get('/api/financeiro/viva-saude', async (req, res) => {
         });
     }
     
+    // Extração já em andamento com o resumo lido: devolver o parcial (meses ainda chegando)
+    if (cache.financeiro.partial && cache.financeiro.partial.hasSummary) {
+        return res.json({
+            ...cache.financeiro.partial,
+            cached: false,
+            updating: true
+        });
+    }
+    
     // Se não há cache, fazer requisição síncrona (primeira vez)
-    let pythonProcess = null;
     try {
         console.log('[GOOGLE SHEETS] Iniciando extração via Python...');
         
-        // Executar script Python
-        const scriptPath = path.join(__dirname, 'google_sheets_extractor.py');
-        const pythonCommand = process.platform === 'win32' ? 'python' : 'python3';
-        
-        // Usar caminho absoluto e garantir que está correto
-        const fullCommand = `"${pythonCommand}" "${scriptPath}"`;
-        
-        console.log(`[GOOGLE SHEETS] Executando: ${fullCommand}`);
-        console.log(`[GOOGLE SHEETS] Script path: ${scriptPath}`);
-        console.log(`[GOOGLE SHEETS] Python command: ${pythonCommand}`);
-        
-        // Executar com opções mais robustas e tratamento de timeout
         const startTime = Date.now();
+        const extraction = runFinanceiroExtractor();
+        const first = await waitForFinanceiroSummary(extraction);
+        
+        // O resumo chegou antes do fim: responder já com ele e guardar o resultado completo depois
+        if (first.partial) {
+            console.log(`[GOOGLE SHEETS] Resumo disponível em ${Date.now() - startTime}ms, extração continua em background`);
+            extraction.then(storeFinanceiroResult).catch(err => {
+                console.error('[GOOGLE SHEETS] Erro ao concluir extração:', err.message);
+            });
+            return res.json({
+                ...first.partial,
+                cached: false,
+                updating: true
+            });
+        }
         
-        const { stdout, stderr } = await Promise.race([
-            execAsync(fullCommand, {
-                maxBuffer: 10 * 1024 * 1024, // 10MB buffer
-                timeout: 600000, // 10 minutos timeout (Render é muito lento e Google Sheets pode demorar)
-                cwd: __dirname, // Executar no diretório do projeto
-                env: {
-                    ...process.env,
-                    PYTHONUNBUFFERED: '1' // Desabilitar buffer do Python
-                }
-            }),
-            // Timeout manual adicional
-            new Promise((_, reject) => 
-                setTimeout(() => reject(new Error('Timeout: Script Python demorou mais de 3 minutos')), 180000)
-            )
-        ]);
+        const result = first.result;
         
         const elapsedTime = Date.now() - startTime;
         console.log(`[GOOGLE SHEETS] Script executado em ${elapsedTime}ms`);
         
-        // Logs do Python vão para stderr (usamos sys.stderr no script)
-        if (stderr && stderr.trim()) {
-            console.log('[GOOGLE SHEETS] Logs Python (stderr):');
-            // Mostrar apenas últimas 2000 linhas para não sobrecarregar
-            const stderrLines = stderr.split('\n');
-            const lastLines = stderrLines.slice(-50).join('\n');
-            console.log(lastLines);
-        }
-        
-        // Verificar se stdout está vazio
-        if (!stdout || !stdout.trim()) {
-            console.error('[GOOGLE SHEETS] ⚠️ stdout vazio!');
-            console.error('[GOOGLE SHEETS] stderr (últimas 20 linhas):', stderr.split('\n').slice(-20).join('\n'));
-            throw new Error('Script Python não retornou dados. Verifique os logs acima.');
-        }
-        
-        console.log(`[GOOGLE SHEETS] stdout recebido (${stdout.length} caracteres)`);
-        
-        // Parsear resultado JSON do stdout
-        let result;
-        try {
-            // Limpar stdout (remover logs que possam estar misturados)
-            const stdoutClean = stdout.trim();
-            // Tentar encontrar JSON no stdout (pode ter logs antes)
-            const jsonMatch = stdoutClean.match(/\{[\s\S]*\}/);
-            const jsonString = jsonMatch ? jsonMatch[0] : stdoutClean;
-            
-            if (!jsonString || jsonString.length < 10) {
-                throw new Error('JSON não encontrado no stdout');
-            }
-            
-            result = JSON.parse(jsonString);
-        } catch (parseError) {
-            console.error('[GOOGLE SHEETS] Erro ao parsear JSON:', parseError.message);
-            console.error('[GOOGLE SHEETS] stdout (primeiros 1000 chars):', stdout.substring(0, 1000));
-            console.error('[GOOGLE SHEETS] stdout (últimos 1000 chars):', stdout.substring(Math.max(0, stdout.length - 1000)));
-            throw new Error(`Resposta inválida do script Python: ${parseError.message}`);
-        }
-        
         console.log('[GOOGLE SHEETS] Resultado:', result.success ? '✅ Sucesso' : '❌ Falha');
         if (result.valores) {
             console.log('[GOOGLE SHEETS] Valores extraídos:', JSON.stringify(result.valores, null, 2));
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Histórico local (SQLite) das extrações da planilha financeira
+Cada extração bem-sucedida vira um snapshot: o resumo (A33-B37) e as linhas de cada bloco
+de mês (UPA, valor NF, valor recebido, data e situação), com os valores em centavos inteiros.
+
+Tabelas:
+    snapshots   (id, criado_em, spreadsheet_id, aba, layout, estagio, hash)
+    resumo      (snapshot_id, campo, valor, centavos, negativo)
+    linhas_mes  (snapshot_id, mes, linha_mes, posicao, linha, upa, valor_nf, valor_nf_centavos,
+                 valor_recebido, valor_recebido_centavos, data, situacao)
+
+Consultas (ex: recebido por UPA nos últimos 6 snapshots):
+    python snapshot_store.py --db .sheets_cache/snapshots.db received-per-upa --last 6
+    python snapshot_store.py --db .sheets_cache/snapshots.db summary --last 12 --json
+"""
+
+import argparse
+import contextlib
+import json
+import sqlite3
+import sys
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    criado_em TEXT NOT NULL,
+    spreadsheet_id TEXT NOT NULL,
+    aba TEXT,
+    layout TEXT,
+    estagio TEXT,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_planilha ON snapshots (spreadsheet_id, aba, criado_em);
+CREATE INDEX IF NOT EXISTS idx_snapshots_criado_em ON snapshots (criado_em);
+
+CREATE TABLE IF NOT EXISTS resumo (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    campo TEXT NOT NULL,
+    valor TEXT,
+    centavos INTEGER,
+    negativo INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (snapshot_id, campo)
+);
+
+CREATE TABLE IF NOT EXISTS linhas_mes (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    mes TEXT NOT NULL,
+    linha_mes INTEGER,
+    posicao INTEGER NOT NULL,
+    linha INTEGER,
+    upa TEXT,
+    valor_nf TEXT,
+    valor_nf_centavos INTEGER,
+    valor_recebido TEXT,
+    valor_recebido_centavos INTEGER,
+    data TEXT,
+    situacao TEXT,
+    PRIMARY KEY (snapshot_id, mes, posicao)
+);
+CREATE INDEX IF NOT EXISTS idx_linhas_mes_mes ON linhas_mes (mes, snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_linhas_mes_upa ON linhas_mes (upa, snapshot_id);
+"""
+
+# Cabeçalhos repetidos dentro dos blocos de mês (não são linhas de dados)
+CABECALHOS = {"VALOR RECEBIDO", "VALOR RECEDIDO", "DATA", "SITUAÇÃO", "SITUACAO",
+              "VALOR NF", "VALOR NF.", "VALORNF", "VALORNF."}
+
+def connect(path):
+    """Abrir (e criar, se preciso) o banco de snapshots"""
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def is_header(texto):
+    return texto.strip().upper() in CABECALHOS
+
+def month_lines(mes_data):
+    """Linhas de um bloco de mês: cada coluna sem vazios e cabeçalhos, pareadas por posição
+    (o mesmo pareamento da tabela de meses do dashboard)
+    """
+    def itens(campo, chave):
+        return [item for item in mes_data.get(campo) or []
+                if (item.get(chave) or "").strip() and not is_header(item[chave])]
+
+    upas = [upa.strip() for upa in mes_data.get("upas") or [] if upa and upa.strip()]
+    valores_nf = itens("valores_nf", "valor")
+    recebidos = itens("valores_recebidos", "valor")
+    datas = itens("datas", "data")
+    situacoes = itens("situacoes", "situacao")
+
+    for posicao in range(max(len(upas), len(valores_nf), len(recebidos), len(datas), len(situacoes))):
+        nf, recebido, data, situacao = (coluna[posicao] if posicao < len(coluna) else {}
+                                        for coluna in (valores_nf, recebidos, datas, situacoes))
+        yield {
+            "posicao": posicao,
+            "linha": recebido.get("linha") or nf.get("linha") or data.get("linha") or situacao.get("linha"),
+            "upa": upas[posicao] if posicao < len(upas) else None,
+            "valor_nf": nf.get("valor"),
+            "valor_nf_centavos": nf.get("centavos"),
+            "valor_recebido": recebido.get("valor"),
+            "valor_recebido_centavos": recebido.get("centavos"),
+            "data": data.get("data"),
+            "situacao": situacao.get("situacao"),
+        }
+
+def save_snapshot(path, result, spreadsheet_id, aba=None, layout=None, csv_hash=None):
+    """Gravar o resultado de uma extração bem-sucedida; retorna o id do snapshot
+    Se o último snapshot da planilha/aba tem o mesmo hash do CSV, nada é gravado e o retorno é None
+    (com atualizações a cada poucos minutos, o histórico ficaria cheio de cópias idênticas)
+    """
+    valores = result["valores"]
+    with contextlib.closing(connect(path)) as conn, conn:
+        if csv_hash:
+            ultimo = conn.execute(
+                "SELECT hash FROM snapshots WHERE spreadsheet_id = ? AND aba IS ? ORDER BY criado_em DESC, id DESC LIMIT 1",
+                (spreadsheet_id, aba)
+            ).fetchone()
+            if ultimo and ultimo["hash"] == csv_hash:
+                return None
+
+        cursor = conn.execute(
+            "INSERT INTO snapshots (criado_em, spreadsheet_id, aba, layout, estagio, hash) VALUES (?, ?, ?, ?, ?, ?)",
+            (time.strftime("%Y-%m-%dT%H:%M:%S"), spreadsheet_id, aba, layout, result.get("stage"), csv_hash)
+        )
+        snapshot_id = cursor.lastrowid
+
+        # Campos do resumo: tudo fora de "meses" e dos derivados <campo>Negativo/<campo>Centavos
+        conn.executemany(
+            "INSERT INTO resumo (snapshot_id, campo, valor, centavos, negativo) VALUES (?, ?, ?, ?, ?)",
+            [(snapshot_id, campo, valor, valores.get(f"{campo}Centavos"), int(bool(valores.get(f"{campo}Negativo"))))
+             for campo, valor in valores.items()
+             if campo != "meses" and not campo.endswith(("Negativo", "Centavos"))]
+        )
+
+        conn.executemany(
+            """INSERT INTO linhas_mes (snapshot_id, mes, linha_mes, posicao, linha, upa, valor_nf, valor_nf_centavos,
+                                       valor_recebido, valor_recebido_centavos, data, situacao)
+               VALUES (:snapshot_id, :mes, :linha_mes, :posicao, :linha, :upa, :valor_nf, :valor_nf_centavos,
+                       :valor_recebido, :valor_recebido_centavos, :data, :situacao)""",
+            [{"snapshot_id": snapshot_id, "mes": mes, "linha_mes": mes_data.get("linha"), **linha}
+             for mes, mes_data in (valores.get("meses") or {}).items()
+             for linha in month_lines(mes_data)]
+        )
+    return snapshot_id
+
+def latest_snapshots(conn, last=6, spreadsheet_id=None, aba=None):
+    """Os últimos `last` snapshots (mais recente primeiro), opcionalmente de uma planilha/aba"""
+    filtros, parametros = [], []
+    if spreadsheet_id:
+        filtros.append("spreadsheet_id = ?")
+        parametros.append(spreadsheet_id)
+    if aba:
+        filtros.append("aba = ?")
+        parametros.append(aba)
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    return [dict(row) for row in conn.execute(
+        f"SELECT * FROM snapshots {where} ORDER BY criado_em DESC, id DESC LIMIT ?", (*parametros, last)
+    )]
+
+def received_per_upa(conn, last=6, spreadsheet_id=None, aba=None, mes=None):
+    """Total recebido (centavos) por UPA em cada um dos últimos `last` snapshots"""
+    ids = [s["id"] for s in latest_snapshots(conn, last, spreadsheet_id, aba)]
+    if not ids:
+        return []
+    marcadores = ",".join("?" * len(ids))
+    filtro_mes = "AND l.mes = ?" if mes else ""
+    return [dict(row) for row in conn.execute(
+        f"""SELECT s.id AS snapshot_id, s.criado_em, l.upa,
+                   SUM(l.valor_recebido_centavos) AS recebido_centavos, COUNT(*) AS linhas
+            FROM linhas_mes l JOIN snapshots s ON s.id = l.snapshot_id
+            WHERE l.snapshot_id IN ({marcadores}) AND l.upa IS NOT NULL {filtro_mes}
+            GROUP BY s.id, l.upa
+            ORDER BY l.upa, s.criado_em, s.id""",
+        (*ids, mes.upper()) if mes else ids
+    )]
+
+def month_totals(conn, last=6, spreadsheet_id=None, aba=None):
+    """Totais de NF e recebido (centavos) por mês em cada um dos últimos `last` snapshots"""
+    ids = [s["id"] for s in latest_snapshots(conn, last, spreadsheet_id, aba)]
+    if not ids:
+        return []
+    return [dict(row) for row in conn.execute(
+        f"""SELECT s.id AS snapshot_id, s.criado_em, l.mes,
+                   SUM(l.valor_nf_centavos) AS nf_centavos, SUM(l.valor_recebido_centavos) AS recebido_centavos
+            FROM linhas_mes l JOIN snapshots s ON s.id = l.snapshot_id
+            WHERE l.snapshot_id IN ({",".join("?" * len(ids))})
+            GROUP BY s.id, l.mes
+            ORDER BY l.mes, s.criado_em, s.id""",
+        ids
+    )]
+
+def summary_history(conn, last=6, spreadsheet_id=None, aba=None):
+    """Valores do resumo (texto e centavos) em cada um dos últimos `last` snapshots"""
+    ids = [s["id"] for s in latest_snapshots(conn, last, spreadsheet_id, aba)]
+    if not ids:
+        return []
+    return [dict(row) for row in conn.execute(
+        f"""SELECT s.id AS snapshot_id, s.criado_em, r.campo, r.valor, r.centavos, r.negativo
+            FROM resumo r JOIN snapshots s ON s.id = r.snapshot_id
+            WHERE r.snapshot_id IN ({",".join("?" * len(ids))})
+            ORDER BY s.criado_em, s.id, r.campo""",
+        ids
+    )]
+
+def print_table(linhas):
+    """Imprimir uma lista de dicionários como tabela de texto"""
+    if not linhas:
+        print("(nenhum resultado)")
+        return
+    colunas = list(linhas[0].keys())
+    larguras = [max(len(str(c)), *(len(str(linha[c])) for linha in linhas)) for c in colunas]
+    print("  ".join(str(c).ljust(w) for c, w in zip(colunas, larguras)))
+    for linha in linhas:
+        print("  ".join(str(linha[c]).ljust(w) for c, w in zip(colunas, larguras)))
+
+CONSULTAS = {
+    "snapshots": lambda conn, args: latest_snapshots(conn, args.last, args.spreadsheet_id, args.tab),
+    "received-per-upa": lambda conn, args: received_per_upa(conn, args.last, args.spreadsheet_id, args.tab, args.month),
+    "months": lambda conn, args: month_totals(conn, args.last, args.spreadsheet_id, args.tab),
+    "summary": lambda conn, args: summary_history(conn, args.last, args.spreadsheet_id, args.tab),
+}
+
+def parse_args(argv=None):
+    """Ler argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Consultar o histórico de extrações da planilha financeira")
+    parser.add_argument("query", choices=sorted(CONSULTAS), help="consulta a executar")
+    parser.add_argument("--db", required=True, help="banco SQLite (GOOGLE_SHEETS_SNAPSHOT_DB do extrator)")
+    parser.add_argument("--last", type=int, default=6, help="quantidade de snapshots mais recentes")
+    parser.add_argument("--spreadsheet-id", help="só snapshots desta planilha")
+    parser.add_argument("--tab", help="só snapshots desta aba")
+    parser.add_argument("--month", help="só este mês (received-per-upa)")
+    parser.add_argument("--json", action="store_true", help="imprimir o resultado em JSON")
+    return parser.parse_args(argv)
+
+def main():
+    """Função principal"""
+    args = parse_args()
+    try:
+        with contextlib.closing(connect(args.db)) as conn:
+            linhas = CONSULTAS[args.query](conn, args)
+    except sqlite3.Error as e:
+        print(f"[SNAPSHOTS] Erro ao consultar {args.db}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(linhas, ensure_ascii=False, indent=2))
+    else:
+        print_table(linhas)
+
+if __name__ == "__main__":
+    main()
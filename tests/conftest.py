@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Configuração dos testes: módulos da raiz importáveis e caches do extrator em diretório temporário"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(RAIZ, 'tests', 'fixtures')
+
+sys.path.insert(0, RAIZ)
+# Antes de importar google_sheets_extractor: os caminhos dos caches são lidos na importação
+os.environ['GOOGLE_SHEETS_CACHE_DIR'] = tempfile.mkdtemp(prefix='sheets_cache_')
+os.environ.pop('GOOGLE_SHEETS_SNAPSHOT_DB', None)
+os.environ.pop('GOOGLE_SHEETS_PROFILE', None)
+
+# Cabeçalho de uma exportação person_*.csv do RHID (as reais têm ~75 colunas)
+RHID_HEADER = ['id_funcionario', 'Nome', 'Empresa', 'Departamento', 'Cargo', 'Horário de Trabalho',
+               'Ativo', 'Data de Admissão', 'Data de Demissão', 'Observação']
+
+def read_fixture(nome):
+    """Conteúdo de um arquivo de tests/fixtures (texto, sem tradução de fim de linha)"""
+    with open(os.path.join(FIXTURES_DIR, nome), encoding='utf-8', newline='') as f:
+        return f.read()
+
+def write_export(path, linhas, delimiter=';', cabecalho=RHID_HEADER):
+    """Gravar uma exportação no formato do RHID (BOM, campos entre aspas); retorna o caminho"""
+    texto = '\n'.join(delimiter.join(f'"{valor}"' for valor in linha) for linha in [cabecalho] + linhas)
+    path.write_text(texto + '\n', encoding='utf-8-sig')
+    return str(path)
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Caches em disco do extrator (GID, histórico das variantes, última extração) vazios para o teste"""
+    import google_sheets_extractor as extractor
+    for nome in ('GID_CACHE_FILE', 'EXPORT_STATS_FILE', 'LAST_RESULT_FILE'):
+        monkeypatch.setattr(extractor, nome, str(tmp_path / os.path.basename(getattr(extractor, nome))))
+    return tmp_path
+
+@pytest.fixture(scope='session')
+def relatorio_csv():
+    """Exportação CSV da aba 'RELATÓRIO CYLLA' (fixtures/relatorio_cylla.csv)"""
+    return read_fixture('relatorio_cylla.csv')
+
+@pytest.fixture
+def sheets_server(monkeypatch, relatorio_csv):
+    """Fábrica de FakeSheetsServer: sheets_server(sheets=None, **opções) sobe um servidor falso
+    (padrão: relatorio_csv no GID 0) e aponta SHEETS_BASE_URL do extrator para ele.
+    Retorna o servidor (URL em .base_url); todos são parados no fim do teste.
+    """
+    import google_sheets_extractor as extractor
+    from fake_sheets_server import FakeSheetsServer
+    servidores = []
+
+    def iniciar(sheets=None, **opcoes):
+        fake = FakeSheetsServer(sheets={"0": relatorio_csv} if sheets is None else sheets, **opcoes)
+        servidores.append(fake)
+        monkeypatch.setattr(extractor, "SHEETS_BASE_URL", fake.start())
+        return fake
+
+    yield iniciar
+    for fake in servidores:
+        fake.stop()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Modo lote: várias planilhas/abas do manifesto extraídas no mesmo processo"""
+
+import json
+
+import google_sheets_extractor as extractor
+
+def test_load_manifest(tmp_path):
+    entradas = [{"name": "a", "spreadsheet_id": "x", "gid": 0}]
+    lista = tmp_path / 'lista.json'
+    lista.write_text(json.dumps(entradas), encoding='utf-8')
+    objeto = tmp_path / 'objeto.json'
+    objeto.write_text(json.dumps({"entries": entradas}), encoding='utf-8')
+    assert extractor.load_manifest(str(lista)) == entradas
+    assert extractor.load_manifest(str(objeto)) == entradas
+
+def test_batch_results_follow_manifest_order(cache_dir, monkeypatch, sheets_server, relatorio_csv):
+    monkeypatch.setattr(extractor, "setup_driver", lambda *args, **kwargs: None)
+    entradas = [
+        {"name": "primeira", "spreadsheet_id": "planilha-a", "gid": 0},
+        {"name": "sem-id", "tab": "RELATÓRIO CYLLA"},
+        {"spreadsheet_id": "planilha-b", "tab": "RELATÓRIO CYLLA", "gid": "1"},
+        {"name": "sem-aba", "spreadsheet_id": "planilha-c"},
+    ]
+    recebidos = []
+    sheets_server({"0": relatorio_csv, "1": relatorio_csv})
+    resultados = extractor.extract_batch(entradas, extractor.LazyDriver(), max_workers=3,
+                                         on_result=recebidos.append, color_check="never")
+
+    assert [r["name"] for r in resultados] == ["primeira", "sem-id", "planilha-b", "sem-aba"]
+    assert [r["success"] for r in resultados] == [True, False, True, False]
+    assert "spreadsheet_id" in resultados[1]["error"]
+    assert "tab" in resultados[3]["error"]
+    assert resultados[0]["valores"] == resultados[2]["valores"] == extractor.process_csv(relatorio_csv)
+    assert sorted(r["name"] for r in recebidos) == sorted(r["name"] for r in resultados)
+
+class PageDriver:
+    """Driver falso com a URL aberta e a resposta da verificação de aba selecionada"""
+
+    def __init__(self, current_url, aba_ativa=False):
+        self.current_url = current_url
+        self.aba_ativa = aba_ativa
+
+    def execute_script(self, script, *args):
+        return self.aba_ativa
+
+def test_loaded_page_must_be_on_the_requested_tab():
+    base = "https://sheets.test/spreadsheets/d/planilha-a"
+    driver = PageDriver(f"{base}/edit#gid=5")
+    assert extractor.is_spreadsheet_loaded(driver, f"{base}/edit#gid=5")
+    assert not extractor.is_spreadsheet_loaded(driver, f"{base}/edit#gid=7")
+    assert not extractor.is_spreadsheet_loaded(driver, f"{base.replace('-a', '-b')}/edit#gid=5")
+    assert extractor.is_spreadsheet_loaded(PageDriver(f"{base}/edit?gid=5"), f"{base}/edit#gid=5")
+    # Sem gid na URL, vale a aba selecionada na página
+    assert extractor.is_spreadsheet_loaded(PageDriver(f"{base}/edit#gid=5", True), f"{base}/edit", "RELATÓRIO CYLLA")
+    assert not extractor.is_spreadsheet_loaded(PageDriver(f"{base}/edit#gid=5"), f"{base}/edit", "RELATÓRIO CYLLA")
+
+def test_gid_only_entry_is_not_searched_by_name(cache_dir, monkeypatch, sheets_server, relatorio_csv):
+    abertas = []
+    def load_spreadsheet_page(driver, url, tab_name=extractor.SHEET_TAB_NAME):
+        abertas.append((url, tab_name))
+        return "Problema de permissão detectado"
+    monkeypatch.setattr(extractor, "load_spreadsheet_page", load_spreadsheet_page)
+    xlsx = []
+    monkeypatch.setattr(extractor, "check_negative_cells_xlsx",
+                        lambda spreadsheet_id, valores, plan, tab_name, gid: xlsx.append((tab_name, gid)))
+    browser = extractor.LazyDriver(PageDriver("about:blank"))
+    fake = sheets_server({"7": relatorio_csv}, faults={"7": "503"})
+    falha = extractor.extract_financial_data(browser, spreadsheet_id="planilha-a", tab_name=None, gid="7",
+                                             color_check="never")
+    assert abertas == [(f"{fake.base_url}/spreadsheets/d/planilha-a/edit?usp=sharing#gid=7", None)]
+    assert not falha["success"]
+
+    del fake.faults["7"]
+    result = extractor.extract_financial_data(browser, spreadsheet_id="planilha-a", tab_name=None, gid="7",
+                                              color_check="xlsx")
+    assert result["success"]
+    assert xlsx == [(None, "7")]
+    assert extractor.get_last_result("planilha-a", "gid=7")["valores"] == result["valores"]
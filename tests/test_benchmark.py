@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Runner de benchmark: planilha sintética, comparação com a linha de base e primeira execução"""
+
+import json
+import os
+import subprocess
+import sys
+
+import benchmark_extractor as benchmark
+import google_sheets_extractor as extractor
+from conftest import RAIZ
+
+def test_synthetic_sheet_is_a_valid_report():
+    csv_content = benchmark.generate_sheet(200)
+    assert csv_content.count('\r\n') == 200
+    valores = extractor.process_csv(csv_content)
+    assert valores["totalCentavos"] == -620050
+    assert list(valores["meses"])[:3] == ["JANEIRO", "FEVEREIRO", "MARÇO"]
+
+def test_compare_counts_regressions(capsys):
+    resultado = {"p50_ms": 13.0, "p95_ms": 15.0, "rows_per_s": 1000, "peak_mb": 1.0}
+    resultados = {"rapido": resultado, "lento": resultado, "novo": resultado}
+    baseline = {"rapido": {"p50_ms": 12.0}, "lento": {"p50_ms": 10.0}}
+    assert benchmark.compare(resultados, baseline) == 1
+    assert "1.30x !" in capsys.readouterr().out
+
+def test_first_run_writes_the_baseline(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    processo = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, 'benchmark_extractor.py'), '--sizes', '50', '--only', 'cylla_50',
+         '--baseline', str(baseline)],
+        capture_output=True, text=True, timeout=120
+    )
+    assert processo.returncode == 0, processo.stderr
+    assert "não havia linha de base" in processo.stderr
+    resultados = json.loads(baseline.read_text(encoding='utf-8'))["results"]
+    assert resultados and all(nome.startswith('cylla_50') for nome in resultados)
+
+def test_json_output_still_fails_on_regression(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({"results": {"cylla_50": {"p50_ms": 0.0001}}}), encoding='utf-8')
+    processo = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, 'benchmark_extractor.py'), '--sizes', '50', '--only', 'cylla_50',
+         '--baseline', str(baseline), '--json'],
+        capture_output=True, text=True, timeout=120
+    )
+    assert processo.returncode == 1, processo.stderr
+    assert "cylla_50" in json.loads(processo.stdout)
+    assert "x !" in processo.stderr
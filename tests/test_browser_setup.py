@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Caminhos do Chrome/chromedriver em cache e opções do perfil rápido (sem abrir o navegador)"""
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+@pytest.fixture
+def instalacoes(tmp_path, monkeypatch):
+    """Chrome e chromedriver falsos; conta as chamadas a ChromeDriverManager().install()"""
+    chrome = tmp_path / 'chrome'
+    driver = tmp_path / 'chromedriver'
+    chrome.write_text('')
+    driver.write_text('')
+    chamadas = []
+
+    class FakeManager:
+        def install(self):
+            chamadas.append(1)
+            return str(driver)
+
+    monkeypatch.setattr(extractor, "DRIVER_CACHE_FILE", str(tmp_path / 'driver_paths.json'))
+    monkeypatch.setattr(extractor, "find_chrome_binary", lambda: str(chrome))
+    monkeypatch.setattr(extractor, "ChromeDriverManager", FakeManager)
+    return chrome, driver, chamadas
+
+def test_paths_are_resolved_once(instalacoes):
+    chrome, driver, chamadas = instalacoes
+    esperado = {"chrome_binary": str(chrome), "chromedriver": str(driver)}
+    assert extractor.resolve_browser_paths() == esperado
+    assert extractor.resolve_browser_paths() == esperado
+    assert chamadas == [1]
+
+    extractor.resolve_browser_paths(refresh=True)
+    assert chamadas == [1, 1]
+
+def test_missing_driver_is_resolved_again(instalacoes):
+    _, driver, chamadas = instalacoes
+    extractor.resolve_browser_paths()
+    driver.unlink()
+    extractor.resolve_browser_paths()
+    assert chamadas == [1, 1]
+
+def test_fast_profile_options(tmp_path):
+    normal = extractor.build_chrome_options()
+    rapido = extractor.build_chrome_options("/opt/chrome", fast=True, profile_dir=str(tmp_path))
+    assert normal.page_load_strategy == 'normal'
+    assert rapido.page_load_strategy == 'eager'
+    assert rapido.binary_location == "/opt/chrome"
+    assert f'--user-data-dir={tmp_path}' in rapido.arguments
+    assert rapido.experimental_options["prefs"]["profile.managed_default_content_settings.images"] == 2
+    assert '--headless' in normal.arguments and '--headless' in rapido.arguments
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""CSV montado a partir da grade lida do DOM: aspas e posição das linhas iguais às do export"""
+
+import csv
+import io
+
+import google_sheets_extractor as extractor
+
+def test_values_are_quoted():
+    linhas = [["VALOR", "R$ 1.234,56"], ['diz "oi"', "linha\nquebrada"]]
+    texto = extractor.rows_to_csv(linhas)
+    assert texto == 'VALOR,"R$ 1.234,56"\n"diz ""oi""","linha\nquebrada"\n'
+    assert list(csv.reader(io.StringIO(texto))) == linhas
+
+def test_matrix_keeps_row_positions():
+    celulas = [(2, 0, "VIVA RIO EM ABERTO"), (3, 1, "-R$ 10,00"), (0, 0, "MÊS"), (3, 0, "SETEMBRO")]
+    linhas = list(csv.reader(io.StringIO(extractor.matrix_to_csv(celulas))))
+    assert linhas == [["MÊS", ""], ["", ""], ["VIVA RIO EM ABERTO", ""], ["SETEMBRO", "-R$ 10,00"]]
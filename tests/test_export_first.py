@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Extração pela exportação HTTP primeiro: o Chrome só é iniciado se ela falhar"""
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+@pytest.fixture
+def chrome(monkeypatch):
+    """Conta as tentativas de abrir o Chrome (que sempre falham aqui)"""
+    chamadas = []
+    monkeypatch.setattr(extractor, "setup_driver", lambda *args, **kwargs: chamadas.append(1))
+    return chamadas
+
+def test_export_does_not_start_chrome(cache_dir, sheets_server, chrome):
+    sheets_server()
+    result = extractor.extract_financial_data(None, color_check="auto")
+    assert result["success"]
+    assert result["stage"] == "export"
+    assert chrome == []
+    assert "driver_setup" not in result["timings"]["phases"]
+    # A aba foi encontrada pela sondagem dos GIDs e fica em cache para a próxima vez
+    assert extractor.get_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME) == "0"
+
+def test_chrome_only_after_export_fails(cache_dir, monkeypatch, sheets_server, chrome):
+    monkeypatch.setattr(extractor, "EXPORT_DEADLINE", 1)
+    sheets_server(faults={"*": "html"})
+    result = extractor.extract_financial_data(None, color_check="auto")
+    assert not result["success"]
+    assert chrome == [1]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Histórico das variantes de exportação: ordenação, vantagem da mais confiável e disjuntor"""
+
+import time
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+CSV = "\n".join(f"{i},RELATÓRIO CYLLA,\"R$ {i}.000,00\",PAGO" for i in range(50)) + "\n"
+
+def url(gid, endpoint="export"):
+    if endpoint == "gviz":
+        return f"https://docs.google.com/spreadsheets/d/planilha/gviz/tq?tqx=out:csv&gid={gid}"
+    return f"https://docs.google.com/spreadsheets/d/planilha/export?format=csv&gid={gid}"
+
+def test_variants():
+    assert extractor.export_variant(url(7)) == "export:7"
+    assert extractor.export_variant(url(7, "gviz")) == "gviz:7"
+    assert extractor.export_variant("https://docs.google.com/spreadsheets/d/planilha/export?format=csv") == "export:-"
+
+def test_order_without_history_keeps_original_order():
+    urls = [url(1), url(1, "gviz"), url(2)]
+    assert extractor.order_export_urls(urls, {}) == (urls, None)
+
+def test_reliable_variant_goes_first_with_head_start(cache_dir):
+    urls = [url(1), url(2)]
+    # Duas rodadas: abaixo de CIRCUIT_FAILURES, a variante que falha ainda não é pulada
+    for _ in range(2):
+        extractor.update_export_stats("planilha", "aba", [(url(2), True, 0.4, None), (url(1), False, 2.0, "503")])
+    stats = extractor.load_export_stats("planilha", "aba")
+    assert stats["export:2"]["latency"] == pytest.approx(0.4)
+    assert stats["export:2"]["ok"] == pytest.approx(2, abs=0.01)
+
+    ordenadas, vantagem = extractor.order_export_urls(urls, stats)
+    assert ordenadas == [url(2), url(1)]
+    assert vantagem == pytest.approx(0.8)
+
+def test_circuit_opens_after_consecutive_failures(cache_dir):
+    urls = [url(1), url(2)]
+    for n in range(1, extractor.CIRCUIT_FAILURES + 1):
+        extractor.update_export_stats("planilha", "aba", [(url(1), False, 0.1, "503")])
+        variante = extractor.load_export_stats("planilha", "aba")["export:1"]
+        assert variante["consecutive_failures"] == n
+    assert variante["last_error"] == "503"
+    assert variante["open_until"] >= time.time() + extractor.CIRCUIT_BASE_SECONDS - 5
+
+    stats = extractor.load_export_stats("planilha", "aba")
+    assert extractor.order_export_urls(urls, stats)[0] == [url(2)]
+    # Todas com o disjuntor aberto: nenhuma é pulada
+    assert extractor.order_export_urls([url(1)], stats)[0] == [url(1)]
+
+    # Um sucesso fecha o disjuntor
+    extractor.update_export_stats("planilha", "aba", [(url(1), True, 0.1, None)])
+    variante = extractor.load_export_stats("planilha", "aba")["export:1"]
+    assert "open_until" not in variante
+    assert variante["consecutive_failures"] == 0
+
+def test_open_circuit_is_skipped_by_fetch(cache_dir, monkeypatch, sheets_server):
+    monkeypatch.setattr(extractor, "ADAPTIVE_EXPORT", True)
+    fake = sheets_server({"0": CSV}, faults={"2": "503"})
+    falha, valida = extractor.build_export_urls("planilha", ["2", "0"])[::2]
+    chave = ("planilha", "RELATÓRIO CYLLA")
+
+    for _ in range(extractor.CIRCUIT_FAILURES):
+        assert extractor.fetch_export_csv([falha], timeout=2, deadline=2, stats_key=chave) is None
+    assert extractor.load_export_stats(*chave)["export:2"]["open_until"] > time.time()
+
+    resposta = extractor.fetch_export_csv([falha, valida], timeout=2, deadline=2, stats_key=chave)
+    assert resposta["url"] == valida
+    assert fake.stats()["export:2:503"] == extractor.CIRCUIT_FAILURES
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Servidor falso do Google Sheets: fixtures, falhas por chave, latência, gzip e /__stats"""
+
+import gzip
+import json
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fake_sheets_server import FakeSheetsServer, parse_pairs
+
+CSV = "A,B\n1,2\n"
+
+def get(url, headers=None, timeout=5):
+    req = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as resposta:
+        return resposta.status, resposta.headers, resposta.read()
+
+def test_sheets_and_fixtures(tmp_path):
+    (tmp_path / "planilha").mkdir()
+    (tmp_path / "planilha" / "1.csv").write_text("da planilha", encoding="utf-8")
+    (tmp_path / "1.csv").write_text("de qualquer planilha", encoding="utf-8")
+    with FakeSheetsServer(fixtures_dir=str(tmp_path), sheets={"0": CSV}) as base_url:
+        assert get(f"{base_url}/spreadsheets/d/x/export?format=csv")[2] == CSV.encode()
+        assert get(f"{base_url}/spreadsheets/d/x/gviz/tq?tqx=out:csv&gid=0")[2] == CSV.encode()
+        assert get(f"{base_url}/spreadsheets/d/planilha/export?format=csv&gid=1")[2] == "da planilha".encode()
+        assert get(f"{base_url}/spreadsheets/d/outra/export?format=csv&gid=1")[2] == "de qualquer planilha".encode()
+        with pytest.raises(urllib.error.HTTPError) as erro:
+            get(f"{base_url}/spreadsheets/d/x/export?format=csv&gid=2")
+        assert erro.value.code == 404
+
+def test_most_specific_fault_wins():
+    fake = FakeSheetsServer(sheets={"0": CSV}, faults={"*": "500", "0": "html", "gviz:0": "503"})
+    with fake as base_url:
+        status, headers, corpo = get(f"{base_url}/spreadsheets/d/x/export?format=csv&gid=0")
+        assert status == 200 and corpo.startswith(b"<!DOCTYPE html>")
+        for url, codigo in ((f"{base_url}/spreadsheets/d/x/gviz/tq?gid=0", 503),
+                            (f"{base_url}/spreadsheets/d/x/export?format=csv&gid=7", 500)):
+            with pytest.raises(urllib.error.HTTPError) as erro:
+                get(url)
+            assert erro.value.code == codigo
+
+        # Falhas podem ser trocadas com o servidor rodando
+        fake.faults.clear()
+        assert get(f"{base_url}/spreadsheets/d/x/export?format=csv&gid=0")[2] == CSV.encode()
+        stats = json.loads(get(f"{base_url}/__stats")[2])
+    assert stats["export:0:html"] == 1
+    assert stats["gviz:0:503"] == 1
+    assert stats["export:7:500"] == 1
+    assert stats["export:0:200"] == 1
+    assert stats["bytes_sent"] > 0
+
+def test_timeout_and_latency():
+    fake = FakeSheetsServer(sheets={"0": CSV, "1": CSV}, faults={"1": "timeout:2"}, latency={"0": 0.3})
+    with fake as base_url:
+        inicio = time.monotonic()
+        get(f"{base_url}/spreadsheets/d/x/export?format=csv&gid=0")
+        assert time.monotonic() - inicio >= 0.3
+        with pytest.raises((socket.timeout, urllib.error.URLError)):
+            get(f"{base_url}/spreadsheets/d/x/export?format=csv&gid=1", timeout=0.3)
+    assert fake.stats()["export:1:timeout"] == 1
+
+def test_gzip_and_etag():
+    with FakeSheetsServer(sheets={"0": CSV * 100}) as base_url:
+        url = f"{base_url}/spreadsheets/d/x/export?format=csv&gid=0"
+        _, headers, corpo = get(url, {"Accept-Encoding": "gzip"})
+        assert headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(corpo) == (CSV * 100).encode()
+        with pytest.raises(urllib.error.HTTPError) as erro:
+            get(url, {"If-None-Match": headers["ETag"]})
+        assert erro.value.code == 304
+    with FakeSheetsServer(sheets={"0": CSV}, compress=False) as base_url:
+        _, headers, corpo = get(f"{base_url}/spreadsheets/d/x/export?format=csv&gid=0", {"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in headers and corpo == CSV.encode()
+
+def test_parse_pairs():
+    assert parse_pairs(["0=html", "gviz:2=timeout:10"], "--fault") == {"0": "html", "gviz:2": "timeout:10"}
+    with pytest.raises(SystemExit):
+        parse_pairs(["0"], "--fault")
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Corrida das URLs de exportação (fetch_export_csv) contra o servidor falso com falhas injetadas"""
+
+import time
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+CSV = "\n".join(f"{i},RELATÓRIO CYLLA,\"R$ {i}.000,00\",PAGO" for i in range(50)) + "\n"
+OUTRA_ABA = "\n".join(f"{i},OUTRA ABA,\"R$ {i},00\"" for i in range(50)) + "\n"
+
+@pytest.fixture
+def servidor(sheets_server):
+    fake = sheets_server({"0": CSV, "4": OUTRA_ABA},
+                         faults={"1": "html", "2": "503", "3": "timeout:5", "gviz:0": "500"})
+    return fake, fake.base_url
+
+def urls(base_url, *gids):
+    return [f"{base_url}/spreadsheets/d/planilha/export?format=csv&gid={gid}" for gid in gids]
+
+def test_valid_export_wins_over_failures(servidor):
+    _, base_url = servidor
+    tentativas = []
+    inicio = time.monotonic()
+    resposta = extractor.fetch_export_csv(urls(base_url, 1, 2, 3, 0), timeout=5, deadline=5,
+                                          required_text="RELATÓRIO CYLLA", attempts=tentativas)
+    # A URL presa em timeout não segura o resultado
+    assert time.monotonic() - inicio < 2
+    assert resposta["csv"] == CSV
+    assert resposta["url"].endswith("gid=0")
+    assert resposta["etag"]
+    assert resposta["not_modified"] is False
+
+    # As falhas que chegaram antes da vencedora ficam registradas com o motivo; a presa em timeout não
+    erros = {url.rsplit("=", 1)[1]: erro for url, _, _, erro in tentativas}
+    assert erros.pop("0") is None
+    assert erros.items() <= {("1", "html"), ("2", "503")}
+
+def test_wrong_tab_is_rejected(servidor):
+    _, base_url = servidor
+    tentativas = []
+    resposta = extractor.fetch_export_csv(urls(base_url, 4, 1), timeout=2, deadline=2,
+                                          required_text="RELATÓRIO CYLLA", attempts=tentativas)
+    assert resposta is None
+    assert sorted(erro for _, _, _, erro in tentativas) == ["html", "wrong_tab"]
+
+def test_deadline_when_nothing_answers(servidor):
+    _, base_url = servidor
+    inicio = time.monotonic()
+    assert extractor.fetch_export_csv(urls(base_url, 3), timeout=5, deadline=0.5) is None
+    assert time.monotonic() - inicio < 1.5
+
+def test_gviz_variant_errors(servidor):
+    export_url, gviz_url = extractor.build_export_urls("planilha", ["0"])
+    tentativas = []
+    assert extractor.fetch_export_csv([gviz_url], timeout=2, deadline=2, attempts=tentativas) is None
+    assert [(url, sucesso, erro) for url, sucesso, _, erro in tentativas] == [(gviz_url, False, "500")]
+    assert extractor.fetch_export_csv([gviz_url, export_url], timeout=2, deadline=2)["url"] == export_url
+
+def test_conditional_request_wins_with_304(servidor):
+    fake, base_url = servidor
+    export_url, = urls(base_url, 0)
+    primeira = extractor.fetch_export_csv([export_url], timeout=2, deadline=2)
+    anterior = {"url": export_url, "etag": primeira["etag"], "last_modified": None}
+
+    resposta = extractor.fetch_export_csv(urls(base_url, 2, 0), timeout=2, deadline=2, previous=anterior)
+    assert resposta["not_modified"] is True
+    assert resposta["csv"] is None
+    assert resposta["etag"] == primeira["etag"]
+    assert fake.stats()["export:0:304"] == 1
+
+    # ETag antigo: o CSV novo vem inteiro
+    fake.sheets["0"] = (CSV + "50,RELATÓRIO CYLLA,\"R$ 1,00\",PAGO\n").encode('utf-8')
+    resposta = extractor.fetch_export_csv([export_url], timeout=2, deadline=2, previous=anterior)
+    assert resposta["not_modified"] is False
+    assert resposta["etag"] != primeira["etag"]
+
+def test_unchanged_extraction_skips_processing(servidor, cache_dir, relatorio_csv):
+    fake, _ = servidor
+    fake.sheets["5"] = relatorio_csv.encode('utf-8')
+
+    def extrair():
+        return extractor.extract_financial_data(None, color_check="never", spreadsheet_id="planilha",
+                                                tab_name="RELATÓRIO CYLLA", gid="5")
+
+    primeira = extrair()
+    assert primeira["success"] and primeira["unchanged"] is False
+    segunda = extrair()
+    assert segunda["success"] and segunda["unchanged"] is True
+    assert segunda["valores"] == primeira["valores"]
+    # A URL que venceu a primeira corrida (export ou gviz) é pedida de forma condicional
+    requisicoes = fake.stats()
+    assert requisicoes.get("export:5:304", 0) + requisicoes.get("gviz:5:304", 0) == 1
+
+def test_attempt_sizes_in_timings(servidor):
+    _, base_url = servidor
+    timings = extractor.Timings()
+    extractor.TIMINGS_ATUAL.timings = timings
+    try:
+        extractor.fetch_export_csv(urls(base_url, 0, 2), timeout=2, deadline=2)
+    finally:
+        extractor.TIMINGS_ATUAL.timings = None
+    tamanhos = {tentativa["url"].rsplit("=", 1)[1]: tentativa["bytes"] for tentativa in timings.as_dict()["exports"]}
+    assert tamanhos["0"] == len(CSV.encode('utf-8'))
+    assert tamanhos.get("2", 0) == 0
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""GID da aba em cache: descartado só quando a resposta mostra que ele não é mais a aba"""
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+@pytest.mark.parametrize("stream", [False, True], ids=["csv", "stream"])
+@pytest.mark.parametrize("falha, mantido", [
+    ("503", True),
+    ("timeout:1", True),
+    ("html", False),
+    ("404", False),
+])
+def test_cached_gid_after_failure(cache_dir, monkeypatch, sheets_server, relatorio_csv, falha, mantido, stream):
+    monkeypatch.setattr(extractor, "EXPORT_DEADLINE", 1)
+    # Sem navegador: o estágio do Chrome falha na hora
+    monkeypatch.setattr(extractor, "setup_driver", lambda *args, **kwargs: None)
+    sheets_server({"2": relatorio_csv}, faults={"2": falha})
+    extractor.set_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME, "2")
+    result = extractor.extract_financial_data(None, color_check="never", stream=stream)
+    assert not result["success"]
+    gid = extractor.get_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME)
+    assert gid == ("2" if mantido else None)
+
+def test_cached_gid_is_used_and_kept(cache_dir, sheets_server, relatorio_csv):
+    sheets_server({"2": relatorio_csv})
+    extractor.set_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME, "2")
+    result = extractor.extract_financial_data(None, color_check="never")
+    assert result["success"]
+    assert "export_cached_gid" in result["timings"]["phases"]
+    assert extractor.get_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME) == "2"
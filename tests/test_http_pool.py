@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""HttpPool contra o servidor falso: gzip, keep-alive, erros como HTTPError, 304 e limite de tamanho"""
+
+import tracemalloc
+import urllib.error
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+CSV = "\n".join(f"{i},UPA {i},\"R$ {i}.000,00\",PAGO" for i in range(2000)) + "\n"
+# ~8 MB que viram poucos KB com gzip: um trecho da rede se expande ~1000x
+COMPRIMIVEL = "0,0\n" * (2 * 1024 * 1024)
+
+@pytest.fixture
+def servidor(sheets_server):
+    fake = sheets_server({"0": CSV, "2": COMPRIMIVEL}, faults={"1": "503"})
+    return fake, fake.base_url
+
+def url_export(base_url, gid):
+    return f"{base_url}/spreadsheets/d/planilha/export?format=csv&gid={gid}"
+
+def test_gzip_body_and_connection_reuse(servidor):
+    fake, base_url = servidor
+    pool = extractor.HttpPool()
+    for _ in range(3):
+        with pool.open(url_export(base_url, 0)) as resposta:
+            assert resposta.headers['Content-Encoding'] == 'gzip'
+            assert resposta.read().decode('utf-8') == CSV
+
+    stats = pool.stats()
+    assert stats["connections"] == 1
+    assert stats["reused"] == 2
+    assert stats["idle"] == 1
+    assert stats["body_bytes"] == 3 * len(CSV.encode('utf-8'))
+    assert stats["wire_bytes"] < stats["body_bytes"] / 3
+    assert fake.stats()["export:0:200"] == 3
+
+def test_line_iteration(servidor):
+    _, base_url = servidor
+    with extractor.HttpPool().open(url_export(base_url, 0)) as resposta:
+        linhas = [linha.decode('utf-8') for linha in resposta]
+    assert "".join(linhas) == CSV
+    assert len(linhas) == 2000
+
+def test_errors_raise_http_error(servidor):
+    _, base_url = servidor
+    pool = extractor.HttpPool()
+    with pytest.raises(urllib.error.HTTPError) as erro:
+        pool.open(url_export(base_url, 1))
+    assert erro.value.code == 503
+    with pytest.raises(urllib.error.HTTPError) as erro:
+        pool.open(f"{base_url}/nao/existe")
+    assert erro.value.code == 404
+    # Corpos de erro lidos até o fim: a conexão continua reaproveitável
+    with pool.open(url_export(base_url, 0)) as resposta:
+        assert resposta.read().decode('utf-8') == CSV
+    assert pool.stats()["connections"] == 1
+
+def test_conditional_request_not_modified(servidor):
+    _, base_url = servidor
+    pool = extractor.HttpPool()
+    with pool.open(url_export(base_url, 0)) as resposta:
+        resposta.read()
+        etag = resposta.headers['ETag']
+    with pytest.raises(urllib.error.HTTPError) as erro:
+        pool.open(url_export(base_url, 0), headers={'If-None-Match': etag})
+    assert erro.value.code == 304
+
+def test_response_size_limit(servidor):
+    _, base_url = servidor
+    # Corpo comprimido: o limite vale para os bytes descomprimidos, durante a leitura
+    pool = extractor.HttpPool(max_response_bytes=1000)
+    with pytest.raises(extractor.ResponseTooLarge):
+        with pool.open(url_export(base_url, 0)) as resposta:
+            resposta.read()
+    assert pool.stats()["idle"] == 0
+
+def test_size_limit_bounds_decompression(servidor):
+    _, base_url = servidor
+    pool = extractor.HttpPool(max_response_bytes=100_000)
+    tracemalloc.start()
+    try:
+        with pytest.raises(extractor.ResponseTooLarge):
+            with pool.open(url_export(base_url, 2)) as resposta:
+                assert resposta.headers['Content-Encoding'] == 'gzip'
+                assert int(resposta.headers['Content-Length']) < 100_000
+                while resposta.read(8192):
+                    pass
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # O corpo descomprimido nunca fica inteiro na memória (8 MB)
+    assert pico < 2 * 1024 * 1024
+
+def test_body_at_the_limit_is_accepted(servidor):
+    _, base_url = servidor
+    tamanho = len(COMPRIMIVEL)
+    with extractor.HttpPool(max_response_bytes=tamanho).open(url_export(base_url, 2)) as resposta:
+        assert resposta.read() == COMPRIMIVEL.encode()
+    with pytest.raises(extractor.ResponseTooLarge):
+        with extractor.HttpPool(max_response_bytes=tamanho - 1).open(url_export(base_url, 2)) as resposta:
+            resposta.read()
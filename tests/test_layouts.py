@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Layouts declarativos: validação da especificação e extração de uma planilha com outro formato"""
+
+import json
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+# Meses na coluna B com o valor na C; resumo no topo (A1/A2, valores na coluna C)
+LAYOUT = {
+    "required_text": "SALDO",
+    "month_blocks": {
+        "label_column": "B",
+        "fields": [
+            {"name": "valores", "column": "C", "rows": [0, 1], "key": "valor", "cents": True},
+        ]
+    },
+    "summary": {
+        "anchor": {"field": "titulo", "cell": "A1", "contains": "SALDO"},
+        "values": [{"field": "saldo", "label_cell": "A2", "label": "TOTAL", "value_column": "C"}]
+    }
+}
+
+CSV = "\n".join([
+    "SALDO DA UNIDADE,,",
+    "TOTAL,,\"-R$ 7,50\"",
+    ",JANEIRO,\"R$ 1,00\"",
+    ",,\"R$ 2,00\"",
+    ",FEVEREIRO,\"R$ 3,00\"",
+    ",,",
+]) + "\n"
+
+def test_custom_layout():
+    plano = extractor.LayoutPlan("saldo", LAYOUT)
+    valores = extractor.process_csv(CSV, plan=plano)
+    assert valores["titulo"] == "Encontrado"
+    assert valores["saldo"] == "-R$ 7,50"
+    assert valores["saldoCentavos"] == -750
+    assert list(valores["meses"]) == ["JANEIRO", "FEVEREIRO"]
+    assert [item["centavos"] for item in valores["meses"]["JANEIRO"]["valores"]] == [100, 200]
+    assert [item["valor"] for item in valores["meses"]["FEVEREIRO"]["valores"]] == ["R$ 3,00"]
+
+@pytest.mark.parametrize("alteracao, mensagem", [
+    (lambda spec: spec["month_blocks"]["fields"][0].update(rows=[2, 1]), "intervalo"),
+    (lambda spec: spec["month_blocks"]["fields"][0].pop("key"), "cents"),
+    (lambda spec: spec["summary"]["values"][0].update(label_cell="2A"), "Célula"),
+    (lambda spec: spec.update(fallback="nao_existe"), "busca"),
+])
+def test_invalid_layouts(alteracao, mensagem):
+    spec = json.loads(json.dumps(LAYOUT))
+    alteracao(spec)
+    with pytest.raises(ValueError, match=mensagem):
+        extractor.LayoutPlan("invalido", spec)
+
+def test_layouts_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(extractor, "LAYOUTS", dict(extractor.LAYOUTS))
+    monkeypatch.setattr(extractor, "PLANOS_COMPILADOS", {})
+    arquivo = tmp_path / 'layouts.json'
+    arquivo.write_text(json.dumps({"saldo": LAYOUT}), encoding='utf-8')
+    extractor.load_layouts_file(str(arquivo))
+    assert extractor.get_layout_plan("saldo") is extractor.get_layout_plan("saldo")
+    with pytest.raises(ValueError, match="desconhecido"):
+        extractor.get_layout_plan("nao_existe")
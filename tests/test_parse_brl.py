@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Valores em reais para centavos inteiros (parse_brl_cents) e detecção de negativos"""
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+@pytest.mark.parametrize("texto, centavos", [
+    ("R$ 1.234,56", 123456),
+    ("R$\xa01.234,56", 123456),
+    (" R$ 3,1 ", 310),
+    ("R$ 12", 1200),
+    ("R$ 1.234.567,89", 123456789),
+    ("1234,56", 123456),
+    ("1.000", 100000),
+    ("1,5", 150),
+    ("R$ 0,00", 0),
+    ("-R$ 10.000,00", -1000000),
+    ("R$ -1.200,50", -120050),
+    ("−R$ 7,00", -700),
+    ("(R$ 5,00)", -500),
+])
+def test_brl_to_cents(texto, centavos):
+    assert extractor.parse_brl_cents(texto) == centavos
+
+@pytest.mark.parametrize("texto", [None, "", "-", "abc", "R$ 1.23,00", "R$ 1,234", "VALOR RECEBIDO"])
+def test_not_brl(texto):
+    assert extractor.parse_brl_cents(texto) is None
+
+def test_negative_zero_keeps_the_sign():
+    # "-R$ 0,00" vira 0 centavos, mas continua sendo exibido como negativo
+    assert extractor.parse_brl_cents("-R$ 0,00") == 0
+    assert extractor.parse_brl("-R$ 0,00") == (True, 0)
+    assert extractor.is_negative_value("-R$ 0,00")
+    assert not extractor.is_negative_value("R$ 0,00")
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""process_csv deve devolver os mesmos valores do process_csv original (multi-varredura)
+Os valores esperados em fixtures/process_csv_baseline.json foram gravados com o process_csv
+do commit inicial; as chaves de centavos acrescentadas depois são ignoradas na comparação.
+"""
+
+import json
+import os
+
+import pytest
+
+import google_sheets_extractor as extractor
+from conftest import FIXTURES_DIR, read_fixture
+
+with open(os.path.join(FIXTURES_DIR, 'process_csv_baseline.json'), encoding='utf-8') as f:
+    BASELINE = json.load(f)
+
+def without_cents(valores):
+    """Valores sem as chaves *Centavos do resumo e "centavos" dos itens dos meses"""
+    resultado = {chave: valor for chave, valor in valores.items() if not chave.endswith('Centavos')}
+    meses = {}
+    for mes, dados in valores["meses"].items():
+        meses[mes] = {
+            campo: [{k: v for k, v in item.items() if k != 'centavos'} if isinstance(item, dict) else item for item in lista]
+            if isinstance(lista, list) else lista
+            for campo, lista in dados.items()
+        }
+    resultado["meses"] = meses
+    return resultado
+
+@pytest.mark.parametrize("nome", sorted(BASELINE))
+def test_process_csv_matches_baseline(nome):
+    assert without_cents(extractor.process_csv(read_fixture(nome))) == BASELINE[nome]
+
+@pytest.mark.parametrize("nome", sorted(BASELINE))
+def test_process_csv_incremental_full_pass_matches_baseline(nome):
+    valores, _, _ = extractor.process_csv_incremental(read_fixture(nome))
+    assert without_cents(valores) == BASELINE[nome]
+
+def test_summary_cents_are_added():
+    valores = extractor.process_csv(read_fixture('relatorio_cylla.csv'))
+    assert valores["setembroCentavos"] == -1000000
+    assert valores["novembroCentavos"] == -120050
+    assert valores["totalCentavos"] == -620050
+    janeiro = valores["meses"]["JANEIRO"]
+    assert [item["centavos"] for item in janeiro["valores_recebidos"]] == [None, 100000, 200000]
+
+def test_empty_csv():
+    valores = extractor.process_csv("")
+    assert without_cents(valores)["meses"] == {}
+    assert valores["setembro"] is None
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""process_csv_incremental: só os meses com linhas alteradas são recoletados, com o mesmo resultado"""
+
+import csv
+import io
+import random
+
+import pytest
+
+import google_sheets_extractor as extractor
+from conftest import read_fixture
+
+def read_rows(nome):
+    return list(csv.reader(io.StringIO(read_fixture(nome), newline='')))
+
+def to_csv(rows):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(rows)
+    return buf.getvalue()
+
+def run(rows, previous=None):
+    """Processar como o extrator: a extração anterior é {**estado, "valores": valores}"""
+    eventos = []
+    valores, estado, afetados = extractor.process_csv_incremental(
+        to_csv(rows), previous, on_month_block=lambda mes, dados, i: eventos.append(mes))
+    return valores, {**estado, "valores": valores}, afetados, eventos
+
+def test_only_changed_month_is_reprocessed():
+    rows = read_rows('relatorio_cylla.csv')
+    valores, anterior, afetados, eventos = run(rows)
+    assert afetados is None
+    assert "MARÇO" in eventos and "JANEIRO" in eventos
+
+    alteradas = [list(row) for row in rows]
+    linha = next(i for i, row in enumerate(alteradas) if row[0] == "MARÇO")
+    alteradas[linha][3] = "R$ 9.999,99"
+    novos, _, afetados, eventos = run(alteradas, anterior)
+    assert afetados == {"MARÇO"}
+    assert eventos == ["MARÇO"]
+    assert novos == extractor.process_csv(to_csv(alteradas))
+    assert novos["meses"]["JANEIRO"] is valores["meses"]["JANEIRO"]
+    assert novos != valores
+
+def test_summary_change_keeps_upper_months():
+    rows = read_rows('relatorio_cylla.csv')
+    valores, anterior, _, _ = run(rows)
+    alteradas = [list(row) for row in rows]
+    linha = next(i for i, row in enumerate(alteradas) if row[:1] == ["Total"])
+    alteradas[linha][1] = "R$ 1,00"
+    novos, _, afetados, eventos = run(alteradas, anterior)
+    # Só os blocos vizinhos ao resumo (no fim da planilha) são recoletados
+    assert "NOVEMBRO" in afetados
+    assert not afetados & {"JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO", "JULHO"}
+    assert set(eventos) == afetados
+    assert novos["total"] == "R$ 1,00"
+    assert novos["totalCentavos"] == 100
+    assert novos == extractor.process_csv(to_csv(alteradas))
+
+@pytest.mark.parametrize("mudanca", ["nova_linha", "rotulo_de_mes"])
+def test_structural_change_falls_back_to_full_pass(mudanca):
+    rows = read_rows('relatorio_cylla.csv')
+    _, anterior, _, _ = run(rows)
+    alteradas = [list(row) for row in rows]
+    if mudanca == "nova_linha":
+        alteradas.insert(3, ["", "UPA NOVA", "R$ 1,00", "", "", "", "", ""])
+    else:
+        linha = next(i for i, row in enumerate(alteradas) if row[0] == "ABRIL")
+        alteradas[linha][0] = "AGOSTO"
+    novos, _, afetados, _ = run(alteradas, anterior)
+    assert afetados is None
+    assert novos == extractor.process_csv(to_csv(alteradas))
+
+def test_random_edits_match_full_pass():
+    rows = read_rows('sintetico_200.csv')
+    _, anterior, _, _ = run(rows)
+    aleatorio = random.Random(20)
+    valores_possiveis = ["", "R$ 1,00", "-R$ 2,50", "PAGO", "UPA Z", "01/01/2025"]
+    for _ in range(30):
+        alteradas = [list(row) for row in rows]
+        for _ in range(aleatorio.randint(1, 4)):
+            row = alteradas[aleatorio.randrange(len(alteradas))]
+            if len(row) > 1:
+                row[aleatorio.randrange(1, len(row))] = aleatorio.choice(valores_possiveis)
+        novos, _, _, _ = run(alteradas, anterior)
+        assert novos == extractor.process_csv(to_csv(alteradas))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Esperas por sinais da página no lugar de sleeps fixos (lado Python, com um driver falso)"""
+
+import time
+
+import google_sheets_extractor as extractor
+
+class ScriptedDriver:
+    """Driver que devolve, a cada execute_script, o próximo valor da lista (o último se repete)"""
+
+    def __init__(self, *respostas):
+        self.respostas = list(respostas)
+        self.chamadas = 0
+
+    def execute_script(self, script, *args):
+        self.chamadas += 1
+        return self.respostas.pop(0) if len(self.respostas) > 1 else self.respostas[0]
+
+    def set_script_timeout(self, segundos):
+        pass
+
+    def execute_async_script(self, script, *args):
+        raise RuntimeError("script timeout")
+
+def test_first_paint_returns_as_soon_as_the_grid_appears():
+    driver = ScriptedDriver(None, None, "grid")
+    inicio = time.monotonic()
+    assert extractor.wait_for_first_paint(driver, timeout=5) == "grid"
+    assert time.monotonic() - inicio < 1
+    assert driver.chamadas == 3
+
+def test_permission_page_and_timeout():
+    assert extractor.wait_for_first_paint(ScriptedDriver("permission"), timeout=1) == "permission"
+    assert extractor.wait_for_first_paint(ScriptedDriver(None), timeout=0.3) is None
+
+def test_tab_active():
+    assert extractor.wait_for_tab_active(ScriptedDriver(False, True), "RELATÓRIO CYLLA", timeout=2) is True
+    assert extractor.wait_for_tab_active(ScriptedDriver(False), "RELATÓRIO CYLLA", timeout=0.3) is False
+
+def test_grid_stable_failure_does_not_raise():
+    assert extractor.wait_for_grid_stable(ScriptedDriver(None), timeout=0.3) is None
+
+def test_tab_search_is_skipped_when_the_url_has_the_gid(monkeypatch):
+    procuradas = []
+    monkeypatch.setattr(extractor, "wait_for_first_paint", lambda driver: "grid")
+    monkeypatch.setattr(extractor, "wait_for_grid_stable", lambda driver: 10)
+    monkeypatch.setattr(extractor, "select_sheet_tab", lambda driver, tab_name: procuradas.append(tab_name))
+    driver = ScriptedDriver(None)
+    driver.get = lambda url: None
+    url = extractor.spreadsheet_url("planilha")
+    assert extractor.load_spreadsheet_page(driver, url + "#gid=7", "RELATÓRIO CYLLA") is None
+    assert extractor.load_spreadsheet_page(driver, url, None) is None
+    assert procuradas == []
+    assert extractor.load_spreadsheet_page(driver, url, "RELATÓRIO CYLLA") is None
+    assert procuradas == ["RELATÓRIO CYLLA"]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Alterações entre exportações consecutivas do RHID (diff_export / update_index)"""
+
+import pytest
+
+import rhid_person_changes as changes
+from conftest import write_export
+
+ANTES = [
+    ['1', 'Ana', 'VIVA RIO', 'UPA A', 'ENFERMEIRO', 'NOITE-PAR', '1', '01/01/2023', '', ''],
+    ['2', 'Bruno', 'VIVA RIO', 'UPA A', 'MÉDICO', 'NOITE-IMPAR', '1', '01/01/2023', '', ''],
+    ['3', 'Carla', 'VIVA RIO', 'UPA B', 'TÉCNICO', 'DIA', '1', '01/01/2023', '', ''],
+    ['4', 'Davi', 'VIVA RIO', 'UPA B', 'TÉCNICO', 'DIA', '1', '01/01/2023', '', ''],
+    ['5', 'Eva', 'VIVA RIO', 'UPA B', 'TÉCNICO', 'DIA', '1', '01/01/2023', '', 'obs'],
+]
+
+DEPOIS = [
+    ['1', 'Ana', 'VIVA RIO', 'UPA A', 'ENFERMEIRO', 'NOITE-PAR', '1', '01/01/2023', '', ''],        # igual
+    ['2', 'Bruno', 'VIVA RIO', 'UPA A', 'MÉDICO', 'NOITE-IMPAR', '0', '01/01/2023', '15/10/2025', ''],  # demitido
+    ['3', 'Carla', 'VIVA RIO', 'UPA A', 'TÉCNICO', 'NOITE-PAR', '1', '01/01/2023', '', ''],         # mudou de UPA e plantão
+    ['5', 'Eva', 'VIVA RIO', 'UPA B', 'TÉCNICO', 'DIA', '1', '01/01/2023', '', 'outra obs'],        # coluna não acompanhada
+    ['6', 'Fábio', 'VIVA RIO', 'UPA B', 'MÉDICO', 'DIA', '1', '01/10/2025', '', ''],                # contratado
+    ['', 'Sem id', 'VIVA RIO', 'UPA B', 'MÉDICO', 'DIA', '1', '', '', ''],
+]
+
+def test_round_trip(tmp_path):
+    index_path = str(tmp_path / 'rhid' / 'delta.json')
+
+    primeiro = changes.update_index(write_export(tmp_path / 'person_1.csv', ANTES), index_path)
+    assert primeiro["baseline"] is True
+    assert primeiro["total"] == 5
+    assert primeiro["changes"] == []
+
+    resultado = changes.update_index(write_export(tmp_path / 'person_2.csv', DEPOIS), index_path)
+    assert resultado["baseline"] is False
+    assert resultado["anterior"] == 'person_1.csv'
+    assert resultado["total"] == 5
+    assert resultado["unchanged"] == 1
+    assert resultado["other_updates"] == 1
+
+    por_tipo = {}
+    for change in resultado["changes"]:
+        por_tipo.setdefault(change["type"], []).append(change)
+    assert por_tipo["hired"] == [{
+        "type": "hired", "id_funcionario": 6, "nome": "Fábio", "departamento": "UPA B",
+        "cargo": "MÉDICO", "horario": "DIA", "admissao": "2025-10-01"
+    }]
+    assert por_tipo["dismissed"] == [{
+        "type": "dismissed", "id_funcionario": 2, "nome": "Bruno", "departamento": "UPA A",
+        "demissao": "2025-10-15"
+    }]
+    assert sorted((c["id_funcionario"], c["field"], c["old"], c["new"]) for c in por_tipo["changed"]) == [
+        (2, "ativo", True, False),
+        (3, "departamento", "UPA B", "UPA A"),
+        (3, "horario", "DIA", "NOITE-PAR"),
+    ]
+    assert por_tipo["removed"] == [
+        {"type": "removed", "id_funcionario": 4, "nome": "Davi", "departamento": "UPA B"}
+    ]
+
+    # A mesma exportação de novo: nada muda
+    repetido = changes.update_index(write_export(tmp_path / 'person_3.csv', DEPOIS), index_path)
+    assert repetido["changes"] == []
+    assert repetido["unchanged"] == 5
+
+def test_readmission(tmp_path):
+    index_path = str(tmp_path / 'delta.json')
+    changes.update_index(write_export(tmp_path / 'person_1.csv', DEPOIS), index_path)
+    readmitido = [['2', 'Bruno', 'VIVA RIO', 'UPA A', 'MÉDICO', 'NOITE-IMPAR', '0', '01/01/2023', '', '']]
+    resultado = changes.update_index(write_export(tmp_path / 'person_2.csv', readmitido), index_path, dry_run=True)
+    assert [c["type"] for c in resultado["changes"]].count("readmitted") == 1
+    assert next(c for c in resultado["changes"] if c["type"] == "readmitted")["demissao"] == "2025-10-15"
+    # dry_run não substitui o índice
+    assert changes.load_index(index_path)["arquivo"] == 'person_1.csv'
+
+def test_empty_export_keeps_index(tmp_path):
+    index_path = str(tmp_path / 'delta.json')
+    changes.update_index(write_export(tmp_path / 'person_1.csv', ANTES), index_path)
+    vazio = tmp_path / 'person_2.csv'
+    vazio.write_text('', encoding='utf-8')
+    with pytest.raises(ValueError):
+        changes.update_index(str(vazio), index_path)
+    assert changes.load_index(index_path)["arquivo"] == 'person_1.csv'
+
+def test_index_of_other_version_is_ignored(tmp_path):
+    index_path = tmp_path / 'delta.json'
+    index_path.write_text('{"versao": 0, "funcionarios": {}}', encoding='utf-8')
+    assert changes.load_index(str(index_path)) is None
+    index_path.write_text('{', encoding='utf-8')
+    assert changes.load_index(str(index_path)) is None
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Tabela colunar dos funcionários do RHID: filtros e contagens por grupo"""
+
+import pytest
+
+from rhid_person_columns import PersonColumns
+from conftest import write_export
+
+LINHAS = [
+    ['1', 'Ana', 'VIVA RIO', 'UPA A', 'ENFERMEIRO', 'NOITE-PAR', '1', '01/01/2023', ''],
+    ['2', 'Bruno', 'VIVA RIO', 'UPA A', 'MÉDICO', 'NOITE-IMPAR', '1', '01/01/2023', ''],
+    ['3', 'Carla', 'VIVA RIO', 'UPA A', 'ENFERMEIRO', 'NOITE-PAR', '0', '01/01/2023', '10/10/2025'],
+    ['4', 'Davi', 'VIVA RIO', 'UPA B', 'ENFERMEIRO', 'NOITE-PAR', '1', '01/01/2023', ''],
+    ['5', 'Eva', 'OUTRA', 'UPA B', 'TÉCNICO', '', '?', '', ''],
+]
+
+@pytest.fixture
+def tabela(tmp_path):
+    path = write_export(tmp_path / 'person_1.csv', LINHAS)
+    return PersonColumns.from_exports([path])
+
+def test_group_count(tabela):
+    assert len(tabela) == 5
+    assert tabela.group_count('departamento') == {'UPA A': 3, 'UPA B': 2}
+    assert tabela.group_count('ativo') == {True: 3, False: 1, None: 1}
+    assert tabela.group_count(('departamento', 'horario'), ativo=True) == {
+        ('UPA A', 'NOITE-PAR'): 1,
+        ('UPA A', 'NOITE-IMPAR'): 1,
+        ('UPA B', 'NOITE-PAR'): 1,
+    }
+    assert tabela.active_headcount() == tabela.group_count(('departamento', 'horario'), ativo=True)
+    assert tabela.group_count('cargo', departamento='UPA B', horario=None) == {'TÉCNICO': 1}
+
+def test_count_and_rows(tabela):
+    assert tabela.count() == 5
+    assert tabela.count(cargo=['ENFERMEIRO', 'MÉDICO'], ativo=True) == 3
+    assert tabela.count(departamento='UPA C') == 0
+    assert list(tabela.rows(cargo='ENFERMEIRO', departamento='UPA A')) == [0, 2]
+    assert tabela.record(2) == {
+        'id_funcionario': 3, 'nome': 'Carla', 'empresa': 'VIVA RIO', 'departamento': 'UPA A',
+        'cargo': 'ENFERMEIRO', 'horario': 'NOITE-PAR', 'ativo': False,
+        'admissao': '2023-01-01', 'demissao': '2025-10-10',
+    }
+    with pytest.raises(ValueError):
+        tabela.count(nome='Ana')
+
+def test_many_distinct_values_widen_the_codes():
+    tabela = PersonColumns()
+    tabela.extend((i, f'P{i}', 'E', f'UPA {i}', 'C', 'H', True, None, None) for i in range(300))
+    assert tabela.categorias['departamento'].dados.typecode == 'H'
+    assert tabela.count(departamento=['UPA 0', 'UPA 299'], ativo=True) == 2
+    assert tabela.group_count('empresa') == {'E': 300}
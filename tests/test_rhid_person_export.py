@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Leitura das exportações de funcionários do RHID: projeção, conversões e cabeçalhos"""
+
+import datetime
+
+import pytest
+
+import rhid_person_export as rhid
+from conftest import RHID_HEADER, write_export
+
+def test_records_are_converted(tmp_path):
+    path = write_export(tmp_path / 'person_1.csv', [
+        ['10', ' Ana Silva ', 'VIVA RIO', 'UPA CIDADE DE DEUS', 'ENFERMEIRO', 'NOITE-PAR', '1', '01/02/2023', ''],
+        ['11', 'Bruno', 'VIVA RIO', 'UPA CIDADE DE DEUS', 'MÉDICO', 'DIA', 'Não', '2022-05-10', '31/10/2025'],
+        ['', '', '', '', '', '', '', '', ''],
+    ])
+    registros = rhid.load_person_records(path)
+
+    assert len(registros) == 2
+    ana, bruno = registros
+    assert ana.id_funcionario == 10
+    assert ana.nome == 'Ana Silva'
+    assert ana.ativo is True
+    assert ana.admissao == datetime.date(2023, 2, 1)
+    assert ana.demissao is None
+    assert ana.empresa is None  # fora da projeção padrão
+    assert bruno.ativo is False
+    assert bruno.admissao == datetime.date(2022, 5, 10)
+    assert bruno.demissao == datetime.date(2025, 10, 31)
+    # Categorias repetidas compartilham a mesma instância
+    assert ana.departamento is bruno.departamento
+    assert bruno.as_dict(('nome', 'demissao')) == {'nome': 'Bruno', 'demissao': '2025-10-31'}
+
+def test_projection_and_delimiter(tmp_path):
+    path = write_export(tmp_path / 'person_2.csv', [
+        ['7', 'Carla', 'OUTRA', 'UPA MARÉ', 'TÉCNICO', 'NOITE-IMPAR', 'x', '', ''],
+    ], delimiter=',')
+    with rhid.open_person_export(path) as f:
+        linhas = list(rhid.iter_person_rows(f, ('horario', 'ativo', 'empresa')))
+    assert linhas == [('NOITE-IMPAR', None, 'OUTRA')]
+
+def test_header_is_case_insensitive(tmp_path):
+    cabecalho = [coluna.upper() for coluna in RHID_HEADER]
+    path = write_export(tmp_path / 'person_3.csv', [['1', 'Davi']], cabecalho=cabecalho)
+    registros = rhid.load_person_records(path, ('id_funcionario', 'nome'))
+    assert [(r.id_funcionario, r.nome) for r in registros] == [(1, 'Davi')]
+
+def test_missing_column_raises(tmp_path):
+    path = write_export(tmp_path / 'person_4.csv', [['1', 'Davi']], cabecalho=['id_funcionario', 'Nome'])
+    with pytest.raises(ValueError, match='Departamento'):
+        rhid.load_person_records(path)
+    with pytest.raises(ValueError, match='desconhecidos'):
+        rhid.load_person_records(path, ('salario',))
+
+def test_empty_export(tmp_path):
+    path = tmp_path / 'person_5.csv'
+    path.write_text('', encoding='utf-8')
+    assert rhid.load_person_records(str(path)) == []
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Modo --serve: protocolo JSON-lines do processo persistente usado pelo server.js"""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import RAIZ
+
+def serve(comandos, tmp_path, base_url, **env):
+    """Rodar o extrator em --serve com os comandos no stdin; retorna as linhas JSON do stdout"""
+    ambiente = {**os.environ,
+                "GOOGLE_SHEETS_BASE_URL": base_url,
+                "GOOGLE_SHEETS_CACHE_DIR": str(tmp_path / 'cache'),
+                "GOOGLE_SHEETS_COLOR_CHECK": "never",
+                **env}
+    entrada = "".join((c if isinstance(c, str) else json.dumps(c)) + "\n" for c in comandos)
+    processo = subprocess.run([sys.executable, os.path.join(RAIZ, 'google_sheets_extractor.py'), '--serve'],
+                              input=entrada, capture_output=True, text=True, env=ambiente, timeout=60)
+    assert processo.returncode == 0, processo.stderr
+    return [json.loads(linha) for linha in processo.stdout.splitlines() if linha.strip()]
+
+def test_protocol(tmp_path, sheets_server):
+    respostas = serve([
+        {"id": 1, "cmd": "ping"},
+        "isto não é json",
+        {"id": 2, "cmd": "voar"},
+        {"id": 3, "events": True},
+        {"id": 4},
+        {"id": 5, "cmd": "shutdown"},
+        {"id": 6, "cmd": "ping"},
+    ], tmp_path, sheets_server().base_url)
+
+    assert respostas[0]["event"] == "ready"
+    por_id = {}
+    for resposta in respostas[1:]:
+        por_id.setdefault(resposta["id"], []).append(resposta)
+
+    assert por_id[1][0]["success"] and por_id[1][0]["runs"] == 0
+    assert not por_id[None][0]["success"]
+    assert "voar" in por_id[2][0]["error"]
+
+    # Eventos de progresso antes da resposta final, com o mesmo id
+    eventos = por_id[3]
+    assert eventos[-1]["event"] == "final" and eventos[-1]["success"]
+    assert {"phase", "month_block", "summary"} <= {e["event"] for e in eventos[:-1]}
+    assert [e["event"] for e in por_id[4]] == ["final"]
+    assert por_id[4][0]["valores"] == eventos[-1]["valores"]
+
+    assert por_id[5][0]["message"] == "Encerrando"
+    assert 6 not in por_id
+
+def test_profile_file_is_written(tmp_path, sheets_server):
+    perfil = str(tmp_path / 'serve.prof')
+    respostas = serve([{"id": 1}], tmp_path, sheets_server().base_url, GOOGLE_SHEETS_PROFILE=perfil)
+    assert respostas[-1]["success"]
+    assert respostas[-1]["profile"] == perfil
+    assert os.path.exists(perfil) and os.path.exists(perfil + '.txt')
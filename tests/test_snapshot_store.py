@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Histórico de snapshots: gravação, deduplicação por hash e consultas de evolução"""
+
+import contextlib
+
+import pytest
+
+import google_sheets_extractor as extractor
+import snapshot_store
+
+@pytest.fixture(scope='module')
+def resultado(relatorio_csv):
+    return {"valores": extractor.process_csv(relatorio_csv), "stage": "export"}
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'snapshots.db')
+
+def test_same_hash_is_not_saved_twice(db, resultado):
+    primeiro = snapshot_store.save_snapshot(db, resultado, 'planilha', 'Aba', 'resumo', 'hash-a')
+    assert primeiro is not None
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha', 'Aba', 'resumo', 'hash-a') is None
+
+    # Outro conteúdo grava; voltar ao conteúdo anterior também (só repetições seguidas são descartadas)
+    segundo = snapshot_store.save_snapshot(db, resultado, 'planilha', 'Aba', 'resumo', 'hash-b')
+    terceiro = snapshot_store.save_snapshot(db, resultado, 'planilha', 'Aba', 'resumo', 'hash-a')
+    assert primeiro < segundo < terceiro
+
+    with contextlib.closing(snapshot_store.connect(db)) as conn:
+        hashes = [s["hash"] for s in snapshot_store.latest_snapshots(conn, last=10)]
+    assert hashes == ['hash-a', 'hash-b', 'hash-a']
+
+def test_dedupe_is_per_sheet_and_tab(db, resultado):
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha', 'Aba', None, 'hash-a')
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha', 'Outra', None, 'hash-a')
+    assert snapshot_store.save_snapshot(db, resultado, 'outra', 'Aba', None, 'hash-a')
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha', None, None, 'hash-a')
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha', None, None, 'hash-a') is None
+
+def test_without_hash_always_saves(db, resultado):
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha')
+    assert snapshot_store.save_snapshot(db, resultado, 'planilha')
+
+def test_month_and_summary_rows(db, resultado):
+    snapshot_id = snapshot_store.save_snapshot(db, resultado, 'planilha', 'Aba', None, 'hash-a')
+    valores = resultado["valores"]
+    with contextlib.closing(snapshot_store.connect(db)) as conn:
+        resumo = {row["campo"]: dict(row) for row in conn.execute(
+            "SELECT * FROM resumo WHERE snapshot_id = ?", (snapshot_id,))}
+        totais = snapshot_store.month_totals(conn)
+
+    assert "meses" not in resumo
+    assert not any(campo.endswith(("Negativo", "Centavos")) for campo in resumo)
+    for campo, linha in resumo.items():
+        assert linha["valor"] == valores[campo]
+        assert linha["centavos"] == valores.get(f"{campo}Centavos")
+
+    assert {linha["mes"] for linha in totais} == set(valores["meses"])
+    for linha in totais:
+        recebidos = [item["centavos"] for item in valores["meses"][linha["mes"]]["valores_recebidos"]
+                     if item.get("centavos") is not None]
+        assert linha["recebido_centavos"] == (sum(recebidos) if recebidos else None)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Eventos de progresso da extração em streaming: blocos e resumo só de uma resposta validada"""
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+@pytest.fixture
+def servidor(cache_dir, sheets_server, relatorio_csv):
+    # GID 5: mesma estrutura, mas sem o texto que identifica a aba (outra aba da planilha)
+    return sheets_server({"0": relatorio_csv, "5": relatorio_csv.replace("VIVA RIO EM ABERTO", "OUTRA COISA")})
+
+def extract_with_events():
+    eventos = []
+    with extractor.event_sink(eventos.append):
+        result = extractor.extract_financial_data(None, color_check="never", stream=True)
+    return result, eventos
+
+def test_blocks_and_summary_are_streamed(servidor, relatorio_csv):
+    extractor.set_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME, "0")
+    result, eventos = extract_with_events()
+    assert result["success"]
+    assert result["valores"] == extractor.process_csv(relatorio_csv)
+
+    blocos = [e["month"] for e in eventos if e["event"] == "month_block"]
+    assert blocos == list(result["valores"]["meses"])
+    resumos = [e for e in eventos if e["event"] == "summary"]
+    assert len(resumos) == 1
+    assert not any(e["event"] == "reset" for e in eventos)
+
+def test_wrong_tab_emits_nothing_before_validation(servidor):
+    # GID em cache aponta para outra aba: nada dela pode chegar ao server.js
+    extractor.set_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME, "5")
+    result, eventos = extract_with_events()
+    assert result["success"]
+    assert extractor.get_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME) == "0"
+
+    primeiro_bloco = next(i for i, e in enumerate(eventos) if e["event"] == "month_block")
+    assert all(e["event"] == "phase" for e in eventos[:primeiro_bloco])
+    assert any(e.get("phase") == "export_gid_probe" for e in eventos[:primeiro_bloco])
+    assert [e["month"] for e in eventos if e["event"] == "month_block"] == list(result["valores"]["meses"])
+
+@pytest.mark.parametrize("stream", [False, True], ids=["csv", "stream"])
+def test_summary_is_sent_when_its_rows_are_read(servidor, stream):
+    # O resumo (linhas 33-37) sai antes do bloco de DEZEMBRO (linha 38), não só no fim
+    extractor.set_cached_gid(extractor.SPREADSHEET_ID, extractor.SHEET_TAB_NAME, "0")
+    eventos = []
+    with extractor.event_sink(eventos.append):
+        result = extractor.extract_financial_data(None, color_check="never", stream=stream)
+    assert result["success"]
+    ordem = [e.get("month", e["event"]) for e in eventos if e["event"] in ("month_block", "summary")]
+    assert ordem.index("summary") < ordem.index("DEZEMBRO")
+    resumo = next(e for e in eventos if e["event"] == "summary")
+    assert resumo["valores"]["totalCentavos"] == result["valores"]["totalCentavos"]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Tempos por fase da extração e perfil opcional (GOOGLE_SHEETS_PROFILE)"""
+
+import pstats
+
+import google_sheets_extractor as extractor
+
+def test_phases_are_summed_per_extraction():
+    timings = extractor.Timings()
+    eventos = []
+    extractor.TIMINGS_ATUAL.timings = timings
+    try:
+        with extractor.event_sink(eventos.append):
+            for _ in range(2):
+                with extractor.timed("process_csv"):
+                    pass
+        extractor.note_timing("dom_method", "grid")
+    finally:
+        extractor.TIMINGS_ATUAL.timings = None
+
+    resultado = timings.as_dict()
+    assert set(resultado["phases"]) == {"process_csv"}
+    assert resultado["dom_method"] == "grid"
+    assert [(e["phase"], e["status"]) for e in eventos] == [("process_csv", "start"), ("process_csv", "end")] * 2
+
+def test_outside_an_extraction_nothing_is_recorded():
+    assert extractor.current_timings() is None
+    with extractor.timed("process_csv"):
+        pass
+    extractor.note_timing("dom_method", "grid")
+
+def test_run_profiled_writes_profile_and_summary(tmp_path):
+    path = str(tmp_path / 'perfil.prof')
+    assert extractor.run_profiled(lambda: sum(range(1000)), path) == 499500
+    assert pstats.Stats(path).total_calls > 0
+    with open(path + '.txt', encoding='utf-8') as f:
+        assert "Memória: atual" in f.read()
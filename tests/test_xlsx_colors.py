@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Células do resumo em vermelho lidas do export XLSX (check_negative_cells_xlsx)"""
+
+import zipfile
+
+import pytest
+
+import google_sheets_extractor as extractor
+
+MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8"?>
+<styleSheet xmlns="{MAIN}">
+  <numFmts count="1"><numFmt numFmtId="164" formatCode="&quot;R$&quot; #,##0.00;[Red]&quot;R$&quot; -#,##0.00"/></numFmts>
+  <fonts count="2">
+    <font><sz val="10"/><color rgb="FF000000"/></font>
+    <font><sz val="10"/><color rgb="FFFF0000"/></font>
+  </fonts>
+  <cellStyleXfs count="1"><xf numFmtId="0" fontId="1"/></cellStyleXfs>
+  <cellXfs count="3">
+    <xf numFmtId="0" fontId="0"/>
+    <xf numFmtId="0" fontId="1"/>
+    <xf numFmtId="164" fontId="0"/>
+  </cellXfs>
+</styleSheet>"""
+
+def sheet(celulas):
+    linhas = "".join(
+        f'<row r="{linha}"><c r="B{linha}" s="{estilo}"><v>{valor}</v></c></row>'
+        for linha, (estilo, valor) in sorted(celulas.items())
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?><worksheet xmlns="{MAIN}"><sheetData>{linhas}</sheetData></worksheet>'
+
+def write_xlsx(path, abas):
+    """XLSX mínimo com as abas {nome: {linha: (estilo, valor)}} na coluna B"""
+    with zipfile.ZipFile(path, 'w') as pacote:
+        pacote.writestr('xl/workbook.xml', (
+            f'<workbook xmlns="{MAIN}" xmlns:r="{REL}"><sheets>'
+            + "".join(f'<sheet name="{nome}" sheetId="{i}" r:id="rId{i}"/>' for i, nome in enumerate(abas, 1))
+            + '</sheets></workbook>'))
+        pacote.writestr('xl/_rels/workbook.xml.rels', (
+            f'<Relationships xmlns="{PKG}">'
+            + "".join(f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(abas) + 1))
+            + '</Relationships>'))
+        pacote.writestr('xl/styles.xml', STYLES)
+        for i, celulas in enumerate(abas.values(), 1):
+            pacote.writestr(f'xl/worksheets/sheet{i}.xml', sheet(celulas))
+
+@pytest.fixture
+def base_url(tmp_path, sheets_server):
+    write_xlsx(tmp_path / '0.xlsx', {
+        "OUTRA": {34: (1, 1), 35: (1, 1), 36: (1, 1), 37: (1, 1)},
+        "RELATÓRIO CYLLA": {
+            34: (1, 1000),    # fonte vermelha
+            35: (2, -250.5),  # [Red] na seção dos negativos
+            36: (2, 300),     # mesmo formato, valor positivo
+            37: (0, -10),     # negativo sem vermelho
+        },
+    })
+    return sheets_server({}, fixtures_dir=str(tmp_path)).base_url
+
+def test_red_cells_mark_negative_fields(base_url):
+    valores = {}
+    assert extractor.check_negative_cells_xlsx("planilha", valores, tab_name="RELATÓRIO CYLLA", gid="0")
+    assert valores == {"setembroNegativo": True, "outubroNegativo": True}
+
+def test_missing_tab(base_url):
+    valores = {}
+    assert not extractor.check_negative_cells_xlsx("planilha", valores, tab_name="NÃO EXISTE", gid="0")
+    assert valores == {}
+
+def test_download_error(base_url):
+    assert not extractor.check_negative_cells_xlsx("planilha", {}, gid="9")
+
+@pytest.mark.parametrize("formato, valor, vermelho", [
+    ('#,##0.00;[Red](#,##0.00)', -1, True),
+    ('#,##0.00;[Red](#,##0.00)', 1, False),
+    ('[RED]#,##0', 1, True),
+    ('#,##0', -1, False),
+    (None, -1, False),
+])
+def test_red_number_format(formato, valor, vermelho):
+    assert extractor.is_red_number_format(formato, valor) is vermelho